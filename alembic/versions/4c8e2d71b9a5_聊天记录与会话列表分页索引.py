@@ -0,0 +1,32 @@
+"""聊天记录与会话列表分页索引
+
+Revision ID: 4c8e2d71b9a5
+Revises: 69a29eb83c1a
+Create Date: 2026-10-17 10:12:45.208113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c8e2d71b9a5'
+down_revision: Union[str, Sequence[str], None] = '69a29eb83c1a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 聊天记录瀑布流：WHERE thread_id = ? AND id < ? ORDER BY id DESC
+    op.create_index('ix_chat_history_thread_id_id', 'chat_history', ['thread_id', 'id'], unique=False)
+    # 会话列表：WHERE user_id = ? AND hotel_id = ? AND id < ? ORDER BY id DESC
+    op.create_index('ix_user_thread_user_id_hotel_id_id', 'user_thread', ['user_id', 'hotel_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_user_thread_user_id_hotel_id_id', table_name='user_thread')
+    op.drop_index('ix_chat_history_thread_id_id', table_name='chat_history')
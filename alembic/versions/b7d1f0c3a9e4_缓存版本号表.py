@@ -0,0 +1,36 @@
+"""缓存版本号表
+
+Revision ID: b7d1f0c3a9e4
+Revises: 4c8e2d71b9a5
+Create Date: 2026-10-17 16:05:12.481930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d1f0c3a9e4'
+down_revision: Union[str, Sequence[str], None] = '4c8e2d71b9a5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 管理端缓存失效时递增版本号，多 worker 据此同步清空本地缓存
+    op.create_table('cache_version',
+    sa.Column('name', sa.String(length=64, collation='utf8mb4_bin'), nullable=False),
+    sa.Column('version', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('cache_version')
@@ -34,14 +34,171 @@ class Settings(BaseSettings):
     POSTGRES_DB_USERNAME: str = 'postgres'
     POSTGRES_DB_PASSWORD: str = 'root'
 
+    # ============ Checkpoint 清理 ============
+    CHECKPOINT_GC_ENABLED: bool = True
+    # 后台清理间隔（秒）
+    CHECKPOINT_GC_INTERVAL: int = 6 * 60 * 60
+    # 每个会话保留的最新 checkpoint 数
+    CHECKPOINT_KEEP_LATEST: int = 20
+    # 超过该天数没有新 checkpoint 的会话整体删除
+    CHECKPOINT_MAX_IDLE_DAYS: int = 90
+    # 最近该秒数内仍有写入的会话不做压缩，避免与正在运行的图竞争
+    CHECKPOINT_GC_ACTIVE_SECONDS: int = 10 * 60
+    # 每批处理的会话数，以及批与批之间的间隔（秒）
+    CHECKPOINT_GC_BATCH_SIZE: int = 100
+    CHECKPOINT_GC_BATCH_INTERVAL: float = 0.5
+
     # ============ Agent / 路径配置 ============
     # 这里可以直接调用你的函数作为默认值
     MODEL_PATH: str = abs_path("../models/bge-base-zh-v1.5")
     CHROMA_DB_PATH: str = abs_path("../asset/chroma_db")
+    # 向量库后端：chroma / numpy（内存矩阵，集合很小时检索更快）
+    VECTOR_STORE_BACKEND: str = 'chroma'
+    NUMPY_VECTOR_STORE_PATH: str = abs_path("../asset/numpy_index")
     # 也可以在 .env 里覆盖这些路径，如果不覆盖就用上面的默认值
     GEN_TRY_TIMES: int = 3
     MAX_FILE_SIZE_BYTES: int = 1 * 1024 * 1024
 
+    # 向量模型推理后端：torch / onnx（int8 量化，需先安装 requirements-onnx.txt 并运行 utils/export_onnx_model.py）
+    EMBEDDING_BACKEND: str = 'torch'
+    ONNX_MODEL_PATH: str = abs_path("../models/bge-base-zh-v1.5-onnx/model_quantized.onnx")
+    ONNX_INTRA_OP_THREADS: int = 4
+
+    # 向量模型部署方式：local（每个 worker 各加载一份）/ sidecar（单独进程持有模型，worker 通过 Unix socket 调用）
+    EMBEDDING_MODE: str = 'local'
+    EMBEDDING_SOCKET_PATH: str = abs_path("../run/embedding.sock")
+    # sidecar 不可用（如重启中）时客户端的最长重试秒数
+    EMBEDDING_SIDECAR_TIMEOUT: float = 10
+    # worker 启动时等待 sidecar 模型加载完成的最长秒数
+    EMBEDDING_SIDECAR_STARTUP_TIMEOUT: float = 180
+
+    # 查询向量 LRU 缓存条数与过期秒数
+    EMBEDDING_CACHE_SIZE: int = 2048
+    EMBEDDING_CACHE_TTL: int = 24 * 60 * 60
+    # 并发查询编码的微批参数：单批最大条数、最长等待毫秒
+    EMBEDDING_BATCH_SIZE: int = 32
+    EMBEDDING_BATCH_WAIT_MS: float = 5
+
+    # ============ Excel 上传解析 ============
+    # 解析进程数与单个文件的最长解析秒数
+    EXCEL_PARSE_WORKERS: int = 2
+    EXCEL_PARSE_TIMEOUT: float = 10
+    # 每个文件最多导入的工作表数，每个工作表最多导入的行 / 列，示例单元格最多保留的字符数
+    EXCEL_MAX_SHEETS: int = 5
+    EXCEL_MAX_ROWS: int = 50000
+    EXCEL_MAX_COLS: int = 30
+    EXCEL_MAX_CELL_CHARS: int = 200
+    # 上传文件按会话导入本地 SQLite，提示词中只放表结构与前几行示例
+    UPLOAD_DB_DIR: str = abs_path("../run/uploads")
+    EXCEL_SAMPLE_ROWS: int = 5
+
+    # ============ 路由 ============
+    # 本地向量路由，置信度不低于阈值时跳过 LLM 路由
+    FAST_ROUTER_ENABLED: bool = True
+    FAST_ROUTER_THRESHOLD: float = 0.8
+    FAST_ROUTER_TEMPERATURE: float = 0.02
+    ROUTER_EXAMPLES_PATH: str = abs_path("../asset/router_examples.json")
+    # 路由的同时按用户问题原文预检索表结构与问答sql，路由到 SQL 时直接放进 agent 提示词
+    SPECULATIVE_RETRIEVAL_ENABLED: bool = True
+
+    # ============ 工具并发 ============
+    # 单次 agent 步骤内同时执行的工具调用数
+    TOOL_CONCURRENCY_PER_REQUEST: int = 4
+    # 单个酒店同时在 PMS 库上执行的 SQL 数
+    TOOL_CONCURRENCY_PER_HOTEL: int = 6
+
+    # ============ 对话流 ============
+    # 检测 SSE 客户端是否断开的间隔（秒），断开后取消正在运行的图
+    CHAT_DISCONNECT_POLL_INTERVAL: float = 1.0
+
+    # ============ 会话记忆 ============
+    # 历史消息超过该 token 数时，把较早的轮次压缩为摘要
+    MEMORY_SUMMARY_ENABLED: bool = True
+    MEMORY_SUMMARY_TRIGGER_TOKENS: int = 3000
+    # 压缩时原样保留的最近轮数
+    MEMORY_KEEP_TURNS: int = 2
+
+    # ============ 回答收尾 ============
+    # 聊天记录 / 会话批量写入的批大小与间隔（秒）
+    POST_RESPONSE_BATCH_SIZE: int = 50
+    POST_RESPONSE_FLUSH_INTERVAL: float = 0.2
+    # 后台同时生成会话标题的 LLM 调用数
+    POST_RESPONSE_TITLE_CONCURRENCY: int = 4
+    # 关闭服务时等待标题生成的最长秒数，超时使用兜底标题
+    POST_RESPONSE_SHUTDOWN_TIMEOUT: float = 10
+    # 写入失败后的重试间隔按倍数增长的上限（秒），单条数据最多尝试次数，超过后写入死信文件（JSON Lines）
+    POST_RESPONSE_RETRY_MAX_INTERVAL: float = 30
+    POST_RESPONSE_MAX_ATTEMPTS: int = 10
+    POST_RESPONSE_DEAD_LETTER_PATH: str = abs_path("../log/post_response_dead_letter.jsonl")
+    # chat_history.answer 为 TEXT 列，按 utf8mb4 字节数截断
+    POST_RESPONSE_ANSWER_MAX_BYTES: int = 65535
+
+    # ============ 分页总数 ============
+    # 总数缓存秒数；主键跨度低于阈值时精确 COUNT(*)，否则返回估算值
+    COUNT_CACHE_TTL: float = 30
+    COUNT_EXACT_THRESHOLD: int = 100000
+
+    # ============ 管理端缓存 ============
+    # 预设问题缓存秒数（表约每周才变一次，修改后可调用 /invalidate_cache 失效，各 worker 经 cache_version 表同步）
+    PRESET_QUESTION_CACHE_TTL: int = 10 * 60
+    # 员工名录全量刷新的秒数，期间本 worker 新会话的用户增量补查，其他 worker 的新用户最迟在刷新后可见
+    STAFF_DIRECTORY_TTL: int = 10 * 60
+    # 各 worker 检查 cache_version 版本号的最短间隔（秒），即失效传播到所有 worker 的最长延迟
+    ADMIN_CACHE_VERSION_CHECK_INTERVAL: float = 5
+    # 跨库查询 tb_staff 时每批 IN 的 id 数
+    STAFF_LOOKUP_CHUNK_SIZE: int = 500
+
+    # ============ 整理节点 ============
+    # 结构简单的中间结果（单指标、表格、键值分组）本地渲染，不再调用 LLM
+    SUMMARY_RENDER_ENABLED: bool = True
+    # 本地渲染的表格行数上限，超出后交给 LLM 整理
+    SUMMARY_RENDER_MAX_ROWS: int = 50
+
+    # ============ SQL 结果 ============
+    # 返回给 agent 的明细行数与 token 预算，超出后只返回统计摘要
+    SQL_RESULT_MAX_ROWS: int = 200
+    SQL_RESULT_MAX_TOKENS: int = 2000
+    # 流式读取的批大小，以及最多扫描的行数
+    SQL_FETCH_BATCH_SIZE: int = 500
+    SQL_RESULT_MAX_SCAN_ROWS: int = 100000
+
+    # ============ SQL 执行前检查 ============
+    # 未写 LIMIT 的查询自动追加的 LIMIT
+    SQL_DEFAULT_LIMIT: int = 1000
+    # EXPLAIN 预估扫描行数上限
+    SQL_EXPLAIN_MAX_ROWS: int = 5000000
+
+    # ============ SQL 执行超时 ============
+    # 单条 SQL 的执行时间上限（秒），服务端 MAX_EXECUTION_TIME 与客户端超时共用
+    SQL_STATEMENT_TIMEOUT: float = 15
+    # 超时后在旁路连接上执行 KILL QUERY 的等待上限（秒）
+    SQL_KILL_TIMEOUT: float = 3
+
+    # ============ SQL 结果缓存 ============
+    SQL_CACHE_ENABLED: bool = True
+    # 涉及今天或无日期条件 / 只查静态字典表 / 只涉及已结束日期 的缓存秒数
+    SQL_CACHE_TODAY_TTL: int = 60
+    SQL_CACHE_STATIC_TTL: int = 10 * 60
+    SQL_CACHE_HISTORY_TTL: int = 6 * 60 * 60
+    # 很少变动的字典表，只查这些表且无日期条件的查询使用 SQL_CACHE_STATIC_TTL
+    SQL_CACHE_STATIC_TABLES: list[str] = ['tb_building', 'tb_floor', 'tb_room_type', 'tb_live_type', 'tb_price_type',
+                                          'tb_channel', 'tb_goods_type', 'tb_member_level', 'tb_seller_type',
+                                          'tb_agreement_company_type', 'tb_hotel']
+    SQL_CACHE_SIZE: int = 2048
+    SQL_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+
+    # ============ 答案缓存 ============
+    ANSWER_CACHE_ENABLED: bool = True
+    # 问题向量余弦相似度阈值
+    ANSWER_CACHE_THRESHOLD: float = 0.95
+    # 时间窗口包含今天（或无时间语义）的答案缓存秒数
+    ANSWER_CACHE_TODAY_TTL: int = 120
+    # 历史时间窗口的答案缓存秒数
+    ANSWER_CACHE_HISTORY_TTL: int = 6 * 60 * 60
+    ANSWER_CACHE_BUCKET_SIZE: int = 50
+    # 所有桶合计的最大条目数，超出时淘汰最早过期的答案
+    ANSWER_CACHE_MAX_ENTRIES: int = 2000
+
     # LangSmith 配置
     DEEPSEEK_API_KEY: str = None
     LANGSMITH_API_KEY: str | None = None
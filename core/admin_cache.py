@@ -0,0 +1,148 @@
+"""
+管理端读多写少数据的进程内缓存：预设问题分页结果与员工名录
+
+多 worker 部署时每个进程各有一份缓存，/invalidate_cache 只会落到其中一个 worker，
+因此失效通过 cache_version 表传播：失效时把对应名称的版本号加一，
+各 worker 读取缓存前最多每 ADMIN_CACHE_VERSION_CHECK_INTERVAL 秒查询一次版本号，变化时清空本地缓存。
+版本表不可用时退化为只依赖 TTL 过期（尽力而为）。
+员工名录的增量补查（notice_user）只对本 worker 新建的会话生效，其他 worker 的新用户在 STAFF_DIRECTORY_TTL 内可能缺失
+"""
+import asyncio
+import logging
+import time
+
+from sqlalchemy import bindparam, select, text
+from sqlalchemy.dialects.mysql import insert
+
+from config.config import settings
+from core.db import assistants_async_session_maker, db_session, pms_async_session_maker
+from db_models.models import CacheVersion, UserThread
+from utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+ADMIN_CACHE_TARGETS = ('preset_question', 'staff')
+
+
+class StaffDirectory:
+    """
+    使用过助手的员工名录：user_thread 中的 user_id 对应 PMS 库 tb_staff 的员工
+    首次访问或过期后全量加载；之后新会话的 user_id 由 notice_user 记录，下次访问只补查这些 id
+    跨库 IN 查询按 chunk_size 分批，避免参数过多
+    """
+
+    def __init__(self, ttl: float = settings.STAFF_DIRECTORY_TTL, chunk_size: int = settings.STAFF_LOOKUP_CHUNK_SIZE):
+        self.ttl = ttl
+        self.chunk_size = chunk_size
+        self.staff: dict[int, str] = {}
+        self.user_ids: set[int] = set()
+        self.pending_ids: set[int] = set()
+        self.expires_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def notice_user(self, user_id: int):
+        # 未加载时下次访问会全量加载，无需记录
+        if self.expires_at and user_id not in self.user_ids:
+            self.pending_ids.add(user_id)
+
+    def invalidate(self):
+        self.expires_at = 0.0
+
+    async def lookup_staff(self, user_ids: set[int]) -> dict[int, str]:
+        user_ids = sorted(user_ids)
+        staff = {}
+        sql = text("SELECT id, name FROM tb_staff WHERE id IN :user_ids").bindparams(bindparam('user_ids', expanding=True))
+        async with pms_async_session_maker() as pms_session:
+            for i in range(0, len(user_ids), self.chunk_size):
+                result = await pms_session.execute(sql, {"user_ids": user_ids[i:i + self.chunk_size]})
+                staff.update({row.id: row.name for row in result.mappings()})
+        return staff
+
+    async def get_all(self) -> list[dict]:
+        async with self._lock:
+            if self.expires_at <= time.monotonic():
+                async with assistants_async_session_maker() as session:
+                    result = await session.execute(select(UserThread.user_id).distinct())
+                    user_ids = {user_id for user_id in result.scalars().all() if user_id is not None}
+                self.staff = await self.lookup_staff(user_ids) if user_ids else {}
+                self.user_ids, self.pending_ids = user_ids, set()
+                self.expires_at = time.monotonic() + self.ttl
+                logger.info(f'[员工名录] 全量加载 {len(self.staff)} 人')
+            elif self.pending_ids:
+                pending, self.pending_ids = self.pending_ids, set()
+                try:
+                    self.staff.update(await self.lookup_staff(pending))
+                except Exception:
+                    self.pending_ids |= pending
+                    raise
+                self.user_ids |= pending
+                logger.info(f'[员工名录] 增量补查 {len(pending)} 人')
+        return [{"id": user_id, "name": name} for user_id, name in sorted(self.staff.items())]
+
+
+staff_directory = StaffDirectory()
+# 预设问题分页结果，键为 (limit, page, before_id)
+preset_question_cache = TTLCache(maxsize=256, ttl=settings.PRESET_QUESTION_CACHE_TTL)
+
+
+def clear_local(target: str):
+    if target == 'preset_question':
+        preset_question_cache.clear()
+    elif target == 'staff':
+        staff_directory.invalidate()
+
+
+class CacheVersions:
+    """cache_version 表中各缓存的版本号，用于跨 worker 传播失效"""
+
+    def __init__(self, check_interval: float = settings.ADMIN_CACHE_VERSION_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self.versions: dict[str, int] = {}
+        self.checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def sync(self):
+        """距上次检查超过 check_interval 时读取版本号，其他 worker 失效过的缓存在本地清空"""
+        if time.monotonic() - self.checked_at < self.check_interval:
+            return
+        async with self._lock:
+            if time.monotonic() - self.checked_at < self.check_interval:
+                return
+            self.checked_at = time.monotonic()
+            try:
+                async with db_session() as session:
+                    result = await session.execute(select(CacheVersion.name, CacheVersion.version))
+                    versions = {row.name: row.version for row in result}
+            except Exception as e:
+                logger.warning(f'[管理端缓存] 读取版本号失败，仅按 TTL 过期：{e}')
+                return
+            for name, version in versions.items():
+                if name in self.versions and self.versions[name] != version:
+                    clear_local(name)
+                    logger.info(f'[管理端缓存] {name} 已在其他 worker 失效，清空本地缓存')
+            self.versions = versions
+
+    async def bump(self, name: str):
+        stmt = insert(CacheVersion).values(name=name, version=1)
+        stmt = stmt.on_duplicate_key_update(version=CacheVersion.version + 1)
+        async with db_session() as session:
+            await session.execute(stmt)
+            version = (await session.execute(select(CacheVersion.version).where(CacheVersion.name == name))).scalar()
+        # 本 worker 已清空，记下新版本号避免下次检查重复清空
+        self.versions[name] = version
+
+
+cache_versions = CacheVersions()
+
+
+async def invalidate_admin_cache(target: str = 'all'):
+    """预设问题或员工信息在库中被修改后调用：清空本地缓存，并递增版本号通知其他 worker"""
+    for name in ADMIN_CACHE_TARGETS:
+        if target not in (name, 'all'):
+            continue
+        clear_local(name)
+        try:
+            await cache_versions.bump(name)
+        except Exception as e:
+            logger.error(f'[管理端缓存] 递增 {name} 版本号失败，其他 worker 需等待 TTL 过期：{e}')
+    logger.info(f'[管理端缓存] 已失效：{target}')
@@ -7,5 +7,6 @@ class AgentContext:
         # self.mysql_engine = app.state.mysql_engine
         self.vs_schema = app.state.vs_schema
         self.vs_qa = app.state.vs_qa
+        self.embeddings = app.state.embeddings
         self.graph = app.state.graph if include_graph else None
         # self.async_session_maker = app.state.async_session_maker
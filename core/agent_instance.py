@@ -1,95 +1,119 @@
+import asyncio
 import json
 import logging
+import time
+from contextlib import nullcontext
 from typing import Annotated, Literal, TypedDict
 
-import tiktoken
+from langchain_core.callbacks.manager import adispatch_custom_event
 from langchain_core.language_models import BaseChatModel
-from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, trim_messages, ToolMessage, AIMessage
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, ToolMessage, AIMessage, RemoveMessage
+from langchain_core.runnables import RunnableConfig
 from langgraph.constants import END
 from langgraph.graph import StateGraph, add_messages
-from langgraph.prebuilt import ToolNode
 
+from config.config import settings
 from core.agent_context import AgentContext
-from core.agent_prompt import AGENT_SYSTEM_PROMPT, CHAT_SYSTEM_PROMPT, ROUTER_PROMPT, SUMMARY_SYSTEM_PROMPT
-from core.agent_tools import pms_query_mysql, pms_search_vector
+from core.agent_prompt import AGENT_SYSTEM_PROMPT, CHAT_SYSTEM_PROMPT, MEMORY_SUMMARY_PROMPT, PREFETCHED_CONTEXT_PROMPT, \
+    ROUTER_PROMPT, SUMMARY_SYSTEM_PROMPT, UPLOAD_ROUTER_HINT
+from core.agent_router import FastRouter
+from core.agent_tokens import count_tokens
+from core.agent_tools import get_hotel_semaphore, pms_query_mysql, pms_search_vector, query_uploaded_file, search_vector
+from core.prompt_assembly import MEMORY_SUMMARY_ID, ainvoke_llm, assemble_prompt, extract_question
+from core.summary_renderer import NO_DATA_ANSWER, render_summary
 from schemas.pms_agent_schema import parse_route
 from utils.utils import get_valid_json
 
 logger = logging.getLogger(__name__)
 
+# 本地生成的回答通过该自定义事件推送给 SSE
+SUMMARY_DELTA_EVENT = "summary_delta"
+SUMMARY_CHUNK_SIZE = 32
+MEMORY_SUMMARY_PREFIX = "此前对话的摘要：\n"
+
 
 class AgentState(TypedDict):
     # add_messages 是 LangGraph 的黑魔法：
     # 当节点返回新的 message 时，它不是覆盖，而是 append（追加）到列表里
     messages: Annotated[list[BaseMessage], add_messages]
     next_node: str
+    hotel_id: int
+    # 路由阶段预检索的表结构与问答sql，仅对本轮 SQL agent 有效
+    prefetched_context: str | None
+    # 本轮是否上传了文件，上传时直接交给 SQL agent 查询文件
+    has_upload: bool
+    # 会话是否有上传库（含之前轮次上传的文件），追问文件内容时需要路由到有查询工具的 SQL agent
+    thread_has_upload: bool
 
 
 class AgentInstance:
-    def __init__(self, llm: BaseChatModel):
+    def __init__(self, llm: BaseChatModel, fast_router: FastRouter | None = None):
         self.llm = llm
+        self.fast_router = fast_router
         # self.llm = ChatDeepSeek(model="deepseek-chat", temperature=0.1)
         self.llm_with_tools = None
+        self.tools_by_name = {}
+        self.ctx = None
 
     def init_tools_and_llm(self, ctx: AgentContext):
-        tools = [pms_query_mysql, pms_search_vector(ctx)]
+        self.ctx = ctx
+        tools = [pms_query_mysql, pms_search_vector(ctx), query_uploaded_file]
         self.llm_with_tools = self.llm.bind_tools(tools)
+        self.tools_by_name = {t.name: t for t in tools}
         return tools
 
-    def use_trimmer(self, messages):
-        system_message = [m for m in messages if isinstance(m, SystemMessage)]
-        other_messages = [m for m in messages if not isinstance(m, SystemMessage)]
-
-        question = None
-        for msg in reversed(messages):
-            if isinstance(msg, HumanMessage):
-                question = msg
-                break
-
-        trimmed_messages = trim_messages(
-            other_messages,
-            strategy="last",
-            token_counter=self.count_tokens,
-            # token_counter=len,
-            max_tokens=6000,
-            include_system=False,
-            # 确保对话从 Human 开始
-            # start_on="human",
-            # 允许部分修剪（通常设为 False 以保证完整性）
-            allow_partial=False
-        )
-
-        valid_messages = []
-        active_tool_call_ids = set()
-        for i, msg in enumerate(trimmed_messages):
-            if isinstance(msg, AIMessage):
-                if msg.tool_calls:
-                    if i + 1 < len(trimmed_messages):
-                        next_msg = trimmed_messages[i + 1]
-                        current_tool_call_ids = {call['id'] for call in msg.tool_calls}
-                        if isinstance(next_msg, ToolMessage):
-                            if next_msg.tool_call_id in current_tool_call_ids:
-                                valid_messages.append(msg)
-                                active_tool_call_ids = current_tool_call_ids
-                else:
-                    valid_messages.append(msg)
-            elif isinstance(msg, ToolMessage):
-                if msg.tool_call_id in active_tool_call_ids:
-                    valid_messages.append(msg)
-            elif isinstance(msg, HumanMessage):
-                valid_messages.append(msg)
-                if isinstance(msg, HumanMessage):
-                    active_tool_call_ids = set()
-
-        if question and question not in valid_messages:
-            valid_messages = [question, *valid_messages]
-
-        return system_message + valid_messages
+    async def memory_node(self, state: AgentState):
+        """
+        每轮开始时整理历史：去掉已结束轮次的 tool_calls / 工具结果，
+        历史超过 MEMORY_SUMMARY_TRIGGER_TOKENS 时把较早的轮次合并进会话摘要，只保留最近 MEMORY_KEEP_TURNS 轮原文
+        """
+        messages = state["messages"]
+        last_human = next((i for i in range(len(messages) - 1, -1, -1) if isinstance(messages[i], HumanMessage)), None)
+        if last_human is None:
+            return {}
+
+        history = [m for m in messages[:last_human] if not isinstance(m, SystemMessage)]
+        tool_ids = {m.id for m in history if isinstance(m, ToolMessage) or (isinstance(m, AIMessage) and m.tool_calls)}
+        updates = [RemoveMessage(id=message_id) for message_id in tool_ids]
+        history = [m for m in history if m.id not in tool_ids]
+
+        history_tokens = count_tokens(history)
+        if settings.MEMORY_SUMMARY_ENABLED and history_tokens > settings.MEMORY_SUMMARY_TRIGGER_TOKENS:
+            turn_starts = [i for i, m in enumerate(history) if isinstance(m, HumanMessage)]
+            keep_turns = settings.MEMORY_KEEP_TURNS
+            if not keep_turns:
+                keep_from = len(history)
+            else:
+                # 轮数不超过保留轮数时（如只有一轮很长的对话）没有可合并的历史，交给 trim_history 截断
+                keep_from = turn_starts[-keep_turns] if len(turn_starts) >= keep_turns else 0
+            older = history[:keep_from]
+            if older:
+                previous = next((m.content for m in messages if m.id == MEMORY_SUMMARY_ID), '')
+                summary = await self.summarize_history(previous, older)
+                if summary:
+                    updates += [RemoveMessage(id=m.id) for m in older]
+                    updates.append(SystemMessage(id=MEMORY_SUMMARY_ID, content=summary))
+                    logger.info(f'[会话记忆] {len(older)} 条历史消息（约 {count_tokens(older)} token）已合并为摘要')
+
+        if tool_ids:
+            logger.info(f'[会话记忆] 清理已结束轮次的工具消息 {len(tool_ids)} 条')
+        return {"messages": updates} if updates else {}
+
+    async def summarize_history(self, previous: str, messages: list[BaseMessage]) -> str | None:
+        previous = previous.removeprefix(MEMORY_SUMMARY_PREFIX)
+        conversation = '\n'.join(f'{"用户" if isinstance(m, HumanMessage) else "助手"}：{m.content}' for m in messages)
+        try:
+            resp = await ainvoke_llm(self.llm, [HumanMessage(content=MEMORY_SUMMARY_PROMPT.format(
+                summary=previous or '无', conversation=conversation))], node="memory")
+        except Exception as e:
+            # 摘要失败时保留原文，由 trim_history 兜底截断
+            logger.error(f'[会话记忆] 生成摘要失败：{e}')
+            return None
+        content = (resp.content or '').strip()
+        return f'{MEMORY_SUMMARY_PREFIX}{content}' if content else None
 
     async def chat_node(self, state: AgentState):
         messages = state['messages']
-        messages = [m for m in messages if not isinstance(m, SystemMessage)]
-        messages = [SystemMessage(content=CHAT_SYSTEM_PROMPT), *messages]
 
         messages_without_tool = []
         for msg in messages:
@@ -100,21 +124,21 @@ class AgentInstance:
             else:
                 messages_without_tool.append(msg)
 
-        clean_messages = self.use_trimmer(messages_without_tool)
+        clean_messages = assemble_prompt(CHAT_SYSTEM_PROMPT, messages_without_tool)
 
-        response = await self.llm.ainvoke(clean_messages)
+        response = await ainvoke_llm(self.llm, clean_messages, node="chat_agent")
         self.print_message(clean_messages + [response])
         return {"messages": [response]}
 
     async def router_node(self, state: AgentState):
+        if state.get("has_upload"):
+            logger.info('[路由] 本轮上传了文件，直接交给 SQL agent')
+            return {"next_node": "rag_sql_agent", "prefetched_context": None}
+
         needed_messages = []
         for msg in reversed(state["messages"]):
             if isinstance(msg, HumanMessage):
-                content = msg.content or ""
-                marker = "用户问题："
-                if marker in content:
-                    content = content.split(marker, 1)[-1].strip()
-                needed_messages.append(HumanMessage(content=content))
+                needed_messages.append(HumanMessage(content=extract_question(msg.content)))
             elif isinstance(msg, AIMessage):
                 if not msg.tool_calls:
                     needed_messages.append(msg)
@@ -122,34 +146,79 @@ class AgentInstance:
             if len(needed_messages) >= 3:
                 break
 
-        logger.warning([SystemMessage(content=ROUTER_PROMPT), *reversed(needed_messages)])
-        resp = await self.llm.ainvoke([SystemMessage(content=ROUTER_PROMPT), *reversed(needed_messages)])
+        # 路由的同时预检索，路由到 CHAT 时直接取消
+        prefetch_task = None
+        if settings.SPECULATIVE_RETRIEVAL_ENABLED and needed_messages and isinstance(needed_messages[0], HumanMessage):
+            prefetch_task = asyncio.create_task(self.prefetch_context(needed_messages[0].content))
+        try:
+            next_node = await self.route(needed_messages, thread_has_upload=bool(state.get("thread_has_upload")))
+        except BaseException:
+            if prefetch_task:
+                prefetch_task.cancel()
+            raise
+
+        prefetched_context = None
+        if prefetch_task:
+            if next_node == "rag_sql_agent":
+                prefetched_context = await prefetch_task
+            else:
+                prefetch_task.cancel()
+                logger.info('[预检索] 路由到 CHAT，已丢弃')
+        return {"next_node": next_node, "prefetched_context": prefetched_context}
+
+    async def route(self, needed_messages: list[BaseMessage], thread_has_upload: bool = False) -> str:
+        # 先走本地向量路由，置信度足够则跳过 LLM 调用
+        # 会话有上传文件时问题可能指向文件内容，样例库无法判断，交给 LLM 路由
+        if self.fast_router and not thread_has_upload and needed_messages and isinstance(needed_messages[0], HumanMessage):
+            route_start_time = time.time()
+            fast_parsed = await self.fast_router.route(needed_messages[0].content)
+            hit = bool(fast_parsed) and fast_parsed.confidence >= settings.FAST_ROUTER_THRESHOLD
+            self.fast_router.record(hit, fast_parsed, time.time() - route_start_time)
+            if hit:
+                return "rag_sql_agent" if fast_parsed.route == "SQL" else "chat_agent"
+
+        route_messages = [SystemMessage(content=ROUTER_PROMPT), *reversed(needed_messages)]
+        if thread_has_upload:
+            route_messages.append(HumanMessage(content=UPLOAD_ROUTER_HINT))
+        logger.warning(route_messages)
+        llm_route_start_time = time.time()
+        resp = await ainvoke_llm(self.llm, route_messages, node="router")
 
         parsed = parse_route((resp.content or "").strip())
         logger.warning(parsed)
         if not parsed:
             # 重试一次：更强约束
-            resp2 = await self.llm.ainvoke([SystemMessage(content=ROUTER_PROMPT + "\n再次强调：只能输出 JSON。"), *reversed(needed_messages)])
+            # 强调放在末尾，保持系统提示词前缀不变
+            resp2 = await ainvoke_llm(self.llm, [*route_messages, HumanMessage(content="再次强调：只能输出 JSON。")],
+                                      node="router")
             parsed = parse_route((resp2.content or "").strip())
+        logger.info(f'[LLM路由] {parsed} 耗时 {(time.time() - llm_route_start_time):.4f}s')
 
         if not parsed:
-            return {"next_node": "chat_agent"}  # 回退
+            return "chat_agent"  # 回退
 
-        return {"next_node": "rag_sql_agent" if parsed.route == "SQL" else "chat_agent"}
+        return "rag_sql_agent" if parsed.route == "SQL" else "chat_agent"
 
-    async def agent_node(self, state: AgentState):
-        messages = state["messages"]
-        messages = [m for m in messages if not isinstance(m, SystemMessage)]
-        messages = [SystemMessage(content=AGENT_SYSTEM_PROMPT), *messages]
+    async def prefetch_context(self, question: str) -> str | None:
+        prefetch_start_time = time.time()
+        try:
+            result = await search_vector(self.ctx, question)
+        except Exception as e:
+            # 预检索失败不影响主流程，agent 会自行调用检索工具
+            logger.error(f'[预检索] 失败：{e}')
+            return None
+        logger.info(f'[预检索] 耗时 {(time.time() - prefetch_start_time):.4f}s')
+        return PREFETCHED_CONTEXT_PROMPT.format(**result)
 
-        clean_messages = self.use_trimmer(messages)
-        response = await self.llm_with_tools.ainvoke(clean_messages)
+    async def agent_node(self, state: AgentState):
+        clean_messages = assemble_prompt(AGENT_SYSTEM_PROMPT, state["messages"], context=state.get("prefetched_context"))
+        response = await ainvoke_llm(self.llm_with_tools, clean_messages, node="rag_sql_agent")
         if response.response_metadata.get('finish_reason') == 'stop':
             self.print_message(clean_messages + [response])
 
         return {"messages": [response]}
 
-    async def summarize_node(self, state: AgentState):
+    async def summarize_node(self, state: AgentState, config: RunnableConfig):
         # 取最后一个用户问题
         question = None
         for m in reversed(state["messages"]):
@@ -166,15 +235,69 @@ class AgentInstance:
 
         if not payload or not isinstance(payload, dict):
             # 中间结果缺失，按失败处理
-            return {"messages": [AIMessage(content="暂无相关数据，请点击消息下方👎️反馈给我们")]}
+            return {"messages": [await self.emit_summary(NO_DATA_ANSWER, config)]}
+
+        # 结构简单的中间结果直接本地渲染，省去一次 LLM 调用
+        if settings.SUMMARY_RENDER_ENABLED:
+            rendered = render_summary(payload)
+            logger.info(f'[整理节点] {"本地渲染" if rendered else "LLM 整理"}')
+            if rendered:
+                return {"messages": [await self.emit_summary(rendered, config)]}
 
         inp = [
             SystemMessage(content=SUMMARY_SYSTEM_PROMPT),
             HumanMessage(content=f"用户问题：{question}\n\n中间数据：{json.dumps(payload, ensure_ascii=False)}")
         ]
-        resp = await self.llm.ainvoke(inp)
+        resp = await ainvoke_llm(self.llm, inp, node="summarize")
         return {"messages": [resp]}
 
+    @staticmethod
+    async def emit_summary(content: str, config: RunnableConfig) -> AIMessage:
+        """非 LLM 生成的回答通过自定义事件分片推送，与 LLM 流式输出走同一条 SSE delta"""
+        for i in range(0, len(content), SUMMARY_CHUNK_SIZE):
+            await adispatch_custom_event(SUMMARY_DELTA_EVENT, {"text": content[i:i + SUMMARY_CHUNK_SIZE]}, config=config)
+        return AIMessage(content=content)
+
+    async def run_tool_call(self, tool_call: dict, config: RunnableConfig, request_semaphore: asyncio.Semaphore,
+                            hotel_semaphore: asyncio.Semaphore) -> tuple[ToolMessage, float]:
+        tool_ = self.tools_by_name.get(tool_call["name"])
+        if tool_ is None:
+            return ToolMessage(content=f"执行失败: 工具 {tool_call['name']} 不存在", name=tool_call["name"],
+                               tool_call_id=tool_call["id"], status="error"), 0.0
+
+        # 只有落到 PMS 库的 SQL 才占用酒店维度的并发额度
+        hotel_limit = hotel_semaphore if tool_call["name"] == pms_query_mysql.name else nullcontext()
+        async with request_semaphore, hotel_limit:
+            call_start_time = time.perf_counter()
+            try:
+                message = await tool_.ainvoke({**tool_call, "type": "tool_call"}, config)
+            except Exception as e:
+                logger.error(f'工具 {tool_call["name"]} 执行异常：{e}', exc_info=True)
+                message = ToolMessage(content=f"执行失败: {str(e)}", name=tool_call["name"],
+                                      tool_call_id=tool_call["id"], status="error")
+            return message, time.perf_counter() - call_start_time
+
+    async def tools_node(self, state: AgentState, config: RunnableConfig):
+        """
+        并发执行同一条 AIMessage 中的全部 tool_calls，结果按 tool_calls 原顺序返回
+        """
+        tool_calls = state["messages"][-1].tool_calls
+        request_semaphore = asyncio.Semaphore(settings.TOOL_CONCURRENCY_PER_REQUEST)
+        hotel_semaphore = get_hotel_semaphore(state.get("hotel_id"))
+
+        step_start_time = time.perf_counter()
+        results = await asyncio.gather(*[
+            self.run_tool_call(tool_call, config, request_semaphore, hotel_semaphore) for tool_call in tool_calls
+        ])
+        wall_time = time.perf_counter() - step_start_time
+
+        sequential_time = sum(elapsed for _, elapsed in results)
+        for tool_call, (_, elapsed) in zip(tool_calls, results):
+            logger.info(f'[工具耗时] {tool_call["name"]} {elapsed:.4f}s')
+        logger.info(f'[工具并发] {len(tool_calls)} 个调用，墙钟 {wall_time:.4f}s，串行合计 {sequential_time:.4f}s，'
+                    f'节省 {max(sequential_time - wall_time, 0):.4f}s')
+        return {"messages": [message for message, _ in results]}
+
     @staticmethod
     def should_continue(state: AgentState) -> Literal["tools", "summarize"]:
         last_message = state["messages"][-1]
@@ -183,19 +306,20 @@ class AgentInstance:
         return "summarize"
 
     def build(self, ctx: AgentContext, checkpointer=None):
-        tools = self.init_tools_and_llm(ctx)
+        self.init_tools_and_llm(ctx)
         workflow = StateGraph(AgentState)
 
         # 添加节点
         workflow.add_node("rag_sql_agent", self.agent_node)
         workflow.add_node("chat_agent", self.chat_node)
+        workflow.add_node("memory", self.memory_node)
         workflow.add_node("router", self.router_node)
         workflow.add_node("summarize", self.summarize_node)
 
-        tool_node = ToolNode(tools)
-        workflow.add_node("tools", tool_node)
+        workflow.add_node("tools", self.tools_node)
 
-        workflow.set_entry_point("router")
+        workflow.set_entry_point("memory")
+        workflow.add_edge("memory", "router")
         workflow.add_conditional_edges(
             "router",
             lambda state: state["next_node"],  # 读取 next_node 字段
@@ -219,26 +343,9 @@ class AgentInstance:
     @staticmethod
     def count_tokens(messages: list[BaseMessage]) -> int:
         """
-        使用 cl100k_base (GPT-4标准) 估算 DeepSeek 的 Token 数
+        使用 cl100k_base (GPT-4标准) 估算 DeepSeek 的 Token 数，单条消息的结果会被缓存
         """
-        encoding = tiktoken.get_encoding("cl100k_base")
-        num_tokens = 0
-        for m in messages:
-            # 每条消息的基础开销 (OpenAI 标准通常是 3 token: <|start|>, role, <|end|>)
-            num_tokens += 3
-
-            # 计算内容的 token
-            # 注意：这里要做个判空，因为有些 ToolMessage content 可能是 None
-            content = m.content or ""
-            num_tokens += len(encoding.encode(str(content)))
-
-            # 如果有 tool_calls (AI 正在呼叫工具)，这些也要算 token
-            if hasattr(m, "tool_calls") and m.tool_calls:
-                for tool_call in m.tool_calls:
-                    # 简单估算：函数名 + 参数 json 的长度
-                    num_tokens += len(encoding.encode(str(tool_call)))
-
-        return num_tokens
+        return count_tokens(messages)
 
     @staticmethod
     def print_message(msg_list):
@@ -0,0 +1,67 @@
+import json
+import logging
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config.config import settings
+from schemas.pms_agent_schema import RouteOut
+
+logger = logging.getLogger(__name__)
+
+
+class FastRouter:
+    """
+    基于向量的本地路由分类器（最近质心）
+    用已加载的 bge 模型对 SQL/CHAT 样例编码，取每类的归一化质心，
+    对用户问题做余弦相似度 + softmax 得到置信度，置信度不足时交给 LLM 路由
+    """
+
+    def __init__(self, embeddings: Embeddings, examples_path: str = settings.ROUTER_EXAMPLES_PATH,
+                 temperature: float = settings.FAST_ROUTER_TEMPERATURE):
+        self.embeddings = embeddings
+        self.examples_path = examples_path
+        self.temperature = temperature
+        self.labels: list[str] = []
+        self.centroids: np.ndarray | None = None
+        # total-总决策数 hit-本地路由直接命中 fallback-回退 LLM 路由
+        self.stats = {'total': 0, 'hit': 0, 'fallback': 0}
+
+    def fit(self):
+        with open(self.examples_path, 'r', encoding='utf-8') as f:
+            examples: dict[str, list[str]] = json.load(f)
+
+        labels, centroids = [], []
+        for label, texts in examples.items():
+            vectors = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+            centroid = vectors.mean(axis=0)
+            centroids.append(centroid / np.linalg.norm(centroid))
+            labels.append(label)
+        self.labels = labels
+        self.centroids = np.vstack(centroids)
+        logger.info(f">>> 快速路由已加载 {sum(len(v) for v in examples.values())} 条样例")
+        return self
+
+    async def route(self, question: str) -> RouteOut | None:
+        """返回本地路由结果，未初始化或编码失败时返回 None"""
+        if self.centroids is None or not question:
+            return None
+        try:
+            vector = np.asarray(await self.embeddings.aembed_query(question), dtype=np.float32)
+        except Exception as e:
+            logger.error(f'快速路由编码失败：{e}')
+            return None
+
+        similarity = self.centroids @ (vector / np.linalg.norm(vector))
+        logits = (similarity - similarity.max()) / self.temperature
+        probs = np.exp(logits) / np.exp(logits).sum()
+        best = int(probs.argmax())
+        return RouteOut(route=self.labels[best], confidence=round(float(probs[best]), 4))
+
+    def record(self, hit: bool, route: RouteOut | None, elapsed: float):
+        self.stats['total'] += 1
+        self.stats['hit' if hit else 'fallback'] += 1
+        hit_rate = self.stats['hit'] / self.stats['total']
+        logger.info(f'[快速路由] {"命中" if hit else "回退LLM"} {route} 耗时 {elapsed:.4f}s '
+                    f'命中率 {self.stats["hit"]}/{self.stats["total"]}={hit_rate:.2%}')
@@ -0,0 +1,76 @@
+import logging
+from collections import OrderedDict
+from functools import lru_cache
+
+import tiktoken
+from langchain_core.messages import BaseMessage
+
+logger = logging.getLogger(__name__)
+
+# 单条消息 token 数的缓存上限（超出后淘汰最久未使用的记录）
+TOKEN_CACHE_MAX_SIZE = 20000
+
+_token_cache: OrderedDict[tuple, int] = OrderedDict()
+
+
+@lru_cache(maxsize=1)
+def get_encoding() -> tiktoken.Encoding:
+    """
+    使用 cl100k_base (GPT-4标准) 估算 DeepSeek 的 Token 数，编码器全进程只加载一次
+    """
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def count_text_tokens(text: str) -> int:
+    return len(get_encoding().encode(text))
+
+
+def _cache_key(message: BaseMessage) -> tuple:
+    # str 对象会缓存自身的 hash，同一条消息重复计算时是 O(1)
+    # tool_calls 也计入 token，无 id 且 content 为空的 AIMessage 只能靠它区分
+    tool_calls = getattr(message, "tool_calls", None)
+    return (message.id or '', message.type, hash(str(message.content or "")),
+            hash(str(tool_calls)) if tool_calls else 0, getattr(message, "tool_call_id", None) or '')
+
+
+def count_message_tokens(message: BaseMessage) -> int:
+    key = _cache_key(message)
+    cached = _token_cache.get(key)
+    if cached is not None:
+        _token_cache.move_to_end(key)
+        return cached
+
+    encoding = get_encoding()
+    # 每条消息的基础开销 (OpenAI 标准通常是 3 token: <|start|>, role, <|end|>)
+    num_tokens = 3
+    # 注意：这里要做个判空，因为有些 ToolMessage content 可能是 None
+    num_tokens += len(encoding.encode(str(message.content or "")))
+    # 如果有 tool_calls (AI 正在呼叫工具)，这些也要算 token
+    if getattr(message, "tool_calls", None):
+        for tool_call in message.tool_calls:
+            # 简单估算：函数名 + 参数 json 的长度
+            num_tokens += len(encoding.encode(str(tool_call)))
+
+    _token_cache[key] = num_tokens
+    if len(_token_cache) > TOKEN_CACHE_MAX_SIZE:
+        _token_cache.popitem(last=False)
+    return num_tokens
+
+
+def count_tokens(messages: list[BaseMessage]) -> int:
+    return sum(count_message_tokens(m) for m in messages)
+
+
+def trim_last(messages: list[BaseMessage], max_tokens: int) -> list[BaseMessage]:
+    """
+    从末尾向前保留不超过 max_tokens 的最长消息后缀，与 trim_messages(strategy="last", allow_partial=False) 结果一致
+    每条消息只计数一次，且已计数的消息直接命中缓存，整体为线性复杂度
+    """
+    total = 0
+    start = len(messages)
+    for i in range(len(messages) - 1, -1, -1):
+        total += count_message_tokens(messages[i])
+        if total > max_tokens:
+            break
+        start = i
+    return messages[start:]
@@ -1,18 +1,37 @@
+import asyncio
 import logging
 import time
 
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 from sqlalchemy import text
 
+from config.config import settings
 from core.agent_context import AgentContext
 from core.db import pms_mysql_engine
+from core.sql_cache import normalize_sql, sql_cache, ttl_for
+from core.sql_guard import SqlGuardError, check_sql, explain_check
+from core.sql_result import ResultEncoder
+from core.sql_timeout import (SQL_TIMEOUT_MESSAGE, add_execution_time_hint, is_server_timeout, kill_query,
+                              sql_timeout_stats)
+from core.upload_query import UploadQueryTimeout, query_upload_db
 
 logger = logging.getLogger(__name__)
 
+# 每个酒店同时在 PMS 库上执行的 SQL 数量上限（进程内）
+_hotel_semaphores: dict[int, asyncio.Semaphore] = {}
+
+
+def get_hotel_semaphore(hotel_id: int | None) -> asyncio.Semaphore:
+    if hotel_id not in _hotel_semaphores:
+        _hotel_semaphores[hotel_id] = asyncio.Semaphore(settings.TOOL_CONCURRENCY_PER_HOTEL)
+    return _hotel_semaphores[hotel_id]
+
 
 # class QueryResult:
 #     code: int
 #     result:
+@tool
 async def pms_query_mysql(query: str):
     """
     这是一个mysql数据库检索工具，执行SQL查询并返回结果，注意，只允许进行查询且使用此工具查询的表结构没有注释
@@ -20,28 +39,132 @@ async def pms_query_mysql(query: str):
         query: SQL语句
 
     Returns:
-        code: 状态码（0-成功，-1-失败，-2-不允许更改数据）
+        code: 状态码（0-成功，-1-失败，-2-不允许更改数据，-3-未通过执行前检查，-4-执行超时）
         result: 状态码为0时，返回查询结果；状态码不为0时，返回查询失败原因
+            状态码为-2/-3时 result 为JSON：{"reason": 错误类型, "message": 原因, "suggestion": 改写建议}，
+            reason 可能为 MISSING_HOTEL_FILTER（缺少 hotel_id 过滤）、PLAN_TOO_EXPENSIVE（预估扫描行数过多）、PARSE_ERROR 等，请按建议改写后重试
+            未写 LIMIT 的查询会被自动追加 LIMIT，结果超过该行数时 limit_hit=true
+            状态码为-4时查询已被中断，请缩小时间范围、增加筛选条件或拆分为更简单的查询，不要原样重试
+            查询结果格式：第一行为 rows=总行数 shown=展示行数 truncated=是否截断 limit_hit=是否触达行数上限，第二行为列名，之后每行一条CSV数据；
+            truncated=true 时只展示部分明细并附带数值列的合计/最小/最大值，limit_hit=true 时总行数与统计值只覆盖已读取的部分，
+            需要完整数据时请改用聚合查询或增加筛选条件
     """
     # logger.info(f"[工具调用] 正在执行 SQL: {query}")
     try:
-        query_header = ['SELECT', 'select', 'show', 'SHOW', 'DESCRIBE', 'describe']
-        if not any([query.startswith(i) for i in query_header]):
-            # if not query.startswith('SELECT') and not query.startswith('select'):
-            return -2, f"执行失败: 不允许篡改数据"
+        # 解析校验只读、酒店过滤，并为无 LIMIT 的查询追加 LIMIT（多取一行判断是否触达上限）
+        query, injected_limit = check_sql(query)
+
+        cache_key = normalize_sql(query)
+        if settings.SQL_CACHE_ENABLED:
+            cached = sql_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f'[SQL缓存] 命中 {cache_key[:100]}')
+                return 0, cached
+
         query_start_time = time.time()
         async with pms_mysql_engine.connect() as conn:
-            result = await conn.execute(text(query))
-            rows = result.fetchall()
+            await explain_check(conn, query)
+            connection_id = (await conn.execute(text('SELECT CONNECTION_ID()'))).scalar()
+            try:
+                async with asyncio.timeout(settings.SQL_STATEMENT_TIMEOUT):
+                    # 流式游标分批读取，超出展示预算的行只做统计，不在内存中保留
+                    result = await conn.stream(text(add_execution_time_hint(query)))
+                    row_cap = min(injected_limit or settings.SQL_RESULT_MAX_SCAN_ROWS, settings.SQL_RESULT_MAX_SCAN_ROWS)
+                    encoder = ResultEncoder(list(result.keys()), row_cap=row_cap)
+                    while rows := await result.fetchmany(settings.SQL_FETCH_BATCH_SIZE):
+                        encoder.add_rows(rows)
+                        if encoder.limit_hit:
+                            break
+                    await result.close()
+            except (TimeoutError, asyncio.CancelledError) as e:
+                # 客户端超时或请求被取消时服务端仍在执行，需要在旁路连接上中断，避免长期占用连接
+                sql_timeout_stats.incr('client_timeout' if isinstance(e, TimeoutError) else 'cancelled')
+                await asyncio.shield(kill_query(connection_id))
+                raise
             query_end_time = time.time()
-            logger.info(f'查询耗时 {(query_end_time - query_start_time):4f}s')
-            data = [dict(row._mapping) for row in rows]
-        return 0, str(data)
+            logger.info(f'查询耗时 {(query_end_time - query_start_time):4f}s，共 {encoder.row_count} 行，'
+                        f'截断={encoder.truncated} 触达上限={encoder.limit_hit}')
+        data = encoder.encode()
+        if settings.SQL_CACHE_ENABLED:
+            sql_cache.set(cache_key, data, ttl=ttl_for(cache_key))
+        return 0, data
+    except SqlGuardError as e:
+        logger.warning(f'sql未通过检查：{e.reason} {query}')
+        return e.to_result()
+    except TimeoutError:
+        logger.warning(f'sql执行超时：{query}')
+        return -4, SQL_TIMEOUT_MESSAGE
     except Exception as e:
+        if is_server_timeout(e):
+            sql_timeout_stats.incr('server_timeout')
+            logger.warning(f'sql执行超时（服务端中断）：{query}')
+            return -4, SQL_TIMEOUT_MESSAGE
         logger.error(f'sql执行异常：{e}')
         return -1, f"执行失败: {str(e)}"
 
 
+@tool
+async def query_uploaded_file(query: str, config: RunnableConfig):
+    """
+    这是用户上传文件的查询工具：用户在本会话上传的 Excel 已导入本地 SQLite 数据库，每个工作表一张表，
+    表名、列名与示例数据见用户消息中的说明。只允许查询，使用 SQLite 语法，中文列名需用双引号包裹，无需 hotel_id 过滤
+    Args:
+        query: SQL语句
+
+    Returns:
+        code: 状态码（0-成功，-1-失败，-2-不允许更改数据，-3-SQL无法解析，-4-执行超时）
+        result: 格式与 pms_query_mysql 相同：成功时第一行为 rows=总行数 shown=展示行数 truncated=是否截断 limit_hit=是否触达行数上限，第二行为列名，之后每行一条CSV数据；
+            状态码不为0时为失败原因
+    """
+    # 上传库按会话隔离，thread_id 由图的运行配置传入，不经过模型
+    thread_id = (config.get("configurable") or {}).get("thread_id")
+    try:
+        return 0, await asyncio.to_thread(query_upload_db, thread_id, query)
+    except SqlGuardError as e:
+        logger.warning(f'上传文件sql未通过检查：{e.reason} {query}')
+        return e.to_result()
+    except UploadQueryTimeout:
+        logger.warning(f'上传文件sql执行超时：{query}')
+        return -4, SQL_TIMEOUT_MESSAGE
+    except FileNotFoundError as e:
+        return -1, f"执行失败: {str(e)}"
+    except Exception as e:
+        logger.error(f'上传文件sql执行异常：{e}')
+        return -1, f"执行失败: {str(e)}"
+
+
+async def search_vector(ctx: AgentContext, query: str, k: int = 5, qa_min_score: float = 0.85) -> dict:
+    """检索表结构与预设问答sql，供向量检索工具与路由阶段的预检索共用"""
+    vs_schema = ctx.vs_schema
+    vs_qa = ctx.vs_qa
+    if vs_schema is None or vs_qa is None:
+        raise Exception('初始化未完成')
+
+    # instruction = f'为这个句子生成表示以用于检索相关文章：{query}'
+    # schema_search_result = await vs_schema.amax_marginal_relevance_search(query=query, k=k, fetch_k=20,
+    #                                                                       lambda_mult=0.5)
+    # 两个集合共用同一个查询向量，只做一次前向计算
+    query_embedding = await ctx.embeddings.aembed_query(query)
+    schema_search_result, qa_search_result = await asyncio.gather(
+        vs_schema.asimilarity_search_by_vector(query_embedding, k=k),
+        asyncio.to_thread(vs_qa.similarity_search_by_vector_with_relevance_scores, query_embedding, k=k),
+    )
+
+    # 分数越低越相关
+    schema_result, qa_result = '', ''
+    for doc in schema_search_result:
+        doc = f'表名：{doc.metadata['table_name']}\n表中文名：{doc.metadata['table_zh_name']}\n表结构：{doc.metadata['table_structure']}\n'
+        schema_result += doc
+
+    index_ = 0
+    for doc, score in qa_search_result:
+        index_ += 1
+        if score <= qa_min_score:
+            doc = f'{index_}. -该句sql的对应场景：{doc.page_content}\n-备注：{doc.metadata['remark']}\n-sql内容：{doc.metadata['answer']}\n\n'
+            qa_result += doc
+    return {'qa_result': qa_result, 'schema_result': schema_result}
+
+
 def pms_search_vector(ctx: AgentContext):
     @tool
     async def agent_search_vector(query: str, k: int = 5, qa_min_score: float = 0.85):
@@ -63,29 +186,6 @@ def pms_search_vector(ctx: AgentContext):
                     }
         """
         # logger.info(f"[工具调用] 正在检索向量数据库: {query}")
-        vs_schema = ctx.vs_schema
-        vs_qa = ctx.vs_qa
-        if vs_schema is None or vs_qa is None:
-            raise Exception('初始化未完成')
-
-        # instruction = f'为这个句子生成表示以用于检索相关文章：{query}'
-        schema_search_result = await vs_schema.asimilarity_search(query, k=k)
-        # schema_search_result = await vs_schema.amax_marginal_relevance_search(query=query, k=k, fetch_k=20,
-        #                                                                       lambda_mult=0.5)
-        qa_search_result = await vs_qa.asimilarity_search_with_score(query, k=k)
-
-        # 分数越低越相关
-        schema_result, qa_result = '', ''
-        for doc in schema_search_result:
-            doc = f'表名：{doc.metadata['table_name']}\n表中文名：{doc.metadata['table_zh_name']}\n表结构：{doc.metadata['table_structure']}\n'
-            schema_result += doc
-
-        index_ = 0
-        for doc, score in qa_search_result:
-            index_ += 1
-            if score <= qa_min_score:
-                doc = f'{index_}. -该句sql的对应场景：{doc.page_content}\n-备注：{doc.metadata['remark']}\n-sql内容：{doc.metadata['answer']}\n\n'
-                qa_result += doc
-        return {'qa_result': qa_result, 'schema_result': schema_result}
+        return await search_vector(ctx, query, k, qa_min_score)
 
     return agent_search_vector
@@ -0,0 +1,114 @@
+import logging
+import re
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from config.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 用户要求重新查询时跳过缓存
+BYPASS_PATTERN = re.compile(r'再查一遍|再查一次|重新查|重查|刷新|最新数据|实时数据')
+# 问题中的数字与字母编号（房号、订单号、金额、手机号等），语义相近但实体不同的问题不能共用答案
+ENTITY_PATTERN = re.compile(r'[A-Za-z]*\d+(?:\.\d+)?[A-Za-z]*|[A-Za-z]{2,}')
+
+
+def question_entities(question: str) -> str:
+    return ','.join(sorted({m.upper() for m in ENTITY_PATTERN.findall(question or '')}))
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    vector: np.ndarray
+    expires_at: float
+
+
+class AnswerCache:
+    """
+    酒店维度的语义答案缓存
+    以 (hotel_id, 时间窗口, 问题实体) 分桶，桶内按问题向量的余弦相似度匹配，
+    时间窗口包含今天的答案使用短 TTL，历史窗口使用长 TTL，
+    写入时清理所有过期桶并限制总条目数，过去窗口的桶不会一直占用内存
+    """
+
+    def __init__(self, threshold: float = settings.ANSWER_CACHE_THRESHOLD,
+                 max_entries_per_bucket: int = settings.ANSWER_CACHE_BUCKET_SIZE,
+                 max_entries: int = settings.ANSWER_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.max_entries_per_bucket = max_entries_per_bucket
+        self.max_entries = max_entries
+        self.buckets: dict[tuple[int, str, str], list[CachedAnswer]] = {}
+        self.stats = {'hit': 0, 'miss': 0, 'bypass': 0, 'store': 0}
+
+    @staticmethod
+    def should_bypass(question: str, refresh: bool = False) -> bool:
+        return refresh or bool(BYPASS_PATTERN.search(question or ''))
+
+    def get(self, hotel_id: int, window: str, vector: list[float], entities: str = '') -> CachedAnswer | None:
+        now = time.time()
+        key = (hotel_id, window, entities)
+        bucket = [e for e in self.buckets.get(key, []) if e.expires_at > now]
+        if bucket:
+            self.buckets[key] = bucket
+        else:
+            self.buckets.pop(key, None)
+
+        query = np.asarray(vector, dtype=np.float32)
+        best, best_score = None, self.threshold
+        for entry in bucket:
+            score = float(entry.vector @ query)
+            if score >= best_score:
+                best, best_score = entry, score
+
+        self.stats['hit' if best else 'miss'] += 1
+        if best:
+            logger.info(f'[答案缓存] 命中 hotel_id={hotel_id} 窗口={window} 相似度={best_score:.4f} 原问题={best.question}')
+        return best
+
+    def set(self, hotel_id: int, window: str, vector: list[float], question: str, answer: str, includes_today: bool,
+            entities: str = ''):
+        ttl = settings.ANSWER_CACHE_TODAY_TTL if includes_today else settings.ANSWER_CACHE_HISTORY_TTL
+        bucket = self.buckets.setdefault((hotel_id, window, entities), [])
+        bucket.append(CachedAnswer(question=question,
+                                   answer=answer,
+                                   vector=np.asarray(vector, dtype=np.float32),
+                                   expires_at=time.time() + ttl))
+        if len(bucket) > self.max_entries_per_bucket:
+            bucket.pop(0)
+        self.stats['store'] += 1
+        self.evict()
+
+    def evict(self):
+        """清理过期条目，总条目数超出上限时按过期时间从早到晚淘汰"""
+        now = time.time()
+        for key in list(self.buckets):
+            bucket = [e for e in self.buckets[key] if e.expires_at > now]
+            if bucket:
+                self.buckets[key] = bucket
+            else:
+                del self.buckets[key]
+
+        total = sum(len(b) for b in self.buckets.values())
+        while total > self.max_entries:
+            # 桶内按写入顺序排列且 TTL 相同，桶首即该桶最早过期的条目
+            key = min(self.buckets, key=lambda k: self.buckets[k][0].expires_at)
+            bucket = self.buckets[key]
+            bucket.pop(0)
+            if not bucket:
+                del self.buckets[key]
+            total -= 1
+
+    def get_stats(self) -> dict:
+        lookups = self.stats['hit'] + self.stats['miss']
+        return {
+            **self.stats,
+            'hit_rate': round(self.stats['hit'] / lookups, 4) if lookups else 0,
+            'entries': sum(len(b) for b in self.buckets.values()),
+        }
+
+
+answer_cache = AnswerCache()
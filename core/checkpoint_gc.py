@@ -0,0 +1,238 @@
+"""
+AsyncPostgresSaver 的 checkpoint 清理：
+1. 闲置超过 CHECKPOINT_MAX_IDLE_DAYS 的会话整体删除
+2. 其余会话只保留最新 CHECKPOINT_KEEP_LATEST 个 checkpoint，并删除不再被引用的 writes / blobs
+3. 同样闲置超过 CHECKPOINT_MAX_IDLE_DAYS 的上传文件库（UPLOAD_DB_DIR 下按会话的 SQLite）
+
+按会话分批执行，每批一个事务，批之间休眠以限制对库的压力；多进程部署时用 advisory lock 保证同一时间只有一个进程在清理
+删除后空间需由 autovacuum 回收，报告中的字节数为删除行的 pg_column_size 之和（近似值）
+
+命令行执行（--dry-run 只统计不删除）：
+python -m core.checkpoint_gc --dry-run
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+
+from psycopg_pool import AsyncConnectionPool
+
+from config.config import settings
+from core.db import POSTGRES_CONNECTION_KWARGS, POSTGRES_DB_URL
+from utils.excel_parser import remove_stale_upload_dbs
+
+logger = logging.getLogger(__name__)
+
+# 各进程共用的 advisory lock 键
+GC_LOCK_KEY = 0x636B7074
+CHECKPOINT_TABLES = ('checkpoints', 'checkpoint_writes', 'checkpoint_blobs')
+
+IDLE_THREADS_SQL = """
+SELECT thread_id FROM checkpoints
+WHERE thread_id > %(after)s
+GROUP BY thread_id
+HAVING max((checkpoint ->> 'ts')::timestamptz) < %(idle_before)s
+ORDER BY thread_id
+LIMIT %(limit)s
+"""
+
+COMPACT_THREADS_SQL = """
+SELECT thread_id FROM checkpoints
+WHERE thread_id > %(after)s
+GROUP BY thread_id
+HAVING count(*) > %(keep)s
+   AND max((checkpoint ->> 'ts')::timestamptz) BETWEEN %(idle_before)s AND %(active_before)s
+ORDER BY thread_id
+LIMIT %(limit)s
+"""
+
+DELETE_THREADS_SQL = """
+WITH deleted AS (
+    DELETE FROM {table} t WHERE t.thread_id = ANY(%(thread_ids)s)
+    RETURNING pg_column_size(t.*) AS size
+)
+SELECT count(*), coalesce(sum(size), 0) FROM deleted
+"""
+
+DELETE_OLD_CHECKPOINTS_SQL = """
+WITH ranked AS (
+    SELECT thread_id, checkpoint_ns, checkpoint_id,
+           row_number() OVER (PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC) AS rn
+    FROM checkpoints
+    WHERE thread_id = ANY(%(thread_ids)s)
+), deleted AS (
+    DELETE FROM checkpoints c USING ranked r
+    WHERE c.thread_id = r.thread_id AND c.checkpoint_ns = r.checkpoint_ns AND c.checkpoint_id = r.checkpoint_id
+      AND r.rn > %(keep)s
+    RETURNING pg_column_size(c.*) AS size
+)
+SELECT count(*), coalesce(sum(size), 0) FROM deleted
+"""
+
+DELETE_ORPHAN_WRITES_SQL = """
+WITH deleted AS (
+    DELETE FROM checkpoint_writes w
+    WHERE w.thread_id = ANY(%(thread_ids)s)
+      AND NOT EXISTS (
+          SELECT 1 FROM checkpoints c
+          WHERE c.thread_id = w.thread_id AND c.checkpoint_ns = w.checkpoint_ns AND c.checkpoint_id = w.checkpoint_id
+      )
+    RETURNING pg_column_size(w.*) AS size
+)
+SELECT count(*), coalesce(sum(size), 0) FROM deleted
+"""
+
+# blob 按 (channel, version) 存储，只有仍被某个 checkpoint 的 channel_versions 引用的版本需要保留
+DELETE_ORPHAN_BLOBS_SQL = """
+WITH deleted AS (
+    DELETE FROM checkpoint_blobs b
+    WHERE b.thread_id = ANY(%(thread_ids)s)
+      AND NOT EXISTS (
+          SELECT 1 FROM checkpoints c
+          WHERE c.thread_id = b.thread_id AND c.checkpoint_ns = b.checkpoint_ns
+            AND c.checkpoint -> 'channel_versions' ->> b.channel = b.version
+      )
+    RETURNING pg_column_size(b.*) AS size
+)
+SELECT count(*), coalesce(sum(size), 0) FROM deleted
+"""
+
+
+class GcReport:
+    def __init__(self):
+        self.threads_deleted = 0
+        self.threads_compacted = 0
+        self.rows = {table: 0 for table in CHECKPOINT_TABLES}
+        self.bytes = 0
+        self.upload_dbs_deleted = 0
+
+    def add(self, table: str, rows: int, size: int):
+        self.rows[table] += rows
+        self.bytes += size
+
+    def to_dict(self) -> dict:
+        return {
+            'threads_deleted': self.threads_deleted,
+            'threads_compacted': self.threads_compacted,
+            'rows': dict(self.rows),
+            'bytes': self.bytes,
+            'upload_dbs_deleted': self.upload_dbs_deleted,
+        }
+
+    def __str__(self):
+        rows = '，'.join(f'{table} {count} 行' for table, count in self.rows.items())
+        return (f'删除闲置会话 {self.threads_deleted} 个，压缩会话 {self.threads_compacted} 个，{rows}，'
+                f'约 {self.bytes / 1024 / 1024:.2f} MB，上传文件库 {self.upload_dbs_deleted} 个')
+
+
+class CheckpointGC:
+    def __init__(self, pool: AsyncConnectionPool,
+                 keep_latest: int = settings.CHECKPOINT_KEEP_LATEST,
+                 max_idle_days: int = settings.CHECKPOINT_MAX_IDLE_DAYS,
+                 active_seconds: int = settings.CHECKPOINT_GC_ACTIVE_SECONDS,
+                 batch_size: int = settings.CHECKPOINT_GC_BATCH_SIZE,
+                 batch_interval: float = settings.CHECKPOINT_GC_BATCH_INTERVAL):
+        if keep_latest < 1:
+            raise ValueError('keep_latest 至少为 1')
+        self.pool = pool
+        self.keep_latest = keep_latest
+        self.max_idle_days = max_idle_days
+        self.active_seconds = active_seconds
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.last_report: GcReport | None = None
+
+    async def _select_threads(self, sql: str, params: dict) -> list[str]:
+        async with self.pool.connection() as conn:
+            cursor = await conn.execute(sql, params)
+            return [row[0] for row in await cursor.fetchall()]
+
+    async def _delete_batch(self, statements: list[tuple[str, str]], params: dict, report: GcReport, dry_run: bool):
+        """同一批会话的删除在一个事务里完成；dry_run 时执行后回滚，只统计"""
+        async with self.pool.connection() as conn:
+            async with conn.transaction(force_rollback=dry_run):
+                for table, sql in statements:
+                    cursor = await conn.execute(sql, params)
+                    rows, size = await cursor.fetchone()
+                    report.add(table, rows, size)
+
+    async def _run_pass(self, select_sql: str, select_params: dict, statements: list[tuple[str, str]],
+                        delete_params: dict, report: GcReport, dry_run: bool) -> int:
+        threads, after = 0, ''
+        while thread_ids := await self._select_threads(select_sql, {**select_params, 'after': after,
+                                                                    'limit': self.batch_size}):
+            await self._delete_batch(statements, {**delete_params, 'thread_ids': thread_ids}, report, dry_run)
+            threads += len(thread_ids)
+            after = thread_ids[-1]
+            await asyncio.sleep(self.batch_interval)
+        return threads
+
+    async def delete_idle_threads(self, report: GcReport, dry_run: bool = False):
+        idle_before = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=self.max_idle_days)
+        statements = [(table, DELETE_THREADS_SQL.format(table=table)) for table in CHECKPOINT_TABLES]
+        report.threads_deleted += await self._run_pass(IDLE_THREADS_SQL, {'idle_before': idle_before}, statements,
+                                                       {}, report, dry_run)
+
+    async def compact_threads(self, report: GcReport, dry_run: bool = False):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        # 闲置会话由 delete_idle_threads 处理，这里只压缩其余不活跃的会话
+        idle_before = now - datetime.timedelta(days=self.max_idle_days)
+        active_before = now - datetime.timedelta(seconds=self.active_seconds)
+        statements = [
+            ('checkpoints', DELETE_OLD_CHECKPOINTS_SQL),
+            ('checkpoint_writes', DELETE_ORPHAN_WRITES_SQL),
+            ('checkpoint_blobs', DELETE_ORPHAN_BLOBS_SQL),
+        ]
+        select_params = {'keep': self.keep_latest, 'idle_before': idle_before, 'active_before': active_before}
+        report.threads_compacted += await self._run_pass(COMPACT_THREADS_SQL, select_params, statements,
+                                                         {'keep': self.keep_latest}, report, dry_run)
+
+    async def run_once(self, dry_run: bool = False) -> GcReport | None:
+        """执行一轮清理，其他进程正在清理时跳过并返回 None"""
+        async with self.pool.connection() as lock_conn:
+            cursor = await lock_conn.execute('SELECT pg_try_advisory_lock(%s)', (GC_LOCK_KEY,))
+            if not (await cursor.fetchone())[0]:
+                logger.info('[Checkpoint清理] 其他进程正在清理，跳过')
+                return None
+            try:
+                report = GcReport()
+                await self.delete_idle_threads(report, dry_run)
+                await self.compact_threads(report, dry_run)
+                # 上传文件库随闲置会话一起清理
+                report.upload_dbs_deleted = await asyncio.to_thread(remove_stale_upload_dbs, self.max_idle_days, dry_run)
+            finally:
+                await lock_conn.execute('SELECT pg_advisory_unlock(%s)', (GC_LOCK_KEY,))
+        self.last_report = report
+        logger.info(f'[Checkpoint清理]{"（试运行）" if dry_run else ""} {report}')
+        return report
+
+    async def run_forever(self, interval: float = settings.CHECKPOINT_GC_INTERVAL):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f'[Checkpoint清理] 失败：{e}', exc_info=True)
+            await asyncio.sleep(interval)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='清理 LangGraph checkpoint')
+    parser.add_argument('--dry-run', action='store_true', help='只统计可回收的行数与字节数，不删除')
+    parser.add_argument('--keep', type=int, default=settings.CHECKPOINT_KEEP_LATEST, help='每个会话保留的 checkpoint 数')
+    parser.add_argument('--idle-days', type=int, default=settings.CHECKPOINT_MAX_IDLE_DAYS, help='闲置会话的天数')
+    parser.add_argument('--batch-size', type=int, default=settings.CHECKPOINT_GC_BATCH_SIZE, help='每批处理的会话数')
+    args = parser.parse_args()
+
+    async with AsyncConnectionPool(conninfo=POSTGRES_DB_URL, max_size=2, kwargs=POSTGRES_CONNECTION_KWARGS,
+                                   open=False) as pool:
+        gc = CheckpointGC(pool, keep_latest=args.keep, max_idle_days=args.idle_days, batch_size=args.batch_size)
+        report = await gc.run_once(dry_run=args.dry_run)
+        if report:
+            print(report.to_dict())
+
+
+if __name__ == '__main__':
+    from config.logger_config import init_logging_config
+
+    init_logging_config()
+    asyncio.run(main())
@@ -1,26 +1,165 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 
 from chromadb import Settings
 from langchain_chroma import Chroma
+from langchain_core.embeddings import Embeddings
 from langchain_huggingface import HuggingFaceEmbeddings
 from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
 from psycopg_pool import AsyncConnectionPool
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
 from config.config import settings
+from core.vector_store import NumpyVectorStore
+from utils.ttl_cache import TTLCache
 
+logger = logging.getLogger(__name__)
 
-# logger = logging.getLogger(__name__)
+
+class CachedEmbeddings(Embeddings):
+    """
+    查询向量的 LRU 缓存，相同文本只做一次前向计算
+    文档编码（建库）不走缓存
+    """
+
+    def __init__(self, embeddings: Embeddings, maxsize: int = settings.EMBEDDING_CACHE_SIZE,
+                 ttl: float = settings.EMBEDDING_CACHE_TTL):
+        self.embeddings = embeddings
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        vector = self.cache.get(text)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.set(text, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> list[float]:
+        vector = self.cache.get(text)
+        if vector is None:
+            vector = await self.embeddings.aembed_query(text)
+            self.cache.set(text, vector)
+        return vector
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    微批编码：把并发的查询编码请求在 max_wait_ms 内攒成一批（最多 max_batch_size 条），
+    在专用的单线程执行器上做一次批量前向计算，再把结果分发回各自的 future
+    bge 的查询与文档编码参数一致，因此查询可以直接走 embed_documents 批量计算
+    """
+
+    def __init__(self, embeddings: Embeddings, max_batch_size: int = settings.EMBEDDING_BATCH_SIZE,
+                 max_wait_ms: float = settings.EMBEDDING_BATCH_WAIT_MS):
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        # 所有前向计算串行在同一个线程上，避免与默认线程池争抢 torch 线程
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='embedding')
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self.stats = {'request': 0, 'batch': 0, 'max_batch_size': 0}
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.executor.submit(self.embeddings.embed_documents, texts).result()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.executor.submit(self.embeddings.embed_query, text).result()
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.embeddings.embed_documents, texts)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._worker.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+        future = loop.create_future()
+        self._queue.put_nowait((text, future))
+        return await future
+
+    async def _collect(self) -> list[tuple[str, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # 调用方已取消的请求不再计算
+        return [(text, future) for text, future in batch if not future.done()]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+            self.stats['request'] += len(batch)
+            self.stats['batch'] += 1
+            self.stats['max_batch_size'] = max(self.stats['max_batch_size'], len(batch))
+            try:
+                vectors = await loop.run_in_executor(self.executor, self.embeddings.embed_documents,
+                                                     [text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+    async def aclose(self):
+        if self._worker:
+            self._worker.cancel()
+        self.executor.shutdown(wait=False)
+
+
+def create_embedding_model(backend: str = settings.EMBEDDING_BACKEND) -> Embeddings:
+    """按配置创建底层向量模型，backend 可选 torch / onnx"""
+    if backend == 'onnx':
+        from core.onnx_embeddings import OnnxEmbeddings
+        return OnnxEmbeddings()
+    return HuggingFaceEmbeddings(model_name=settings.MODEL_PATH,
+                                 # 开启向量归一
+                                 encode_kwargs={'normalize_embeddings': True})
 
 
 class ChromaInstance:
-    def __init__(self):
-        self.model = HuggingFaceEmbeddings(model_name=settings.MODEL_PATH,
-                                           # 开启向量归一
-                                           encode_kwargs={'normalize_embeddings': True})
+    def __init__(self, mode: str = settings.EMBEDDING_MODE):
+        if mode == 'sidecar':
+            # 模型由 sidecar 进程持有，worker 只保留客户端与查询缓存
+            from core.embedding_sidecar import SidecarEmbeddings
+            self.batcher = None
+            self.model = CachedEmbeddings(SidecarEmbeddings())
+        else:
+            self.batcher = BatchingEmbeddings(create_embedding_model())
+            self.model = CachedEmbeddings(self.batcher)
+
+    async def aclose(self):
+        if self.batcher:
+            await self.batcher.aclose()
 
-    def load_vectorstore(self, collection_name):
-        """为表结构数据创建向量存储"""
+    def load_vectorstore(self, collection_name, backend: str = settings.VECTOR_STORE_BACKEND):
+        """为表结构数据创建向量存储，backend 可选 chroma / numpy"""
+        if backend == 'numpy':
+            return self.load_numpy_vectorstore(collection_name)
         # 加载JSON格式的表结构数据
         vectorstore = Chroma(
             embedding_function=self.model,
@@ -30,6 +169,16 @@ class ChromaInstance:
         )
         return vectorstore
 
+    def load_numpy_vectorstore(self, collection_name):
+        """优先读取已导出的 npz 索引，不存在时从 Chroma 集合导出一份"""
+        index_path = os.path.join(settings.NUMPY_VECTOR_STORE_PATH, f'{collection_name}.npz')
+        if os.path.exists(index_path):
+            return NumpyVectorStore.load(index_path, self.model)
+        vectorstore = NumpyVectorStore.from_chroma(self.load_vectorstore(collection_name, backend='chroma'), self.model)
+        vectorstore.save(index_path)
+        logger.info(f">>> 已从 Chroma 导出内存向量索引 {index_path}")
+        return vectorstore
+
     @staticmethod
     def search_vector(vs, query, k=5, min_score: float = 2.0):
         search_result = vs.similarity_search_with_score(query, k=k)
@@ -42,19 +191,20 @@ class ChromaInstance:
         return result
 
 
-async def create_async_postgres_engine() -> AsyncPostgresSaver:
-    POSTGRES_DB_URL = f"postgresql://{settings.POSTGRES_DB_USERNAME}:{settings.POSTGRES_DB_PASSWORD}@{settings.POSTGRES_DB_HOST}:{settings.POSTGRES_DB_PORT}/{settings.POSTGRES_DB_DATABASE}"
-    connection_kwargs = {
-        "autocommit": True,
-        "prepare_threshold": 0,
-        "sslmode": "disable"  # <--- 关键修复：禁用 SSL，解决报错
-    }
+POSTGRES_DB_URL = f"postgresql://{settings.POSTGRES_DB_USERNAME}:{settings.POSTGRES_DB_PASSWORD}@{settings.POSTGRES_DB_HOST}:{settings.POSTGRES_DB_PORT}/{settings.POSTGRES_DB_DATABASE}"
+POSTGRES_CONNECTION_KWARGS = {
+    "autocommit": True,
+    "prepare_threshold": 0,
+    "sslmode": "disable"  # <--- 关键修复：禁用 SSL，解决报错
+}
+
 
+async def create_async_postgres_engine() -> AsyncPostgresSaver:
     # 创建连接池
     pool = AsyncConnectionPool(
         conninfo=POSTGRES_DB_URL,
         max_size=20,
-        kwargs=connection_kwargs,
+        kwargs=POSTGRES_CONNECTION_KWARGS,
         open=False)
     await pool.open()
     # 创建 Saver
@@ -85,6 +235,14 @@ pms_mysql_engine = create_async_engine(
     echo=False  # 是否打印所有 SQL (生产环境关掉)
 )
 # logger.info(">>> 已加载 PMS MySQL Engine")
+# 专用于 KILL QUERY 的小连接池，主连接池被慢查询占满时也能取消查询
+pms_mysql_kill_engine = create_async_engine(
+    PMS_DB_URL,
+    pool_pre_ping=True,
+    pool_size=1,
+    max_overflow=2,
+    echo=False
+)
 
 ASSISTANTS_DB_URL = f"mysql+aiomysql://{settings.ASSISTANTS_DB_USERNAME}:{settings.ASSISTANTS_DB_PASSWORD}@{settings.ASSISTANTS_DB_HOST}:{settings.ASSISTANTS_DB_PORT}/{settings.ASSISTANTS_DB_DATABASE}"
 assistants_mysql_engine = create_async_engine(
@@ -0,0 +1,198 @@
+"""
+向量模型 sidecar：单独一个进程持有模型，通过 Unix domain socket 为所有 uvicorn worker 提供编码服务
+启动（项目根目录）：python -m core.embedding_sidecar
+健康检查：python -m core.embedding_sidecar --check（模型预热完成并能响应请求时退出码为 0）
+
+协议：每帧为 4 字节大端长度 + UTF-8 JSON
+    请求 {"texts": ["..."]}
+    响应 {"embeddings": [[...]]} 或 {"error": "..."}
+"""
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import struct
+import time
+
+from langchain_core.embeddings import Embeddings
+
+from config.config import settings
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct('>I')
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+
+
+def _encode_frame(payload: dict) -> bytes:
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    return HEADER.pack(len(body)) + body
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> dict:
+    (length,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+    if length > MAX_FRAME_BYTES:
+        raise ValueError(f'帧长度超过限制: {length}')
+    return json.loads(await reader.readexactly(length))
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError('sidecar 连接已关闭')
+        data.extend(chunk)
+    return bytes(data)
+
+
+class SidecarEmbeddings(Embeddings):
+    """
+    sidecar 的轻量客户端，worker 内不加载模型
+    sidecar 重启期间的连接失败会按退避重试，超过 timeout 才向上抛出
+    """
+
+    def __init__(self, socket_path: str = settings.EMBEDDING_SOCKET_PATH,
+                 timeout: float = settings.EMBEDDING_SIDECAR_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    @staticmethod
+    def _parse(response: dict) -> list[list[float]]:
+        if 'error' in response:
+            raise RuntimeError(f"sidecar 编码失败: {response['error']}")
+        return response['embeddings']
+
+    def _request(self, texts: list[str]) -> list[list[float]]:
+        deadline = time.monotonic() + self.timeout
+        delay = 0.05
+        while True:
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                    sock.settimeout(self.timeout)
+                    sock.connect(self.socket_path)
+                    sock.sendall(_encode_frame({'texts': texts}))
+                    (length,) = HEADER.unpack(_recv_exactly(sock, HEADER.size))
+                    return self._parse(json.loads(_recv_exactly(sock, length)))
+            except (ConnectionError, FileNotFoundError) as e:
+                if time.monotonic() + delay > deadline:
+                    raise
+                logger.warning(f'sidecar 不可用，{delay:.2f}s 后重试：{e}')
+                time.sleep(delay)
+                delay = min(delay * 2, 1)
+
+    async def _arequest(self, texts: list[str]) -> list[list[float]]:
+        deadline = time.monotonic() + self.timeout
+        delay = 0.05
+        while True:
+            try:
+                reader, writer = await asyncio.wait_for(asyncio.open_unix_connection(self.socket_path), self.timeout)
+                try:
+                    writer.write(_encode_frame({'texts': texts}))
+                    await writer.drain()
+                    return self._parse(await asyncio.wait_for(_read_frame(reader), self.timeout))
+                finally:
+                    writer.close()
+            except (ConnectionError, FileNotFoundError, asyncio.IncompleteReadError) as e:
+                if time.monotonic() + delay > deadline:
+                    raise
+                logger.warning(f'sidecar 不可用，{delay:.2f}s 后重试：{e}')
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 1)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._request(texts) if texts else []
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._request([text])[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self._arequest(texts) if texts else []
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self._arequest([text]))[0]
+
+
+def ping(socket_path: str = settings.EMBEDDING_SOCKET_PATH, timeout: float = 2) -> bool:
+    """发送一个空请求，socket 只在模型预热完成后才创建，能正常响应即表示可用"""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(socket_path)
+            sock.sendall(_encode_frame({'texts': []}))
+            (length,) = HEADER.unpack(_recv_exactly(sock, HEADER.size))
+            return 'embeddings' in json.loads(_recv_exactly(sock, length))
+    except (OSError, ValueError):
+        return False
+
+
+async def wait_for_sidecar(socket_path: str = settings.EMBEDDING_SOCKET_PATH,
+                           timeout: float = settings.EMBEDDING_SIDECAR_STARTUP_TIMEOUT):
+    """worker 启动时等待 sidecar 就绪，超时直接失败，避免带着不可用的向量模型对外服务"""
+    deadline = time.monotonic() + timeout
+    while not await asyncio.to_thread(ping, socket_path):
+        if time.monotonic() > deadline:
+            raise RuntimeError(f'等待向量模型 sidecar 超时（{timeout}s）: {socket_path}')
+        logger.info(f'等待向量模型 sidecar 就绪: {socket_path}')
+        await asyncio.sleep(1)
+
+
+async def serve(socket_path: str = settings.EMBEDDING_SOCKET_PATH):
+    # 延迟导入，避免 worker 侧 import 客户端时加载模型相关依赖
+    from core.db import BatchingEmbeddings, create_embedding_model
+
+    model = BatchingEmbeddings(create_embedding_model())
+    # 预热一次，首个请求不用承担初始化开销
+    await model.aembed_query('预热')
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await _read_frame(reader)
+                except asyncio.IncompleteReadError:
+                    break
+                try:
+                    # 每条文本单独入队，与其他连接的请求一起攒批
+                    vectors = await asyncio.gather(*[model.aembed_query(text) for text in request['texts']])
+                    response = {'embeddings': vectors}
+                except Exception as e:
+                    logger.error(f'sidecar 编码异常：{e}', exc_info=True)
+                    response = {'error': str(e)}
+                writer.write(_encode_frame(response))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+    # 上次异常退出可能残留 socket 文件
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = await asyncio.start_unix_server(handle, path=socket_path)
+    os.chmod(socket_path, 0o660)
+    logger.info(f'>>> 向量模型 sidecar 已启动: {socket_path} (backend={settings.EMBEDDING_BACKEND})')
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    async with server:
+        await stop.wait()
+    logger.info('>>> 向量模型 sidecar 正在关闭...')
+    await model.aclose()
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+
+if __name__ == '__main__':
+    import sys
+
+    if '--check' in sys.argv:
+        sys.exit(0 if ping() else 1)
+
+    from config.logger_config import init_logging_config
+
+    init_logging_config()
+    asyncio.run(serve())
@@ -1,20 +1,34 @@
+import asyncio
 import logging
 
 from fastapi import FastAPI
 from langchain_deepseek import ChatDeepSeek
 
 from core.agent_context import AgentContext
+from config.config import settings
 from core.agent_instance import AgentInstance
+from core.agent_router import FastRouter
+from core.checkpoint_gc import CheckpointGC
 from core.db import ChromaInstance, create_async_postgres_engine
+from utils.excel_parser import start_pool
 
 logger = logging.getLogger(__name__)
 
 
 async def init_globals(app: FastAPI):
-    llm = ChatDeepSeek(model="deepseek-chat", temperature=0.1)
+    # stream_usage：流式调用也返回用量，用于统计前缀缓存命中
+    llm = ChatDeepSeek(model="deepseek-chat", temperature=0.1, stream_usage=True)
     app.state.llm = llm
 
+    if settings.EMBEDDING_MODE == 'sidecar':
+        from core.embedding_sidecar import wait_for_sidecar
+        # 向量库加载与快速路由 fit 都依赖 sidecar，先确认其已就绪
+        await wait_for_sidecar()
+        logger.info(">>> 向量模型 sidecar 已就绪")
+
     chroma_instance = ChromaInstance()
+    app.state.chroma_instance = chroma_instance
+    app.state.embeddings = chroma_instance.model
     app.state.vs_schema = chroma_instance.load_vectorstore('table_structure')
     app.state.vs_qa = chroma_instance.load_vectorstore('qa_sql')
     logger.info(">>> 已加载 Chroma 数据库")
@@ -31,6 +45,18 @@ async def init_globals(app: FastAPI):
     app.state.postgres_engine = checkpointer
     logger.info(">>> 已加载 POSTGRES CHECKPOINT SAVER")
 
+    if settings.CHECKPOINT_GC_ENABLED:
+        checkpoint_gc = CheckpointGC(checkpointer.pool_ref)
+        app.state.checkpoint_gc = checkpoint_gc
+        app.state.checkpoint_gc_task = asyncio.create_task(checkpoint_gc.run_forever())
+        logger.info(">>> 已启动 CHECKPOINT 清理任务")
+
+    start_pool()
+    logger.info(">>> 已启动 Excel 解析进程池")
+
+    fast_router = FastRouter(chroma_instance.model).fit() if settings.FAST_ROUTER_ENABLED else None
+    app.state.fast_router = fast_router
+
     ctx = AgentContext(app, include_graph=False)
-    app.state.graph = AgentInstance(llm).build(ctx, checkpointer)
+    app.state.graph = AgentInstance(llm, fast_router).build(ctx, checkpointer)
     logger.info(">>> 已加载 Graph")
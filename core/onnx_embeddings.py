@@ -0,0 +1,44 @@
+import logging
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    bge-base-zh 的 onnxruntime 推理后端（int8 动态量化模型由 utils/export_onnx_model.py 导出）
+    与 sentence-transformers 保持一致：取 [CLS] 向量并做 L2 归一化，因此可以直接检索现有 Chroma 集合
+    """
+
+    def __init__(self, model_path: str = settings.MODEL_PATH, onnx_path: str = settings.ONNX_MODEL_PATH,
+                 intra_op_threads: int = settings.ONNX_INTRA_OP_THREADS, max_length: int = 512):
+        # onnxruntime 只在选择 onnx 后端时才需要安装
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(onnx_path, sess_options=options, providers=['CPUExecutionProvider'])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+        self.max_length = max_length
+        logger.info(f">>> 已加载 ONNX 向量模型 {onnx_path} (intra_op_threads={intra_op_threads})")
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        encoded = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_length, return_tensors='np')
+        inputs = {name: value.astype(np.int64) for name, value in encoded.items() if name in self.input_names}
+        last_hidden_state = self.session.run(None, inputs)[0]
+        cls = last_hidden_state[:, 0]
+        cls = cls / np.linalg.norm(cls, axis=1, keepdims=True)
+        return cls.astype(np.float32).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
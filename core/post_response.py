@@ -0,0 +1,234 @@
+import asyncio
+import datetime
+import json
+import logging
+import os
+import time
+from typing import Awaitable, Callable
+
+from sqlalchemy import delete, update
+
+from config.config import settings
+from core.db import db_session
+from core.row_counts import row_counts
+from db_models.models import ChatHistory, UserThread
+
+logger = logging.getLogger(__name__)
+
+QUESTION_MAX_LENGTH = ChatHistory.__table__.c.question.type.length
+TITLE_MAX_LENGTH = UserThread.__table__.c.title.type.length
+# 已有回答的聊天记录总数的缓存 key，历史表格只展示这些记录
+ANSWERED_HISTORY_COUNT_KEY = f'{ChatHistory.__tablename__}.answered'
+
+
+def truncate_utf8(text: str, max_bytes: int) -> str:
+    encoded = text.encode('utf-8')
+    if len(encoded) <= max_bytes:
+        return text
+    return encoded[:max_bytes].decode('utf-8', errors='ignore')
+
+
+class PostResponsePipeline:
+    """
+    回答结束后的收尾工作：会话标题生成与聊天记录写入
+    - 聊天记录在对话开始时先插入占位行拿到 history_id，回答结束后只把答案放入队列
+    - 后台 worker 每 flush_interval 秒（或攒满 batch_size 条）批量执行 UPDATE / DELETE / INSERT
+    - 标题生成（LLM 调用）在并发受限的后台任务中执行，完成后再批量写入 user_thread
+    - 整批写入失败时改为逐条写入，只有失败的数据放回队列并按倍数拉长重试间隔，
+      单条数据失败 max_attempts 次后写入死信文件，不再阻塞后续数据
+    shutdown 时等待标题任务（超时则使用兜底标题）并写完队列中的全部数据
+    """
+
+    def __init__(self, batch_size: int = settings.POST_RESPONSE_BATCH_SIZE,
+                 flush_interval: float = settings.POST_RESPONSE_FLUSH_INTERVAL,
+                 title_concurrency: int = settings.POST_RESPONSE_TITLE_CONCURRENCY,
+                 max_attempts: int = settings.POST_RESPONSE_MAX_ATTEMPTS,
+                 dead_letter_path: str = settings.POST_RESPONSE_DEAD_LETTER_PATH):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.dead_letter_path = dead_letter_path
+        self.title_semaphore = asyncio.Semaphore(title_concurrency)
+        self.pending_answers: dict[int, str] = {}
+        self.pending_deletes: set[int] = set()
+        self.pending_threads: list[dict] = []
+        self.title_tasks: set[asyncio.Task] = set()
+        # (类型, 键) -> 已失败次数
+        self.attempts: dict[tuple[str, int | str], int] = {}
+        self._retry_interval = flush_interval
+        self._worker: asyncio.Task | None = None
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self.stats = {'answers': 0, 'deletes': 0, 'threads': 0, 'flushes': 0, 'flush_errors': 0, 'dead_letters': 0}
+
+    def _pending_count(self) -> int:
+        return len(self.pending_answers) + len(self.pending_deletes) + len(self.pending_threads)
+
+    def _notify(self):
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        if self._pending_count() >= self.batch_size:
+            self._wakeup.set()
+
+    async def allocate_history(self, question: str, thread_id: str, file_name: str | None) -> int:
+        """插入占位聊天记录，返回 history_id；答案由 save_answer 后续批量写入"""
+        async with db_session() as session:
+            # answer 为空表示仍在生成中，瀑布流与历史表格都会过滤掉
+            history = ChatHistory(question=question[:QUESTION_MAX_LENGTH] if question else question,
+                                  answer=None, thread_id=thread_id, file_name=file_name)
+            session.add(history)
+            await session.flush()
+        return history.id
+
+    def save_answer(self, history_id: int, answer: str):
+        self.pending_answers[history_id] = truncate_utf8(answer, settings.POST_RESPONSE_ANSWER_MAX_BYTES)
+        self._notify()
+
+    def discard_history(self, history_id: int):
+        """没有产生回答时删除占位记录"""
+        self.pending_deletes.add(history_id)
+        self._notify()
+
+    def add_thread(self, user_id: int, thread_id: str, hotel_id: int, fallback_title: str,
+                   generate_title: Callable[[], Awaitable[str]] | None = None):
+        """新会话写入 user_thread；提供 generate_title 时先在后台生成标题"""
+        if generate_title is None or self._closing:
+            self._queue_thread(user_id, thread_id, hotel_id, fallback_title)
+            return
+        task = asyncio.create_task(self._generate_and_add_thread(user_id, thread_id, hotel_id, fallback_title,
+                                                                 generate_title))
+        self.title_tasks.add(task)
+        task.add_done_callback(self.title_tasks.discard)
+
+    def _queue_thread(self, user_id: int, thread_id: str, hotel_id: int, title: str):
+        # LLM 生成的标题可能超过列长度
+        self.pending_threads.append({'user_id': user_id, 'thread_id': thread_id, 'hotel_id': hotel_id,
+                                     'title': (title or '')[:TITLE_MAX_LENGTH]})
+        self._notify()
+
+    async def _generate_and_add_thread(self, user_id: int, thread_id: str, hotel_id: int, fallback_title: str,
+                                       generate_title: Callable[[], Awaitable[str]]):
+        title = fallback_title
+        try:
+            async with self.title_semaphore:
+                title = await generate_title()
+        except asyncio.CancelledError:
+            # 关闭服务时超时未完成的标题使用兜底标题，会话记录本身不能丢
+            logger.warning(f'[收尾] 会话 {thread_id} 标题生成被取消，使用兜底标题')
+        except Exception as e:
+            logger.error(f'[收尾] 会话 {thread_id} 标题生成失败：{e}')
+        self._queue_thread(user_id, thread_id, hotel_id, title)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._retry_interval)
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+            if self._closing or (not self._pending_count() and not self.title_tasks):
+                # 队列空闲时退出，下次入队时重新启动
+                return
+
+    async def flush(self):
+        if not self._pending_count():
+            return
+        answers, self.pending_answers = self.pending_answers, {}
+        deletes, self.pending_deletes = self.pending_deletes, set()
+        threads, self.pending_threads = self.pending_threads, []
+        flush_start_time = time.perf_counter()
+        try:
+            await self._write(answers, deletes, threads)
+            # 此前失败过的数据都在本批中，整批成功后清空计数
+            self.attempts.clear()
+        except Exception as e:
+            # 一条坏数据（如超长、约束冲突）会让整批回滚，逐条写入以隔离失败的数据
+            self.stats['flush_errors'] += 1
+            logger.error(f'[收尾] 批量写入失败，改为逐条写入：{e}', exc_info=True)
+            answers, deletes, threads = await self._write_each(answers, deletes, threads)
+        # 有数据写入失败时拉长下次写入的间隔，数据库恢复后回到 flush_interval
+        self._retry_interval = (min(self._retry_interval * 2, settings.POST_RESPONSE_RETRY_MAX_INTERVAL)
+                                if self.attempts else self.flush_interval)
+        self.stats['answers'] += len(answers)
+        self.stats['deletes'] += len(deletes)
+        # 占位记录不计入总数，答案写入后才计数；删除的只有未产生回答的占位记录
+        row_counts.incr(ANSWERED_HISTORY_COUNT_KEY, len(answers))
+        self.stats['threads'] += len(threads)
+        self.stats['flushes'] += 1
+        logger.info(f'[收尾] 写入 答案 {len(answers)} 条，删除 {len(deletes)} 条，会话 {len(threads)} 条，'
+                    f'耗时 {(time.perf_counter() - flush_start_time):.4f}s')
+
+    @staticmethod
+    async def _write(answers: dict[int, str], deletes: set[int], threads: list[dict]):
+        async with db_session() as session:
+            if answers:
+                await session.execute(update(ChatHistory),
+                                      [{'id': history_id, 'answer': answer} for history_id, answer in answers.items()])
+            if deletes:
+                await session.execute(delete(ChatHistory).where(ChatHistory.id.in_(deletes)))
+            if threads:
+                session.add_all([UserThread(**thread) for thread in threads])
+
+    async def _write_each(self, answers: dict[int, str], deletes: set[int],
+                          threads: list[dict]) -> tuple[dict[int, str], set[int], list[dict]]:
+        """逐条写入，返回写入成功的部分；失败的放回队列，超过最大尝试次数的写入死信文件"""
+        items = ([('answer', history_id, ({history_id: answer}, set(), [])) for history_id, answer in answers.items()]
+                 + [('delete', history_id, ({}, {history_id}, [])) for history_id in deletes]
+                 + [('thread', thread['thread_id'], ({}, set(), [thread])) for thread in threads])
+        written_answers, written_deletes, written_threads = {}, set(), []
+        for kind, key, item in items:
+            try:
+                await self._write(*item)
+            except Exception as e:
+                self._retry_or_dead_letter(kind, key, item, e)
+                continue
+            self.attempts.pop((kind, key), None)
+            written_answers.update(item[0])
+            written_deletes |= item[1]
+            written_threads += item[2]
+        return written_answers, written_deletes, written_threads
+
+    def _retry_or_dead_letter(self, kind: str, key: int | str, item: tuple[dict, set, list], error: Exception):
+        answers, deletes, threads = item
+        attempts = self.attempts.get((kind, key), 0) + 1
+        if attempts < self.max_attempts:
+            self.attempts[(kind, key)] = attempts
+            self.pending_answers = {**answers, **self.pending_answers}
+            self.pending_deletes |= deletes
+            self.pending_threads = threads + self.pending_threads
+            return
+
+        self.attempts.pop((kind, key), None)
+        self.stats['dead_letters'] += 1
+        logger.error(f'[收尾] {kind} {key} 已失败 {attempts} 次，放弃写入并记录到死信文件：{error}')
+        record = {'time': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'kind': kind, 'key': key,
+                  'error': str(error), 'answers': answers, 'deletes': sorted(deletes), 'threads': threads}
+        try:
+            os.makedirs(os.path.dirname(self.dead_letter_path), exist_ok=True)
+            with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        except OSError as e:
+            logger.error(f'[收尾] 写入死信文件失败：{e}，数据：{json.dumps(record, ensure_ascii=False)}')
+
+    def get_stats(self) -> dict:
+        return {**self.stats, 'pending': self._pending_count(), 'titles_generating': len(self.title_tasks)}
+
+    async def shutdown(self, timeout: float = settings.POST_RESPONSE_SHUTDOWN_TIMEOUT):
+        self._closing = True
+        if self.title_tasks:
+            logger.info(f'>>> 等待 {len(self.title_tasks)} 个标题生成任务完成...')
+            _, pending = await asyncio.wait(set(self.title_tasks), timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        # 不取消 worker，避免打断进行中的批量写入
+        if self._worker and not self._worker.done():
+            self._wakeup.set()
+            await asyncio.gather(self._worker, return_exceptions=True)
+        await self.flush()
+        if self._pending_count():
+            logger.error(f'>>> 仍有 {self._pending_count()} 条收尾数据未能写入')
+
+
+post_response = PostResponsePipeline()
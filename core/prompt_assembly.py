@@ -0,0 +1,128 @@
+import logging
+import threading
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.runnables import Runnable
+
+from core.agent_tokens import trim_last
+
+logger = logging.getLogger(__name__)
+
+# 会话摘要消息的固定 id，更新时原地替换
+MEMORY_SUMMARY_ID = "conversation_summary"
+QUESTION_MARKER = "用户问题："
+TIME_MARKER = "当前时间："
+# 送入 LLM 的历史消息 token 上限
+HISTORY_MAX_TOKENS = 6000
+
+
+def extract_question(content: str) -> str:
+    """从 USER_PROMPT 中取出用户问题原文（不含末尾的当前时间）"""
+    content = content or ""
+    if QUESTION_MARKER in content:
+        content = content.split(QUESTION_MARKER, 1)[-1]
+        content = content.rsplit(TIME_MARKER, 1)[0]
+    return content.strip()
+
+
+def trim_history(messages: list[BaseMessage], max_tokens: int = HISTORY_MAX_TOKENS) -> list[BaseMessage]:
+    """按 token 上限截断历史，并去掉截断后不成对的 tool_calls / 工具结果；本轮用户问题始终保留"""
+    question = None
+    for msg in reversed(messages):
+        if isinstance(msg, HumanMessage):
+            question = msg
+            break
+
+    trimmed_messages = trim_last(messages, max_tokens=max_tokens)
+
+    valid_messages = []
+    active_tool_call_ids = set()
+    for i, msg in enumerate(trimmed_messages):
+        if isinstance(msg, AIMessage):
+            if msg.tool_calls:
+                if i + 1 < len(trimmed_messages):
+                    next_msg = trimmed_messages[i + 1]
+                    current_tool_call_ids = {call['id'] for call in msg.tool_calls}
+                    if isinstance(next_msg, ToolMessage):
+                        if next_msg.tool_call_id in current_tool_call_ids:
+                            valid_messages.append(msg)
+                            active_tool_call_ids = current_tool_call_ids
+            else:
+                valid_messages.append(msg)
+        elif isinstance(msg, ToolMessage):
+            if msg.tool_call_id in active_tool_call_ids:
+                valid_messages.append(msg)
+        elif isinstance(msg, HumanMessage):
+            valid_messages.append(msg)
+            active_tool_call_ids = set()
+
+    if question and not any(m is question for m in valid_messages):
+        valid_messages = [question, *valid_messages]
+    return valid_messages
+
+
+def assemble_prompt(system_prompt: str, messages: list[BaseMessage], context: str | None = None) -> list[BaseMessage]:
+    """
+    按从稳定到易变的顺序组装提示词，使 DeepSeek 能命中前缀缓存：
+    固定系统提示词 -> 会话摘要 -> 历史消息（只追加） -> 本轮上下文（如预检索结果） -> 本轮问题及其后的工具往返
+    历史中保存的其他系统消息一律丢弃，系统提示词每次逐字节一致
+    """
+    summary = next((m for m in messages if isinstance(m, SystemMessage) and m.id == MEMORY_SUMMARY_ID), None)
+    history = trim_history([m for m in messages if not isinstance(m, SystemMessage)])
+
+    prompt = [SystemMessage(content=system_prompt)]
+    if summary:
+        prompt.append(SystemMessage(content=summary.content))
+    if context:
+        last_human = max((i for i, m in enumerate(history) if isinstance(m, HumanMessage)), default=len(history))
+        history = [*history[:last_human], SystemMessage(content=context), *history[last_human:]]
+    return prompt + history
+
+
+class PromptCacheStats:
+    """按节点统计 DeepSeek 的前缀缓存命中 token 数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.nodes: dict[str, dict] = {}
+
+    def record(self, node: str, message: BaseMessage):
+        hit, miss = cache_usage(message)
+        if hit is None:
+            return
+        with self._lock:
+            stat = self.nodes.setdefault(node, {'calls': 0, 'hit_tokens': 0, 'miss_tokens': 0})
+            stat['calls'] += 1
+            stat['hit_tokens'] += hit
+            stat['miss_tokens'] += miss
+        logger.info(f'[前缀缓存] {node} 命中 {hit} token，未命中 {miss} token')
+
+    def get_stats(self) -> dict:
+        stats = {}
+        with self._lock:
+            for node, stat in self.nodes.items():
+                total = stat['hit_tokens'] + stat['miss_tokens']
+                stats[node] = {**stat, 'hit_rate': round(stat['hit_tokens'] / total, 4) if total else 0}
+        return stats
+
+
+def cache_usage(message: BaseMessage) -> tuple[int | None, int | None]:
+    """优先读取 DeepSeek 原始的 prompt_cache_hit/miss_tokens，流式调用时从 usage_metadata 的 cache_read 推算"""
+    token_usage = (getattr(message, 'response_metadata', None) or {}).get('token_usage') or {}
+    if token_usage.get('prompt_cache_hit_tokens') is not None:
+        return token_usage['prompt_cache_hit_tokens'], token_usage.get('prompt_cache_miss_tokens') or 0
+    usage = getattr(message, 'usage_metadata', None)
+    if not usage:
+        return None, None
+    hit = (usage.get('input_token_details') or {}).get('cache_read') or 0
+    return hit, max(usage.get('input_tokens', 0) - hit, 0)
+
+
+async def ainvoke_llm(llm: BaseChatModel | Runnable, messages: list[BaseMessage], node: str) -> AIMessage:
+    response = await llm.ainvoke(messages)
+    prompt_cache_stats.record(node, response)
+    return response
+
+
+prompt_cache_stats = PromptCacheStats()
@@ -0,0 +1,51 @@
+import logging
+import time
+
+from sqlalchemy import ColumnElement, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import DeclarativeBase
+
+from config.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RowCounter:
+    """
+    分页接口的总数，避免每次请求都对整表 COUNT(*)：
+    - 先用主键两端估算行数（MAX(id) - MIN(id) + 1，只读索引两端），低于 exact_threshold 时才执行精确 COUNT(*)
+    - 结果缓存 ttl 秒，期间本进程的插入 / 删除通过 incr 累加到缓存值上
+    估算值与缓存值都标记为近似：估算值包含已删除行留下的 id 空洞，其他 worker 的写入要等缓存过期才可见
+    带过滤条件时精确 COUNT(*) 使用同样的条件，并以 key 单独缓存；主键估算无法过滤，仍标记为近似
+    """
+
+    def __init__(self, ttl: float = settings.COUNT_CACHE_TTL, exact_threshold: int = settings.COUNT_EXACT_THRESHOLD):
+        self.ttl = ttl
+        self.exact_threshold = exact_threshold
+        # 缓存 key（默认表名）-> (过期时间, 行数)
+        self._counts: dict[str, tuple[float, int]] = {}
+
+    async def count(self, session: AsyncSession, model: type[DeclarativeBase], *where: ColumnElement[bool],
+                    key: str | None = None) -> tuple[int, bool]:
+        """返回 (总数, 是否近似)；where 与分页查询的过滤条件保持一致，使用时需传入对应的缓存 key"""
+        table = key or model.__tablename__
+        cached = self._counts.get(table)
+        if cached and cached[0] > time.monotonic():
+            return cached[1], True
+
+        min_id, max_id = (await session.execute(select(func.min(model.id), func.max(model.id)))).one()
+        span = max_id - min_id + 1 if max_id is not None else 0
+        if span < self.exact_threshold:
+            total, is_approximate = (await session.execute(select(func.count()).select_from(model).where(*where))).scalar(), False
+        else:
+            total, is_approximate = span, True
+        self._counts[table] = (time.monotonic() + self.ttl, total)
+        logger.debug(f'[分页总数] {table} 共 {total} 行（{"估算" if is_approximate else "精确"}）')
+        return total, is_approximate
+
+    def incr(self, table: str, n: int = 1):
+        if cached := self._counts.get(table):
+            self._counts[table] = (cached[0], max(cached[1] + n, 0))
+
+
+row_counts = RowCounter()
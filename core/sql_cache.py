@@ -0,0 +1,62 @@
+import datetime
+import re
+
+import sqlglot
+from sqlglot import exp
+
+from config.config import settings
+from utils.ttl_cache import TTLCache
+
+# 字符串字面量与反引号标识符原样保留，其余部分折叠空白并转小写
+_LITERAL_PATTERN = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"|`[^`]*`")
+_REALTIME_PATTERN = re.compile(r'\b(curdate|current_date|current_timestamp|now|sysdate|utc_date|utc_timestamp|curtime)\b')
+_DATE_PATTERN = re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})')
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    生成缓存键：忽略空白与关键字大小写差异，字面量保持原样
+    例如 "SELECT  name FROM t WHERE a='Ab'" 与 "select name\nfrom t where a='Ab';" 得到同一个键
+    """
+    parts, last = [], 0
+    for match in _LITERAL_PATTERN.finditer(sql):
+        parts.append(' '.join(sql[last:match.start()].lower().split()))
+        parts.append(match.group(0))
+        last = match.end()
+    parts.append(' '.join(sql[last:].lower().split()))
+    return ' '.join(part for part in parts if part).rstrip(';').strip()
+
+
+def only_static_tables(sql: str) -> bool:
+    """查询涉及的表是否全部为 SQL_CACHE_STATIC_TABLES 中的字典表，解析失败按非静态处理"""
+    try:
+        tables = {table.name.lower() for table in sqlglot.parse_one(sql, read='mysql').find_all(exp.Table)}
+    except sqlglot.errors.ParseError:
+        return False
+    return bool(tables) and tables <= {name.lower() for name in settings.SQL_CACHE_STATIC_TABLES}
+
+
+def ttl_for(normalized_sql: str, today: datetime.date | None = None) -> int:
+    """
+    涉及今天（或实时函数）的查询用短 TTL，只涉及已结束日期（如 daily_time='2026-01-01'）的查询用长 TTL；
+    没有日期条件的查询（如房态、订单列表）看到的是当前数据，同样用短 TTL，只查静态字典表（如房型）时用中等 TTL
+    """
+    today = today or datetime.date.today()
+    if _REALTIME_PATTERN.search(normalized_sql):
+        return settings.SQL_CACHE_TODAY_TTL
+    dates = []
+    for match in _DATE_PATTERN.finditer(normalized_sql):
+        try:
+            dates.append(datetime.date(int(match.group(1)), int(match.group(2)), int(match.group(3))))
+        except ValueError:
+            continue
+    if not dates:
+        return settings.SQL_CACHE_STATIC_TTL if only_static_tables(normalized_sql) else settings.SQL_CACHE_TODAY_TTL
+    if max(dates) >= today:
+        return settings.SQL_CACHE_TODAY_TTL
+    return settings.SQL_CACHE_HISTORY_TTL
+
+
+# 以结果文本的字节数计算内存占用
+sql_cache = TTLCache(maxsize=settings.SQL_CACHE_SIZE, ttl=settings.SQL_CACHE_TODAY_TTL,
+                     max_weight=settings.SQL_CACHE_MAX_BYTES, weigh=lambda value: len(value.encode('utf-8')))
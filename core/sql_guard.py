@@ -0,0 +1,142 @@
+import json
+import logging
+from functools import lru_cache
+
+import sqlglot
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlglot import exp
+
+from config.config import settings
+from utils.abs_path import abs_path
+
+logger = logging.getLogger(__name__)
+
+READ_ONLY_STATEMENTS = (exp.Select, exp.Union, exp.Intersect, exp.Except, exp.Show, exp.Describe)
+WRITE_EXPRESSIONS = (exp.Insert, exp.Update, exp.Delete, exp.Merge, exp.Create, exp.Drop, exp.Alter,
+                     exp.TruncateTable, exp.Command, exp.Into, exp.Lock)
+# 会阻塞连接或读取服务器文件的函数
+BLOCKED_FUNCTIONS = {'sleep', 'benchmark', 'load_file', 'get_lock', 'release_lock', 'sys_exec', 'sys_eval',
+                     'load_extension'}
+
+
+class SqlGuardError(Exception):
+    """SQL 未通过执行前检查，to_result 返回给 agent 用于改写 SQL 的结构化错误"""
+
+    def __init__(self, code: int, reason: str, message: str, suggestion: str):
+        super().__init__(message)
+        self.code = code
+        self.reason = reason
+        self.message = message
+        self.suggestion = suggestion
+
+    def to_result(self) -> tuple[int, str]:
+        return self.code, json.dumps({'reason': self.reason, 'message': self.message, 'suggestion': self.suggestion},
+                                     ensure_ascii=False)
+
+
+@lru_cache(maxsize=1)
+def hotel_scoped_tables() -> frozenset[str]:
+    """表结构文档中含 hotel_id 字段的表，查询这些表时必须带酒店过滤"""
+    with open(abs_path('../asset/tables_enriched.json'), 'r', encoding='utf-8') as f:
+        tables = json.load(f)
+    return frozenset(t['table_name'].lower() for t in tables
+                     if any(field.get('column_name') == 'hotel_id' for field in t.get('fields', [])))
+
+
+def parse_read_only(sql: str, dialect: str = 'mysql') -> exp.Expression:
+    """解析 SQL 并校验为单条只读语句、不含危险函数，不通过时抛出 SqlGuardError"""
+    try:
+        statements = [s for s in sqlglot.parse(sql, read=dialect) if s is not None]
+    except sqlglot.errors.ParseError as e:
+        raise SqlGuardError(-3, 'PARSE_ERROR', f'SQL 无法解析: {str(e).splitlines()[0]}',
+                            f'请检查语法，只使用标准的 {"SQLite" if dialect == "sqlite" else "MySQL"} SELECT 语句')
+
+    if len(statements) != 1:
+        raise SqlGuardError(-2, 'MULTI_STATEMENT', '执行失败: 一次只能执行一条语句', '请拆分为多次工具调用')
+    statement = statements[0]
+    if not isinstance(statement, READ_ONLY_STATEMENTS) or statement.find(*WRITE_EXPRESSIONS):
+        raise SqlGuardError(-2, 'NOT_READ_ONLY', '执行失败: 不允许篡改数据', '只允许 SELECT / SHOW / DESCRIBE 查询')
+
+    for func in statement.find_all(exp.Anonymous, exp.Func):
+        name = (func.name if isinstance(func, exp.Anonymous) else func.sql_name()).lower()
+        if name in BLOCKED_FUNCTIONS:
+            raise SqlGuardError(-2, 'BLOCKED_FUNCTION', f'执行失败: 不允许使用函数 {name}', '请去掉该函数')
+    return statement
+
+
+HOTEL_VALUE_TYPES = (exp.Literal, exp.Placeholder, exp.Parameter)
+
+
+def _is_hotel_predicate(node: exp.Expression) -> bool:
+    """hotel_id = 常量 / 绑定参数，或 hotel_id IN (常量, ...)"""
+    if isinstance(node, exp.EQ):
+        sides = (node.this, node.expression)
+        return any(isinstance(a, exp.Column) and a.name.lower() == 'hotel_id' and isinstance(b, HOTEL_VALUE_TYPES)
+                   for a, b in (sides, sides[::-1]))
+    if isinstance(node, exp.In):
+        return (isinstance(node.this, exp.Column) and node.this.name.lower() == 'hotel_id'
+                and bool(node.expressions) and all(isinstance(e, HOTEL_VALUE_TYPES) for e in node.expressions))
+    return False
+
+
+def has_hotel_filter(statement: exp.Expression) -> bool:
+    """
+    WHERE / JOIN ON / HAVING 中存在 hotel_id 等值或 IN 常量过滤，且不在 OR / NOT 之下
+    hotel_id > 0、a.hotel_id = b.hotel_id、hotel_id = 1 OR ... 都不算酒店过滤
+    """
+    for node in statement.find_all(exp.EQ, exp.In):
+        if not _is_hotel_predicate(node):
+            continue
+        clause = node.find_ancestor(exp.Where, exp.Join, exp.Having)
+        parent = node.parent
+        while parent is not None and parent is not clause and not isinstance(parent, (exp.Or, exp.Not)):
+            parent = parent.parent
+        if clause is not None and parent is clause:
+            return True
+    return False
+
+
+def check_sql(sql: str) -> tuple[str, int | None]:
+    """
+    解析并校验 SQL，返回 (实际执行的 SQL, 追加的 LIMIT)
+    无 LIMIT 的查询会追加 LIMIT SQL_DEFAULT_LIMIT + 1，多取的一行用于判断结果是否被 LIMIT 截断，
+    此时返回的第二项为 SQL_DEFAULT_LIMIT，否则为 None
+    不通过时抛出 SqlGuardError
+    """
+    statement = parse_read_only(sql)
+    if not isinstance(statement, (exp.Select, exp.Union, exp.Intersect, exp.Except)):
+        return sql, None
+
+    tables = {table.name.lower() for table in statement.find_all(exp.Table)}
+    scoped = tables & hotel_scoped_tables()
+    if scoped and not has_hotel_filter(statement):
+        raise SqlGuardError(-3, 'MISSING_HOTEL_FILTER', f'查询的表 {", ".join(sorted(scoped))} 缺少 hotel_id 过滤条件',
+                            '请在 WHERE 中加入 hotel_id = 当前酒店ID（或 hotel_id IN (...)），不要放在 OR 条件中')
+
+    if statement.args.get('limit') is not None:
+        return sql, None
+    # 换行追加，避免被末尾的 -- 注释吞掉
+    return f'{sql.strip().rstrip(";")}\nLIMIT {settings.SQL_DEFAULT_LIMIT + 1}', settings.SQL_DEFAULT_LIMIT
+
+
+async def explain_check(conn: AsyncConnection, sql: str):
+    """
+    用 EXPLAIN 估算扫描行数：同一 select id 内的表按嵌套循环相乘，各 select 之间相加
+    超过阈值的执行计划直接拒绝，避免全表扫描或笛卡尔积拖慢共享的 PMS 库
+    """
+    if not sql.lstrip().lower().startswith(('select', 'with', '(')):
+        return
+    result = await conn.execute(text(f'EXPLAIN {sql}'))
+    estimated_by_select: dict = {}
+    for row in result.mappings():
+        rows = row.get('rows') or 1
+        filtered = float(row.get('filtered') or 100) / 100
+        select_id = row.get('id')
+        estimated_by_select[select_id] = estimated_by_select.get(select_id, 1) * max(rows * filtered, 1)
+    estimated_rows = int(sum(estimated_by_select.values()))
+    if estimated_rows > settings.SQL_EXPLAIN_MAX_ROWS:
+        logger.warning(f'[SQL检查] 预估扫描 {estimated_rows} 行，已拒绝: {sql}')
+        raise SqlGuardError(-3, 'PLAN_TOO_EXPENSIVE',
+                            f'预估扫描 {estimated_rows} 行，超过上限 {settings.SQL_EXPLAIN_MAX_ROWS}',
+                            '请增加时间范围 / hotel_id 等过滤条件，避免多表 JOIN，改用多次小查询或聚合查询')
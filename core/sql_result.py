@@ -0,0 +1,113 @@
+import csv
+import datetime
+import decimal
+import io
+from typing import Any, Sequence
+
+from config.config import settings
+from core.agent_tokens import count_text_tokens
+
+
+def format_value(value: Any) -> str:
+    """紧凑的值格式：去掉 Decimal('...') / datetime.datetime(...) 这类冗长 repr"""
+    if value is None:
+        return ''
+    if isinstance(value, decimal.Decimal):
+        return format(value.normalize(), 'f') if value == value.to_integral_value() else str(value)
+    if isinstance(value, datetime.datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    if isinstance(value, float):
+        return f'{value:.6g}' if abs(value) < 1e15 else str(value)
+    return str(value)
+
+
+class ResultEncoder:
+    """
+    将查询结果编码为 表头 + CSV 行 的紧凑格式，列名只出现一次
+    行数或 token 数超出预算时停止输出明细，但仍继续统计总行数与数值列的合计/最小/最大值，
+    并在结果中给出 truncated=true，提示 agent 改用聚合查询或增加筛选条件
+    最多读取 row_cap 行，调用方需多取一行：收到第 row_cap + 1 行时 limit_hit=True，调用方应停止读取
+    """
+
+    def __init__(self, columns: Sequence[str], max_rows: int = settings.SQL_RESULT_MAX_ROWS,
+                 max_tokens: int = settings.SQL_RESULT_MAX_TOKENS, row_cap: int = settings.SQL_RESULT_MAX_SCAN_ROWS):
+        self.columns = list(columns)
+        self.max_rows = max_rows
+        self.max_tokens = max_tokens
+        self.row_cap = row_cap
+        self.lines: list[str] = []
+        self.tokens = 0
+        self.row_count = 0
+        self.truncated = False
+        self.limit_hit = False
+        # 列序号 -> [合计, 最小, 最大]，出现非数值后移除
+        self.numeric_stats: dict[int, list] = {i: [0, None, None] for i in range(len(self.columns))}
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator='')
+        self.header = self._to_line(self.columns)
+        self.tokens += count_text_tokens(self.header)
+
+    def _to_line(self, values) -> str:
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._writer.writerow(values)
+        return self._buffer.getvalue()
+
+    def _update_stats(self, row: Sequence[Any]):
+        for i in list(self.numeric_stats):
+            value = row[i]
+            if value is None:
+                continue
+            if isinstance(value, bool) or not isinstance(value, (int, float, decimal.Decimal)):
+                del self.numeric_stats[i]
+                continue
+            stat = self.numeric_stats[i]
+            stat[0] += value
+            stat[1] = value if stat[1] is None else min(stat[1], value)
+            stat[2] = value if stat[2] is None else max(stat[2], value)
+
+    def add_rows(self, rows: Sequence[Sequence[Any]]):
+        for row in rows:
+            if self.row_count >= self.row_cap:
+                self.limit_hit = True
+                return
+            self.row_count += 1
+            self._update_stats(row)
+            if self.truncated:
+                continue
+            line = self._to_line([format_value(v) for v in row])
+            line_tokens = count_text_tokens(line) + 1
+            if len(self.lines) >= self.max_rows or self.tokens + line_tokens > self.max_tokens:
+                self.truncated = True
+                continue
+            self.lines.append(line)
+            self.tokens += line_tokens
+
+    def summary(self) -> str:
+        parts = []
+        for i, (total, minimum, maximum) in self.numeric_stats.items():
+            if minimum is None:
+                continue
+            parts.append(f'{self.columns[i]}: sum={format_value(total)} min={format_value(minimum)} max={format_value(maximum)}')
+        return '; '.join(parts)
+
+    def encode(self) -> str:
+        row_count = f'>{self.row_count}' if self.limit_hit else str(self.row_count)
+        truncated = self.truncated or self.limit_hit
+        meta = (f'rows={row_count} shown={len(self.lines)} truncated={"true" if truncated else "false"} '
+                f'limit_hit={"true" if self.limit_hit else "false"}')
+        output = [meta, self.header, *self.lines]
+        if truncated:
+            summary = self.summary()
+            if summary:
+                output.append(f'summary({"前" if self.limit_hit else "全部"}{self.row_count}行) {summary}')
+            if self.limit_hit:
+                output.append(f'结果超过 {self.row_cap} 行已停止读取，统计值不完整：'
+                              f'请改用 SUM/COUNT/GROUP BY 等聚合查询或增加筛选条件')
+            else:
+                output.append('结果已截断：如需完整统计请改用 SUM/COUNT/GROUP BY 等聚合查询或增加筛选条件')
+        return '\n'.join(output)
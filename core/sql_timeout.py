@@ -0,0 +1,61 @@
+import asyncio
+import logging
+import re
+import threading
+
+from sqlalchemy import text
+
+from config.config import settings
+from core.db import pms_mysql_kill_engine
+
+logger = logging.getLogger(__name__)
+
+# MySQL 因 MAX_EXECUTION_TIME 中断查询时的错误码
+ER_QUERY_TIMEOUT = 3024
+SQL_TIMEOUT_MESSAGE = f'执行超时: 查询超过 {settings.SQL_STATEMENT_TIMEOUT:g} 秒已被中断，请缩小时间范围或增加筛选条件'
+_LEADING_SELECT = re.compile(r'^(\s*\(?\s*)select\b', re.IGNORECASE)
+
+
+class SqlTimeoutStats:
+    """超时与 KILL QUERY 计数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {'server_timeout': 0, 'client_timeout': 0, 'cancelled': 0, 'killed': 0, 'kill_failed': 0}
+
+    def incr(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self.counters)
+
+
+def add_execution_time_hint(sql: str, timeout: float = settings.SQL_STATEMENT_TIMEOUT) -> str:
+    """
+    在最外层 SELECT 后加 MAX_EXECUTION_TIME 优化器提示，由 MySQL 自行中断超时的查询
+    不以 SELECT 开头的语句（如 WITH / SHOW）不加提示，只依赖客户端超时
+    """
+    return _LEADING_SELECT.sub(lambda m: f'{m.group(0)} /*+ MAX_EXECUTION_TIME({int(timeout * 1000)}) */', sql, count=1)
+
+
+def is_server_timeout(e: Exception) -> bool:
+    orig = getattr(e, 'orig', None)
+    return bool(orig is not None and getattr(orig, 'args', None) and orig.args[0] == ER_QUERY_TIMEOUT)
+
+
+async def kill_query(connection_id: int):
+    """在旁路连接上中断指定连接正在执行的语句，连接本身保留"""
+    try:
+        async with asyncio.timeout(settings.SQL_KILL_TIMEOUT):
+            async with pms_mysql_kill_engine.connect() as conn:
+                await conn.execute(text(f'KILL QUERY {int(connection_id)}'))
+        sql_timeout_stats.incr('killed')
+        logger.info(f'[SQL超时] 已中断连接 {connection_id} 上的查询')
+    except Exception as e:
+        sql_timeout_stats.incr('kill_failed')
+        logger.error(f'[SQL超时] 中断连接 {connection_id} 上的查询失败：{e}')
+
+
+sql_timeout_stats = SqlTimeoutStats()
@@ -0,0 +1,119 @@
+import re
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from typing import Any
+
+from config.config import settings
+
+NO_DATA_ANSWER = "暂无相关数据，请点击消息下方👎️反馈给我们"
+
+# 金额、比率类指标即使是整数也保留两位小数，计数类（房间数、订单数）保持整数
+_DECIMAL_KEY_PATTERN = re.compile(r'营收|收入|金额|房费|房价|价格|均价|费用|消费|余额|押金|单价|平均|率|占比|adr|revpar', re.IGNORECASE)
+# 字符串形式的数值只在金额 / 比率类键下重新格式化，且不能有前导 0（'0801'、'00012345' 是房号、单号）
+_NUMBER_PATTERN = re.compile(r'^-?(0|[1-9]\d*)(\.\d+)?$')
+_CENTS = Decimal('0.01')
+# 只是“已完成”之类的套话时可以忽略 notes，其余 notes 可能包含口径说明，交给 LLM 整理
+_BOILERPLATE_NOTES_PATTERN = re.compile(r'^[^，,。；;]{0,30}(完成|成功|如下)[。！!]*$')
+# safe_data 中出现英文字段名说明中间结果不干净，交给 LLM 用业务语言改写
+_FIELD_NAME_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def is_scalar(value: Any) -> bool:
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
+def format_number(key: str, value: Any) -> str:
+    if value is None or value == '':
+        return '-'
+    if isinstance(value, bool):
+        return '是' if value else '否'
+    is_decimal_key = bool(_DECIMAL_KEY_PATTERN.search(key))
+    if isinstance(value, str):
+        # 非金额类键下的字符串（编号、手机号、房号等）原样输出
+        if not is_decimal_key or not _NUMBER_PATTERN.match(value.strip()):
+            return value
+        value = value.strip()
+    if isinstance(value, int) and not is_decimal_key:
+        return str(value)
+    try:
+        # float 先转字符串，避免 0.1 这类二进制误差进入 Decimal
+        number = value if isinstance(value, Decimal) else Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        return str(value)
+    if not number.is_finite():
+        return '-'
+    if number == number.to_integral_value() and not is_decimal_key:
+        return str(int(number))
+    return format(number.quantize(_CENTS, rounding=ROUND_HALF_UP), 'f')
+
+
+def render_table(rows: list[dict]) -> str | None:
+    """键一致、值均为标量的字典列表渲染为 markdown 表格"""
+    columns = list(rows[0].keys())
+    if not columns or len(rows) > settings.SUMMARY_RENDER_MAX_ROWS:
+        return None
+    for row in rows:
+        if list(row.keys()) != columns or not all(is_scalar(v) for v in row.values()):
+            return None
+    lines = ['| ' + ' | '.join(columns) + ' |', '| ' + ' | '.join('---' for _ in columns) + ' |']
+    for row in rows:
+        lines.append('| ' + ' | '.join(format_number(k, v).replace('|', '\\|') for k, v in row.items()) + ' |')
+    return '\n'.join(lines)
+
+
+def render_value(key: str, value: Any) -> str | None:
+    if is_scalar(value):
+        return f'- **{key}**：{format_number(key, value)}'
+    if isinstance(value, list):
+        if not value:
+            return f'- **{key}**：-'
+        if all(is_scalar(v) for v in value):
+            return f'- **{key}**：' + '、'.join(format_number(key, v) for v in value)
+        if all(isinstance(v, dict) for v in value):
+            table = render_table(value)
+            return f'\n**{key}**\n\n{table}\n' if table else None
+        return None
+    if isinstance(value, dict):
+        # 键值分组，只支持一层
+        if not value or not all(is_scalar(v) for v in value.values()):
+            return None
+        # 分组名参与判断数值类型，如“营收构成”下的“餐饮”按金额保留两位小数
+        return f'\n**{key}**\n\n' + '\n'.join(f'- {k}：{format_number(key + k, v)}' for k, v in value.items()) + '\n'
+    return None
+
+
+def has_field_names(value: Any) -> bool:
+    if isinstance(value, dict):
+        return any(_FIELD_NAME_PATTERN.match(str(k)) or has_field_names(v) for k, v in value.items())
+    if isinstance(value, list):
+        return any(has_field_names(v) for v in value)
+    return False
+
+
+def render_summary(payload: dict) -> str | None:
+    """
+    将 SQL Agent 的中间JSON直接渲染为 markdown：单个指标、字典列表（表格）、键值分组
+    需要追问、notes 含补充说明、结构复杂或不干净时返回 None，由 LLM 整理
+    """
+    safe_data = payload.get('safe_data')
+    notes = str(payload.get('notes') or '').strip()
+    if payload.get('need_more'):
+        return None
+    if notes and not _BOILERPLATE_NOTES_PATTERN.match(notes):
+        return None
+    if not safe_data:
+        return None if notes else NO_DATA_ANSWER
+    if not isinstance(safe_data, dict) or has_field_names(safe_data):
+        return None
+
+    items = list(safe_data.items())
+    if len(items) == 1 and is_scalar(items[0][1]):
+        key, value = items[0]
+        return f'{key}：**{format_number(key, value)}**'
+
+    parts = []
+    for key, value in items:
+        part = render_value(str(key), value)
+        if part is None:
+            return None
+        parts.append(part)
+    return '\n'.join(parts).strip()
@@ -0,0 +1,48 @@
+import os
+import sqlite3
+import time
+
+from config.config import settings
+from core.sql_guard import parse_read_only
+from core.sql_result import ResultEncoder
+from utils.excel_parser import upload_db_path
+
+# 每执行多少条 SQLite 虚拟机指令检查一次超时
+PROGRESS_CHECK_STEPS = 10000
+
+
+class UploadQueryTimeout(Exception):
+    pass
+
+
+def query_upload_db(thread_id: str, sql: str) -> str:
+    """
+    在会话上传文件的本地库上执行只读查询（同步，需放到线程中调用），结果编码与 pms_query_mysql 一致
+    本会话没有上传文件时抛出 FileNotFoundError，未通过只读检查时抛出 SqlGuardError
+    """
+    parse_read_only(sql, dialect='sqlite')
+    db_path = upload_db_path(thread_id)
+    if not os.path.exists(db_path):
+        raise FileNotFoundError('本会话没有上传文件')
+    # 查询也算使用，推迟闲置清理
+    os.utime(db_path)
+
+    deadline = time.monotonic() + settings.SQL_STATEMENT_TIMEOUT
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    try:
+        conn.execute('PRAGMA query_only = ON')
+        conn.set_progress_handler(lambda: time.monotonic() > deadline, PROGRESS_CHECK_STEPS)
+        try:
+            cursor = conn.execute(sql)
+            encoder = ResultEncoder([column[0] for column in cursor.description or []])
+            while rows := cursor.fetchmany(settings.SQL_FETCH_BATCH_SIZE):
+                encoder.add_rows(rows)
+                if encoder.limit_hit:
+                    break
+        except sqlite3.OperationalError as e:
+            if time.monotonic() > deadline:
+                raise UploadQueryTimeout() from e
+            raise
+        return encoder.encode()
+    finally:
+        conn.close()
@@ -0,0 +1,106 @@
+import json
+import logging
+import os
+import uuid
+from typing import Any, Iterable
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+logger = logging.getLogger(__name__)
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    内存向量库：归一化向量存放在一块连续的 float32 矩阵中，检索为一次矩阵向量乘 + argpartition
+    返回分数与 Chroma 默认的 l2 空间一致（平方欧氏距离，分数越低越相关），
+    归一化向量下 ||q - x||^2 = 2 - 2 * q·x，因此 qa_min_score / min_score 阈值可以直接沿用
+    """
+
+    def __init__(self, embedding_function: Embeddings, matrix: np.ndarray | None = None,
+                 ids: list[str] | None = None, documents: list[Document] | None = None):
+        self._embedding_function = embedding_function
+        self.matrix = np.ascontiguousarray(matrix if matrix is not None else np.zeros((0, 0)), dtype=np.float32)
+        self.ids = list(ids or [])
+        self.documents = list(documents or [])
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding_function
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def add_texts(self, texts: Iterable[str], metadatas: list[dict] | None = None,
+                  ids: list[str] | None = None, **kwargs: Any) -> list[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        vectors = self._normalize(self._embedding_function.embed_documents(texts))
+        self.matrix = np.ascontiguousarray(vectors if self.matrix.size == 0 else np.vstack([self.matrix, vectors]))
+        self.ids.extend(ids)
+        self.documents.extend(Document(page_content=t, metadata=m, id=i) for t, m, i in zip(texts, metadatas, ids))
+        return ids
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding: list[float], k: int = 4,
+                                                          **kwargs: Any) -> list[tuple[Document, float]]:
+        """与 Chroma 同名方法一致：返回 (文档, 平方欧氏距离)"""
+        if not self.documents:
+            return []
+        similarity = self.matrix @ self._normalize(embedding)
+        k = min(k, len(self.documents))
+        top = np.argpartition(-similarity, k - 1)[:k]
+        top = top[np.argsort(-similarity[top], kind='stable')]
+        return [(self.documents[i], max(float(2 - 2 * similarity[i]), 0.0)) for i in top]
+
+    def similarity_search_by_vector(self, embedding: list[float], k: int = 4, **kwargs: Any) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_relevance_scores(embedding, k=k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> list[tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_relevance_scores(self._embedding_function.embed_query(query), k=k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k)]
+
+    @classmethod
+    def from_texts(cls, texts: list[str], embedding: Embeddings, metadatas: list[dict] | None = None,
+                   ids: list[str] | None = None, **kwargs: Any) -> "NumpyVectorStore":
+        store = cls(embedding)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    @classmethod
+    def from_chroma(cls, chroma_vs, embedding: Embeddings) -> "NumpyVectorStore":
+        """直接复用 Chroma 集合中已有的向量，无需重新编码"""
+        data = chroma_vs.get(include=['embeddings', 'documents', 'metadatas'])
+        documents = [Document(page_content=text or '', metadata=metadata or {}, id=id_)
+                     for id_, text, metadata in zip(data['ids'], data['documents'], data['metadatas'])]
+        return cls(embedding, cls._normalize(np.asarray(data['embeddings'])), data['ids'], documents)
+
+    def save(self, path: str):
+        """
+        保存为单个 npz 文件：embeddings 为向量矩阵，ids 为文档 id，
+        documents 为 JSON 字符串（page_content + metadata），不依赖 pickle
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        payload = json.dumps([{'page_content': d.page_content, 'metadata': d.metadata} for d in self.documents],
+                             ensure_ascii=False)
+        tmp_path = f'{path}.{os.getpid()}.tmp.npz'
+        np.savez(tmp_path, embeddings=self.matrix, ids=np.array(self.ids, dtype=str), documents=np.array(payload))
+        # 多个 worker 同时导出时保证文件完整
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, embedding: Embeddings) -> "NumpyVectorStore":
+        with np.load(path, allow_pickle=False) as data:
+            ids = data['ids'].tolist()
+            documents = [Document(page_content=d['page_content'], metadata=d['metadata'], id=id_)
+                         for id_, d in zip(ids, json.loads(str(data['documents'])))]
+            return cls(embedding, data['embeddings'], ids, documents)
@@ -1,7 +1,7 @@
 import datetime
 from typing import Optional
 
-from sqlalchemy import DateTime, String, Text, func, text, Integer
+from sqlalchemy import DateTime, Index, String, Text, func, text, Integer
 from sqlalchemy.dialects.mysql import TINYINT
 from sqlalchemy.orm import Mapped, mapped_column
 
@@ -10,6 +10,8 @@ from db_models.base_model import Base
 
 class ChatHistory(Base):
     __tablename__ = "chat_history"
+    # 瀑布流按 id 做 keyset 分页
+    __table_args__ = (Index("ix_chat_history_thread_id_id", "thread_id", "id"),)
     # 具体的业务字段
     question: Mapped[Optional[str]] = mapped_column(String(255, "utf8mb4_bin"))
     answer: Mapped[Optional[str]] = mapped_column(Text(collation="utf8mb4_bin"))
@@ -34,8 +36,18 @@ class PresetQuestion(Base):
 
 class UserThread(Base):
     __tablename__ = "user_thread"
+    # 会话列表按 id 做 keyset 分页
+    __table_args__ = (Index("ix_user_thread_user_id_hotel_id_id", "user_id", "hotel_id", "id"),)
 
     user_id: Mapped[Optional[int]] = mapped_column(Integer)
     hotel_id: Mapped[Optional[int]] = mapped_column(Integer)
     thread_id: Mapped[Optional[str]] = mapped_column(String(255, "utf8mb4_bin"), unique=True, index=True)
     title: Mapped[Optional[str]] = mapped_column(String(255, "utf8mb4_bin"))
+
+
+class CacheVersion(Base):
+    """进程内缓存的版本号，失效时递增，多 worker 据此同步清空本地缓存"""
+    __tablename__ = "cache_version"
+
+    name: Mapped[str] = mapped_column(String(64, "utf8mb4_bin"), unique=True)
+    version: Mapped[int] = mapped_column(Integer, server_default=text("0"), default=0)
@@ -1,10 +1,13 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
-from core.db import pms_mysql_engine
+from core.db import pms_mysql_engine, pms_mysql_kill_engine
 from core.globals import init_globals
 from router import register_routers
+from service.pms_agent_service import shutdown_background_tasks
 from utils.custom_exception import register_exception_handler
+from utils.excel_parser import shutdown_pool
 
 logger = logging.getLogger(__name__)
 
@@ -18,8 +21,23 @@ def init_main(app):
 async def init_lifespan(app):
     await init_globals(app)
     yield
+    # 先写完中断收尾、会话标题与聊天记录，它们依赖下面关闭的连接池
+    logger.info(">>> 正在写入未完成的收尾数据...")
+    await shutdown_background_tasks()
     logger.info(">>> 正在关闭 ASYNC MYSQL ENGINE...")
     await pms_mysql_engine.dispose()
+    await pms_mysql_kill_engine.dispose()
+
+    shutdown_pool()
+
+    chroma_instance = getattr(app.state, "chroma_instance", None)
+    if chroma_instance:
+        await chroma_instance.aclose()
+
+    checkpoint_gc_task = getattr(app.state, "checkpoint_gc_task", None)
+    if checkpoint_gc_task:
+        checkpoint_gc_task.cancel()
+        await asyncio.gather(checkpoint_gc_task, return_exceptions=True)
 
     # 1. 关闭 Postgres 连接池 (修复卡死问题的关键)
     pg_saver = getattr(app.state, "postgres_engine", None)
@@ -5,7 +5,8 @@ from fastapi.responses import StreamingResponse
 
 from core.agent_context import AgentContext
 from schemas.pms_agent_schema import DrawRequest, FeedbackRequest, HistoryTableResponse, HistoryTableRequest, HistoryFeedRequest, \
-    HistoryFeedResponse, ThreadResponse, ThreadRequest, PresetQuestionResponse, PresetQuestionRequest, AllUserResponse
+    HistoryFeedResponse, ThreadResponse, ThreadRequest, PresetQuestionResponse, PresetQuestionRequest, AllUserResponse, CacheStatsResponse, \
+    InvalidateCacheRequest
 from service import pms_agent_service
 from utils.R import BaseResponse
 
@@ -19,10 +20,11 @@ async def chat(
         hotel_id: Annotated[int, Form(description="酒店ID")],
         user_id: Annotated[int, Form(description="用户ID")],
         thread_id: Annotated[str | None, Form(description="会话ID，新建会话无需传递，继续会话需要传递")] = None,
-        file: Annotated[UploadFile | None, File(description="上传的Excel文件")] = None
+        file: Annotated[UploadFile | None, File(description="上传的Excel文件")] = None,
+        refresh: Annotated[bool, Form(description="是否跳过答案缓存重新查询")] = False
 ):
     context = AgentContext(request.app, include_graph=True)
-    gen = pms_agent_service.chat(context, file, question, thread_id, hotel_id, user_id)
+    gen = pms_agent_service.chat(context, file, question, thread_id, hotel_id, user_id, refresh, request.is_disconnected)
     return StreamingResponse(gen, media_type="text/event-stream")
 
 
@@ -39,7 +41,7 @@ async def get_history_feed(req: HistoryFeedRequest = Query()):
 
 @agent_router.get('/get_history_table', response_model=BaseResponse[HistoryTableResponse], summary='获取聊天记录表格', deprecated=True)
 async def get_history_table(req: HistoryTableRequest = Query()):
-    return await pms_agent_service.get_history_table(limit=req.limit, page=req.page)
+    return await pms_agent_service.get_history_table(limit=req.limit, page=req.page, before_id=req.before_id)
 
 
 @agent_router.post('/feedback', summary='对AI的回答进行反馈（赞/踩）', description='''
@@ -56,9 +58,23 @@ async def get_user_thread(req: ThreadRequest = Query()):
 
 @agent_router.get('/get_preset_question', response_model=BaseResponse[PresetQuestionResponse], summary='获取预设问题列表')
 async def get_preset_question(req: PresetQuestionRequest = Query()):
-    return await pms_agent_service.get_preset_question(limit=req.limit, page=req.page)
+    return await pms_agent_service.get_preset_question(limit=req.limit, page=req.page, before_id=req.before_id)
 
 
 @agent_router.get('/get_all_user', response_model=BaseResponse[AllUserResponse], summary='获取全部使用过的用户信息')
 async def get_all_user():
     return await pms_agent_service.get_all_user()
+
+
+@agent_router.get('/get_cache_stats', response_model=BaseResponse[CacheStatsResponse], summary='获取缓存命中、SQL超时、对话结果、前缀缓存、收尾队列与预设问题缓存统计')
+async def get_cache_stats(request: Request):
+    context = AgentContext(request.app, include_graph=False)
+    return await pms_agent_service.get_cache_stats(context)
+
+
+@agent_router.post('/invalidate_cache', summary='失效预设问题 / 员工名录缓存', description='''
+## 直接修改 preset_question 或 tb_staff 后调用，target: preset_question / staff / all
+## 多 worker 部署时其他 worker 最迟在 ADMIN_CACHE_VERSION_CHECK_INTERVAL 秒后同步失效
+''')
+async def invalidate_cache(req: InvalidateCacheRequest):
+    return await pms_agent_service.invalidate_admin_cache(req.target)
@@ -68,6 +68,7 @@ class HistoryTableRequest(BaseModel):
 
     limit: int = Query(10, ge=10, le=100, description="每页条数")
     page: int = Query(1, ge=1, description="页码")
+    before_id: Optional[int] = Query(None, ge=1, description="若传入，则获取该id以前 {limit} 条数据（深翻页使用，忽略 page）")
     user_id: int = Query(1, ge=1, description="用户id")
 
 
@@ -109,6 +110,17 @@ class PresetQuestionRequest(BaseModel):
 
     limit: int = Query(10, ge=1, le=100, description="每次获取的条数")
     page: int = Query(1, ge=1, le=100, description="页码")
+    before_id: Optional[int] = Query(None, ge=1, description="若传入，则获取该id以前 {limit} 条数据（深翻页使用，忽略 page）")
+
+
+class InvalidateCacheRequest(BaseModel):
+    model_config = ConfigDict(extra="forbid", json_schema_extra={
+        "example": {
+            'target': 'preset_question'
+        }
+    })
+
+    target: Literal['preset_question', 'staff', 'all'] = Field('all', description="要失效的缓存")
 
 
 # =======================
@@ -156,6 +168,7 @@ class AllUserSchema(BaseModel):
 
 class HistoryTableResponse(BaseModel):
     total_count: int
+    is_approximate: bool = Field(False, description="total_count 是否为近似值")
     data: List[HistorySchema]
 
 
@@ -172,8 +185,20 @@ class ThreadResponse(BaseModel):
 class PresetQuestionResponse(BaseModel):
     data: List[PresetQuestionSchema]
     total_count: int
+    is_approximate: bool = Field(False, description="total_count 是否为近似值")
 
 
 class AllUserResponse(BaseModel):
     data: List[AllUserSchema]
     total_count: int
+
+
+class CacheStatsResponse(BaseModel):
+    answer_cache: dict
+    embedding_cache: dict
+    sql_cache: dict
+    sql_timeout: dict
+    chat_outcome: dict
+    prompt_cache: dict
+    post_response: dict
+    preset_question_cache: dict
@@ -1,137 +1,334 @@
+import asyncio
 import datetime
-import io
 import json
 import logging
+import os
 import uuid
+from functools import partial
+from typing import Awaitable, Callable
 
-import pandas as pd
 from langchain_core.language_models import BaseChatModel
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from sqlalchemy import desc, func, select, text
 
 from config.config import settings
 from core.agent_context import AgentContext
-from core.agent_prompt import USER_PROMPT, TITLE_GENERATE_SYSTEM_PROMPT, ROUTER_PROMPT
-from core.db import db_session, assistants_async_session_maker, pms_async_session_maker
+from core.agent_instance import SUMMARY_DELTA_EVENT
+from core import admin_cache
+from core.admin_cache import cache_versions, preset_question_cache, staff_directory
+from core.agent_prompt import USER_PROMPT, TITLE_GENERATE_SYSTEM_PROMPT
+from core.answer_cache import answer_cache, question_entities
+from core.post_response import ANSWERED_HISTORY_COUNT_KEY, post_response
+from core.prompt_assembly import prompt_cache_stats
+from core.row_counts import row_counts
+from core.sql_cache import sql_cache
+from core.sql_timeout import sql_timeout_stats
+from core.db import db_session
 from db_models.models import ChatHistory, UserThread, PresetQuestion
 from utils.R import R
 from utils.abs_path import abs_path
+from utils.excel_parser import EXCEL_SUFFIXES, parse_excel_upload, upload_db_path
+from utils.time_window import resolve_time_window, window_includes_today, window_key
 
 logger = logging.getLogger(__name__)
 
 
-async def parse_excel(file):
+async def parse_excel(file, thread_id: str):
+    """上传的 Excel 导入该会话的本地库，返回的 file_context 只含表结构与示例数据"""
     file_name, file_context, err = None, '', None
     try:
         if file:
             file_name = file.filename
-            if not file_name.endswith(('.xlsx', '.xls')):
+            if not file_name.lower().endswith(EXCEL_SUFFIXES):
                 raise Exception('只支持 xlsx/xls 文件')
 
             content = await file.read()
             if len(content) > settings.MAX_FILE_SIZE_BYTES:
                 raise Exception(f"文件实际大小超过限制 ({settings.MAX_FILE_SIZE_BYTES / (1024 * 1024)} MB)")
 
-            # 解析 Excel
-            df = pd.read_excel(io.BytesIO(content))
-            df = df.fillna("")  # 填充空值
-            file_md = df.to_markdown(index=False)
-
-            file_context = f"用户上传的文件内容:\n{file_md}\n"
+            # 在进程池中解析，不阻塞事件循环上其他用户的流式输出
+            file_context = await parse_excel_upload(content, file_name, thread_id)
     except Exception as e:
         err = str(e)
     return file_name, file_context, err
 
 
-async def chat(ctx: AgentContext, file, question, thread_id, hotel_id, user_id):
-    file_name, file_content, err = await parse_excel(file)
+def thread_has_upload(file_name: str | None, thread_id: str) -> bool:
+    """本轮上传了文件，或之前轮次上传过文件（会话存在上传库）"""
+    return bool(file_name) or os.path.exists(upload_db_path(thread_id))
+
+
+def answer_cache_applicable(is_new_session: bool, has_upload: bool) -> bool:
+    """
+    只有新会话的首轮问题才走答案缓存：追问依赖上文（"那昨天呢"）；
+    会话有上传文件时问题可能针对文件内容（query_uploaded_file），同样不走缓存
+    """
+    return is_new_session and not has_upload
+
+
+async def lookup_answer_cache(ctx: AgentContext, question: str, hotel_id: int, refresh: bool):
+    """
+    查询答案缓存，返回 (缓存答案, 写回缓存所需参数)，不适用缓存时均为 None
+    """
+    if not settings.ANSWER_CACHE_ENABLED or not question:
+        return None, None
+    if answer_cache.should_bypass(question, refresh):
+        answer_cache.stats['bypass'] += 1
+        return None, None
+    try:
+        vector = await ctx.embeddings.aembed_query(question)
+    except Exception as e:
+        logger.error(f'答案缓存编码失败：{e}')
+        return None, None
+    window = resolve_time_window(question)
+    cache_key = {'hotel_id': hotel_id, 'window': window_key(window), 'vector': vector,
+                 'entities': question_entities(question)}
+    cached = answer_cache.get(**cache_key)
+    return cached, {**cache_key, 'includes_today': window_includes_today(window)}
+
+
+class ChatOutcomeStats:
+    """对话结果计数：正常完成 / 命中答案缓存 / 客户端断开取消 / 异常"""
+
+    def __init__(self):
+        self.counters = {'completed': 0, 'cached': 0, 'cancelled': 0, 'failed': 0}
+
+    def incr(self, name: str):
+        self.counters[name] += 1
+
+    def get_stats(self) -> dict:
+        return dict(self.counters)
+
+
+chat_outcome_stats = ChatOutcomeStats()
+# 持有后台任务的引用，避免被垃圾回收
+_background_tasks: set[asyncio.Task] = set()
+_STREAM_END = object()
+
+
+def spawn_background(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def shutdown_background_tasks(timeout: float = settings.POST_RESPONSE_SHUTDOWN_TIMEOUT):
+    """关闭服务前等待中断收尾等后台任务，它们会向收尾队列写入数据"""
+    if _background_tasks:
+        await asyncio.wait(set(_background_tasks), timeout=timeout)
+    await post_response.shutdown(timeout)
+
+
+async def pump_graph_events(ctx: AgentContext, inputs: dict, agent_config: dict, queue: asyncio.Queue):
+    """在独立任务中运行图并把事件写入队列，客户端断开时取消该任务即可中止 LLM 调用与 SQL 查询"""
+    try:
+        async for event in ctx.graph.astream_events(inputs, version="v2", config=agent_config):
+            queue.put_nowait(event)
+    except Exception as e:
+        queue.put_nowait(e)
+    finally:
+        queue.put_nowait(_STREAM_END)
+
+
+async def watch_disconnect(is_disconnected: Callable[[], Awaitable[bool]], task: asyncio.Task):
+    """定期检查 SSE 客户端是否断开，断开后取消图任务"""
+    while not task.done():
+        await asyncio.sleep(settings.CHAT_DISCONNECT_POLL_INTERVAL)
+        if await is_disconnected():
+            logger.info('[对话] 客户端已断开，取消图任务')
+            task.cancel()
+            return
+
+
+async def allocated_history_id(history_task: asyncio.Task) -> int | None:
+    try:
+        return await history_task
+    except Exception as e:
+        logger.error(f'[对话] 聊天记录占位写入失败：{e}', exc_info=True)
+        return None
+
+
+async def discard_history(history_task: asyncio.Task):
+    if history_id := await allocated_history_id(history_task):
+        post_response.discard_history(history_id)
+
+
+def default_title(question: str | None) -> str:
+    return question[:15] if question else "新会话"
+
+
+async def finish_cancelled_chat(ctx: AgentContext, agent_config: dict, graph_task: asyncio.Task | None,
+                                history_task: asyncio.Task, question: str, answer: str, thread_id: str, user_id: int,
+                                hotel_id: int, save_answer: bool, create_thread: bool):
+    """
+    客户端断开后的收尾：等待图任务取消完成，补齐未返回的工具调用并结束本轮，
+    避免下次追问时会话中残留没有结果的 tool_calls；中断的问答照常记录，不再生成标题
+    """
+    if graph_task:
+        await asyncio.gather(graph_task, return_exceptions=True)
+    answer = f'{answer}\n\n[回答已中断]' if answer else '[回答已中断]'
+    try:
+        state = await ctx.graph.aget_state(agent_config)
+        if state.next:
+            messages = state.values.get('messages', [])
+            answered = {m.tool_call_id for m in messages if isinstance(m, ToolMessage)}
+            dangling = [ToolMessage(content='已取消', tool_call_id=call['id'], name=call['name'])
+                        for m in messages if isinstance(m, AIMessage) for call in m.tool_calls if call['id'] not in answered]
+            await ctx.graph.aupdate_state(agent_config, {"messages": [*dangling, AIMessage(content=answer)]},
+                                          as_node="summarize")
+    except Exception as e:
+        logger.error(f'[对话] 中断收尾失败：{e}', exc_info=True)
+    if save_answer and (history_id := await allocated_history_id(history_task)):
+        post_response.save_answer(history_id, answer)
+    if create_thread:
+        post_response.add_thread(user_id, thread_id, hotel_id, default_title(question))
+        staff_directory.notice_user(user_id)
+
+
+async def chat(ctx: AgentContext, file, question, thread_id, hotel_id, user_id, refresh: bool = False,
+               is_disconnected: Callable[[], Awaitable[bool]] | None = None):
+    is_new_session = not bool(thread_id)
+    thread_id = thread_id if thread_id else str(uuid.uuid4())
+    file_name, file_content, err = await parse_excel(file, thread_id)
     if err:
         yield f"data: {json.dumps({'type': 'delta', "text": err}, ensure_ascii=False)}\n\n"
         yield "data: [DONE]\n\n"
         return
-    is_new_session = not bool(thread_id)
-    thread_id = thread_id if thread_id else str(uuid.uuid4())
     thread_id_json = json.dumps({"type": 'meta', 'thread_id': thread_id}, ensure_ascii=False)
     yield f"data: {thread_id_json}\n\n"
+    # 与图并行插入占位聊天记录，回答结束时 history_id 已就绪
+    history_task = asyncio.create_task(post_response.allocate_history(question, thread_id, file_name))
+    # 本轮上传的文件此时已导入上传库，路由与答案缓存都按会话的实际上传状态判断
+    has_upload = thread_has_upload(file_name, thread_id)
 
     current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    # 各节点的系统提示词由 prompt_assembly 统一组装，这里只传入本轮用户消息
     inputs = {
         "messages": [
-            SystemMessage(
-                id="sys_prompt", content=ROUTER_PROMPT
-            ),
             HumanMessage(
-                content=USER_PROMPT.format(current_time, hotel_id, user_id, file_content, question)
+                content=USER_PROMPT.format(hotel_id, user_id, file_content, question, current_time)
             ),
-        ]
+        ],
+        "hotel_id": hotel_id,
+        "has_upload": bool(file_name),
+        "thread_has_upload": has_upload,
     }
     agent_config = {
         "configurable": {"thread_id": thread_id},
         "recursion_limit": 50,
     }
     ai_output = ""
+    graph_task, watcher_task = None, None
+    cancelled, answer_saved, thread_saved = False, False, False
     try:
-        async for event in ctx.graph.astream_events(
-                inputs, version="v2", config=agent_config
-        ):
-            kind = event["event"]
-            # --- 场景 1: 捕获 LLM 的流式吐字 (打字机效果) ---
-            if kind == "on_chat_model_stream":
-                chunk = event["data"]["chunk"]
-                langgraph_node = event["metadata"].get("langgraph_node", "")
-                # 过滤掉工具调用的参数生成过程 (agent 思考参数时 content 为空)
-                if chunk.content and langgraph_node in {"summarize", "chat_agent"}:
-                    ai_output += chunk.content
-                    yield f"data: {json.dumps({'type': 'delta', "text": chunk.content}, ensure_ascii=False)}\n\n"
-                # elif chunk.content and langgraph_node == 'rag_sql_agent':
-                #     yield f"data: {json.dumps({'type': 'processing', "text": '正在整理结果'}, ensure_ascii=False)}\n\n"
-
-            # elif kind == "on_chat_model_end":
-            #     chunk = event["data"]["output"]
-            #     langgraph_node = event["metadata"]["langgraph_node"]
-            # if chunk.content and langgraph_node != "router":
-            #     logger.info(chunk)
-            # --- 场景 2: 捕获工具调用 (可选，用于调试或前端展示 loading) ---
-            elif kind == "on_tool_start":
-                # tool_name = event["name"]
-                # tool_inputs = event["data"].get("input")
-                # logger.info(f"[正在调用工具]: {tool_name} 参数: {tool_inputs}")
-                yield f"data: {json.dumps({'type': 'processing', "text": '正在查询数据'}, ensure_ascii=False)}\n\n"
-
-            # --- 场景 3: 捕获工具返回结果 (可选) ---
-            elif kind == "on_tool_end":
-                # 有些工具输出可能很长，截断打印日志
-                # output = str(event["data"].get("output"))
-                yield f"data: {json.dumps({'type': 'processing', "text": '正在校验数据'}, ensure_ascii=False)}\n\n"
-
+        use_cache = answer_cache_applicable(is_new_session, has_upload)
+        cached, cache_params = await lookup_answer_cache(ctx, question, hotel_id, refresh) if use_cache else (None, None)
+        queried_data = False
+        if cached:
+            ai_output = cached.answer
+            for i in range(0, len(ai_output), 32):
+                yield f"data: {json.dumps({'type': 'delta', "text": ai_output[i:i + 32]}, ensure_ascii=False)}\n\n"
+            # 命中缓存时也要把本轮问答写入会话，保证后续追问的上下文完整
+            await ctx.graph.aupdate_state(agent_config, {"messages": [*inputs["messages"], AIMessage(content=ai_output)]},
+                                          as_node="summarize")
+            chat_outcome_stats.incr('cached')
+        else:
+            queue = asyncio.Queue()
+            graph_task = asyncio.create_task(pump_graph_events(ctx, inputs, agent_config, queue))
+            if is_disconnected:
+                watcher_task = asyncio.create_task(watch_disconnect(is_disconnected, graph_task))
+            while (event := await queue.get()) is not _STREAM_END:
+                if isinstance(event, Exception):
+                    raise event
+                kind = event["event"]
+                # --- 场景 1: 捕获 LLM 的流式吐字 (打字机效果) ---
+                if kind == "on_chat_model_stream":
+                    chunk = event["data"]["chunk"]
+                    langgraph_node = event["metadata"].get("langgraph_node", "")
+                    # 过滤掉工具调用的参数生成过程 (agent 思考参数时 content 为空)
+                    if chunk.content and langgraph_node in {"summarize", "chat_agent"}:
+                        ai_output += chunk.content
+                        yield f"data: {json.dumps({'type': 'delta', "text": chunk.content}, ensure_ascii=False)}\n\n"
+                    # elif chunk.content and langgraph_node == 'rag_sql_agent':
+                    #     yield f"data: {json.dumps({'type': 'processing', "text": '正在整理结果'}, ensure_ascii=False)}\n\n"
+
+                # --- 整理节点本地渲染的回答 ---
+                elif kind == "on_custom_event" and event["name"] == SUMMARY_DELTA_EVENT:
+                    delta = event["data"]["text"]
+                    ai_output += delta
+                    yield f"data: {json.dumps({'type': 'delta', "text": delta}, ensure_ascii=False)}\n\n"
+
+                # elif kind == "on_chat_model_end":
+                #     chunk = event["data"]["output"]
+                #     langgraph_node = event["metadata"]["langgraph_node"]
+                # if chunk.content and langgraph_node != "router":
+                #     logger.info(chunk)
+                # --- 场景 2: 捕获工具调用 (可选，用于调试或前端展示 loading) ---
+                elif kind == "on_tool_start":
+                    # tool_name = event["name"]
+                    # tool_inputs = event["data"].get("input")
+                    # logger.info(f"[正在调用工具]: {tool_name} 参数: {tool_inputs}")
+                    yield f"data: {json.dumps({'type': 'processing', "text": '正在查询数据'}, ensure_ascii=False)}\n\n"
+
+                # --- 场景 3: 捕获工具返回结果 (可选) ---
+                elif kind == "on_tool_end":
+                    # 有些工具输出可能很长，截断打印日志
+                    # output = str(event["data"].get("output"))
+                    queried_data = queried_data or event["name"] == "pms_query_mysql"
+                    yield f"data: {json.dumps({'type': 'processing', "text": '正在校验数据'}, ensure_ascii=False)}\n\n"
+
+            if graph_task.cancelled():
+                # 客户端已断开，不再缓存答案、生成标题
+                cancelled = True
+                return
+
+            # 只缓存真正查过业务数据的回答
+            if cache_params and queried_data and ai_output:
+                answer_cache.set(**cache_params, question=question, answer=ai_output)
+            chat_outcome_stats.incr('completed')
+
+        # 标题生成与聊天记录写入交给后台批量完成，不再阻塞 [DONE]
         if is_new_session:
-            await save_title(llm=ctx.llm,
-                             question=question,
-                             answer=ai_output,
-                             user_id=user_id,
-                             thread_id=thread_id,
-                             hotel_id=hotel_id)
-
-        # 存储进数据库
-        history_id = None
-        if ai_output:
-            async with assistants_async_session_maker() as session:
-                new_history = ChatHistory(question=question, answer=ai_output, thread_id=thread_id, file_name=file_name)
-
-                session.add(new_history)
-                await session.commit()
-                await session.refresh(new_history)
-                history_id = new_history.id
+            post_response.add_thread(user_id, thread_id, hotel_id, default_title(question),
+                                     generate_title=partial(generate_session_title, ctx.llm,
+                                                            question[:100] if question else '用户问题为空',
+                                                            ai_output[:100] if ai_output else 'AI回复为空'))
+            staff_directory.notice_user(user_id)
+            thread_saved = True
+
+        history_id = await allocated_history_id(history_task) if ai_output else None
         if history_id:
+            post_response.save_answer(history_id, ai_output)
+            answer_saved = True
             history_id_json = json.dumps({"type": 'meta', 'history_id': history_id}, ensure_ascii=False)
             yield f"data: {history_id_json}\n\n"
+    except (GeneratorExit, asyncio.CancelledError):
+        # 服务端发现连接已断开时会关闭或取消生成器
+        cancelled = True
+        raise
     except Exception as e:
+        chat_outcome_stats.incr('failed')
         logger.error(e, exc_info=True)
         yield f"data: {json.dumps({'type': 'delta', 'text': '\n\n[系统] 服务端发生异常，请稍后重试。'})}\n\n"
     finally:
-        yield "data: [DONE]\n\n"
+        for task in (graph_task, watcher_task):
+            if task and not task.done():
+                task.cancel()
+        if cancelled:
+            chat_outcome_stats.incr('cancelled')
+            logger.info(f'[对话] 会话 {thread_id} 已取消')
+            # 生成器可能正处于取消状态，收尾放到独立任务中执行
+            spawn_background(finish_cancelled_chat(ctx, agent_config, graph_task, history_task, question, ai_output,
+                                                   thread_id, user_id, hotel_id, save_answer=not answer_saved,
+                                                   create_thread=is_new_session and not thread_saved))
+        else:
+            if not answer_saved:
+                # 没有回答（或异常）时删除占位记录
+                spawn_background(discard_history(history_task))
+            yield "data: [DONE]\n\n"
 
 
 async def generate_session_title(llm: BaseChatModel, question: str, answer: str) -> str:
@@ -155,7 +352,7 @@ async def generate_session_title(llm: BaseChatModel, question: str, answer: str)
     except Exception as e:
         logger.error(f"生成标题失败: {e}", exc_info=True)
         # 如果 LLM 挂了，返回默认标题，不影响主流程
-        return question[:15] if question else "新会话"
+        return default_title(question)
 
 
 async def draw(ctx: AgentContext, file_name):
@@ -166,19 +363,11 @@ async def draw(ctx: AgentContext, file_name):
     return R.success()
 
 
-async def save_title(llm: BaseChatModel, question: str, answer: str, user_id: int, thread_id: str, hotel_id: int):
-    question = question[:100] if question else '用户问题为空'
-    answer = answer[:100] if answer else 'AI回复为空'
-    title = await generate_session_title(llm=llm, question=question, answer=answer)
-    async with db_session() as session:
-        new_thread = UserThread(user_id=user_id, thread_id=thread_id, title=title, hotel_id=hotel_id)
-        session.add(new_thread)
-
-
 async def get_history_feed(history_id: int | None = None, limit: int = 10, thread_id: str | None = None):
     async with db_session() as session:
-        history_stmt = select(ChatHistory).where(ChatHistory.thread_id == thread_id).order_by(desc(ChatHistory.created_at),
-                                                                                              desc(ChatHistory.id)).limit(limit + 1)
+        # 走 (thread_id, id) 索引的 keyset 分页；answer 为空的是仍在生成中的占位记录
+        history_stmt = select(ChatHistory).where(ChatHistory.thread_id == thread_id, ChatHistory.answer.is_not(None)).order_by(
+            desc(ChatHistory.id)).limit(limit + 1)
         if history_id:
             history_stmt = history_stmt.where(ChatHistory.id < history_id)
         history = await session.execute(history_stmt)
@@ -197,19 +386,25 @@ async def get_history_feed(history_id: int | None = None, limit: int = 10, threa
         )
 
 
-async def get_history_table(limit: int = 10, page: int = 1):
+async def get_history_table(limit: int = 10, page: int = 1, before_id: int | None = None):
     async with db_session() as session:
-        history_stmt = select(ChatHistory).order_by(desc(ChatHistory.created_at), desc(ChatHistory.id)).limit(limit).offset(limit * (page - 1))
+        history_stmt = select(ChatHistory).where(ChatHistory.answer.is_not(None)).order_by(desc(ChatHistory.id)).limit(limit)
+        # 深翻页传入 before_id 走主键 keyset，不再 OFFSET
+        if before_id is not None:
+            history_stmt = history_stmt.where(ChatHistory.id < before_id)
+        else:
+            history_stmt = history_stmt.offset(limit * (page - 1))
         history = await session.execute(history_stmt)
         history = history.scalars().all()
 
-        total_count_stmt = select(func.count()).select_from(ChatHistory)
-        total_count = await session.execute(total_count_stmt)
-        total_count = total_count.scalar()
+        # 总数与列表使用同一过滤条件，占位中的记录不计入
+        total_count, is_approximate = await row_counts.count(session, ChatHistory, ChatHistory.answer.is_not(None),
+                                                             key=ANSWERED_HISTORY_COUNT_KEY)
         return R.success(
             {
                 'data': history,
-                'total_count': total_count
+                'total_count': total_count,
+                'is_approximate': is_approximate
             }
         )
 
@@ -232,7 +427,8 @@ async def get_user_thread(user_id: int, hotel_id: int, limit: int = 10, before_i
         if before_id is not None:
             thread_stmt = thread_stmt.where(UserThread.id < before_id)
 
-        thread_stmt = thread_stmt.order_by(UserThread.created_at.desc()).limit(limit + 1)
+        # 与 before_id 游标一致按 id 排序，走 (user_id, hotel_id, id) 索引
+        thread_stmt = thread_stmt.order_by(UserThread.id.desc()).limit(limit + 1)
         thread = await session.execute(thread_stmt)
         thread = thread.scalars().all()
 
@@ -246,45 +442,55 @@ async def get_user_thread(user_id: int, hotel_id: int, limit: int = 10, before_i
         })
 
 
-async def get_preset_question(limit: int = 10, page: int = 1):
+
+
+async def invalidate_admin_cache(target: str = 'all'):
+    await admin_cache.invalidate_admin_cache(target)
+    return R.success()
+
+
+async def get_preset_question(limit: int = 10, page: int = 1, before_id: int | None = None):
+    await cache_versions.sync()
+    cache_key = (limit, page, before_id)
+    if (cached := preset_question_cache.get(cache_key)) is not None:
+        return R.success(cached)
+
     async with db_session() as session:
-        preset_question_stmt = select(PresetQuestion).order_by(PresetQuestion.created_at.desc()).offset((page - 1) * limit).limit(limit)
+        preset_question_stmt = select(PresetQuestion).order_by(PresetQuestion.id.desc()).limit(limit)
+        if before_id is not None:
+            preset_question_stmt = preset_question_stmt.where(PresetQuestion.id < before_id)
+        else:
+            preset_question_stmt = preset_question_stmt.offset((page - 1) * limit)
         preset_question = await session.scalars(preset_question_stmt)
         preset_question = preset_question.all()
 
-        total_count_stmt = select(func.count()).select_from(PresetQuestion)
-        total_count = await session.execute(total_count_stmt)
-        total_count = total_count.scalar()
+        total_count, is_approximate = await row_counts.count(session, PresetQuestion)
 
-        return R.success({
-            'data': preset_question,
-            'total_count': total_count
-        })
+        payload = {
+            'data': [{'id': question.id, 'content': question.content} for question in preset_question],
+            'total_count': total_count,
+            'is_approximate': is_approximate
+        }
+        preset_question_cache.set(cache_key, payload)
+        return R.success(payload)
 
 
-async def get_all_user():
-    # 阶段 1：获取去重后的 user_id
-    async with assistants_async_session_maker() as session:
-        all_user_stmt = select(UserThread.user_id).distinct()
-        result = await session.execute(all_user_stmt)
-        all_user = result.scalars().all()
-
-    if not all_user:
-        return R.success({'data': [], 'total_count': 0})
-
-    # 阶段 2：跨库查询 staff 信息
-    async with pms_async_session_maker() as pms_session:
-        # 使用 text() 并通过参数绑定防止注入
-        # 注意：部分驱动支持 tuple(all_user) 直接映射到 IN (:ids)
-        sql = text("SELECT id, name FROM tb_staff WHERE id IN :user_ids")
-        pms_result = await pms_session.execute(sql, {"user_ids": tuple(all_user)})
-
-        # 转换为字典列表
-        staff_list = [
-            {"id": row.id, "name": row.name}
-            for row in pms_result.mappings()
-        ]
+async def get_cache_stats(ctx: AgentContext):
+    return R.success({
+        'answer_cache': answer_cache.get_stats(),
+        'embedding_cache': ctx.embeddings.cache.get_stats(),
+        'sql_cache': sql_cache.get_stats(),
+        'sql_timeout': sql_timeout_stats.get_stats(),
+        'chat_outcome': chat_outcome_stats.get_stats(),
+        'prompt_cache': prompt_cache_stats.get_stats(),
+        'post_response': post_response.get_stats(),
+        'preset_question_cache': preset_question_cache.get_stats(),
+    })
 
+
+async def get_all_user():
+    await cache_versions.sync()
+    staff_list = await staff_directory.get_all()
     return R.success({
         'data': staff_list,
         'total_count': len(staff_list)
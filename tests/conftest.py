@@ -0,0 +1,20 @@
+import os
+
+import pytest
+
+os.environ.setdefault('DEEPSEEK_API_KEY', 'test')
+
+
+class CharEncoding:
+    """离线环境下替代 cl100k_base：每 2 个字符记 1 个 token"""
+
+    def encode(self, text: str) -> list[int]:
+        return list(range((len(text) + 1) // 2))
+
+
+@pytest.fixture(autouse=True)
+def offline_encoding(monkeypatch):
+    import core.agent_tokens
+
+    monkeypatch.setattr(core.agent_tokens, 'get_encoding', lambda: CharEncoding())
+    core.agent_tokens._token_cache.clear()
@@ -0,0 +1,75 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+import core.admin_cache as admin_cache
+
+
+class FakeVersionTable:
+    """cache_version 表：execute 返回 (name, version) 行"""
+
+    def __init__(self):
+        self.rows: dict[str, int] = {}
+        self.down = False
+
+    @asynccontextmanager
+    async def session(self):
+        if self.down:
+            raise ConnectionError('数据库不可用')
+        yield self
+
+    async def execute(self, statement):
+        return [type('Row', (), {'name': name, 'version': version}) for name, version in self.rows.items()]
+
+
+@pytest.fixture
+def table(monkeypatch):
+    fake = FakeVersionTable()
+    monkeypatch.setattr(admin_cache, 'db_session', fake.session)
+    admin_cache.preset_question_cache.clear()
+    return fake
+
+
+def test_version_change_clears_local_cache(table):
+    versions = admin_cache.CacheVersions(check_interval=0)
+    table.rows = {'preset_question': 1}
+    asyncio.run(versions.sync())
+    admin_cache.preset_question_cache.set((10, 1, None), {'data': []})
+
+    # 版本号不变时保留缓存
+    asyncio.run(versions.sync())
+    assert admin_cache.preset_question_cache.get((10, 1, None)) is not None
+
+    # 其他 worker 失效后递增了版本号
+    table.rows = {'preset_question': 2}
+    asyncio.run(versions.sync())
+    assert admin_cache.preset_question_cache.get((10, 1, None)) is None
+
+
+def test_staff_version_change_invalidates_directory(table):
+    versions = admin_cache.CacheVersions(check_interval=0)
+    table.rows = {'staff': 1}
+    asyncio.run(versions.sync())
+    admin_cache.staff_directory.expires_at = float('inf')
+    table.rows = {'staff': 2}
+    asyncio.run(versions.sync())
+    assert admin_cache.staff_directory.expires_at == 0.0
+
+
+def test_check_interval_throttles_queries(table):
+    versions = admin_cache.CacheVersions(check_interval=60)
+    table.rows = {'preset_question': 1}
+    asyncio.run(versions.sync())
+    admin_cache.preset_question_cache.set('key', 'value')
+    table.rows = {'preset_question': 2}
+    asyncio.run(versions.sync())
+    assert admin_cache.preset_question_cache.get('key') == 'value'
+
+
+def test_version_table_unavailable_keeps_cache(table):
+    versions = admin_cache.CacheVersions(check_interval=0)
+    admin_cache.preset_question_cache.set('key', 'value')
+    table.down = True
+    asyncio.run(versions.sync())
+    assert admin_cache.preset_question_cache.get('key') == 'value'
@@ -0,0 +1,24 @@
+from langchain_core.messages import AIMessage, ToolMessage
+
+from core.agent_tokens import _cache_key, count_message_tokens
+
+
+def tool_call_message(query: str) -> AIMessage:
+    return AIMessage(content='', tool_calls=[{'name': 'pms_query_mysql', 'args': {'query': query}, 'id': 'call_1'}])
+
+
+def test_tool_calls_are_part_of_cache_key():
+    short = count_message_tokens(tool_call_message('SELECT 1'))
+    long = count_message_tokens(tool_call_message('SELECT name, COUNT(id) FROM tb_order_room GROUP BY name'))
+    assert long > short
+
+
+def test_tool_call_id_is_part_of_cache_key():
+    first = ToolMessage(content='ok', tool_call_id='call_1')
+    second = ToolMessage(content='ok', tool_call_id='call_2')
+    assert _cache_key(first) != _cache_key(second)
+
+
+def test_same_message_hits_cache():
+    message = tool_call_message('SELECT 1')
+    assert count_message_tokens(message) == count_message_tokens(message)
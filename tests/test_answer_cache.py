@@ -0,0 +1,72 @@
+from core.answer_cache import AnswerCache, question_entities
+
+VECTOR = [1.0, 0.0]
+
+
+def test_bypass_only_on_explicit_refresh():
+    assert AnswerCache.should_bypass('再查一遍今天的营收')
+    assert AnswerCache.should_bypass('今天的营收', refresh=True)
+    assert not AnswerCache.should_bypass('最新入住的客人是谁')
+
+
+def test_entities_distinguish_similar_questions():
+    assert question_entities('8012房今天的账单') != question_entities('8013房今天的账单')
+    assert question_entities('订单A1001和B2002') == question_entities('订单b2002和a1001')
+    assert question_entities('今天的营收') == ''
+
+
+def test_different_entities_do_not_share_answers():
+    cache = AnswerCache(threshold=0.9)
+    cache.set(1, 'today', VECTOR, '8012房今天的账单', '8012的账单', includes_today=True,
+              entities=question_entities('8012房今天的账单'))
+    assert cache.get(1, 'today', VECTOR, entities=question_entities('8013房今天的账单')) is None
+    hit = cache.get(1, 'today', VECTOR, entities=question_entities('8012房今天的账单'))
+    assert hit.answer == '8012的账单'
+
+
+def test_cache_applies_only_to_first_turn_without_uploads(tmp_path, monkeypatch):
+    from config.config import settings
+    from service.pms_agent_service import answer_cache_applicable, thread_has_upload
+
+    monkeypatch.setattr(settings, 'UPLOAD_DB_DIR', str(tmp_path))
+    assert answer_cache_applicable(True, thread_has_upload(None, 't1'))
+    assert not answer_cache_applicable(False, thread_has_upload(None, 't1'))
+    assert not answer_cache_applicable(True, thread_has_upload('营收.xlsx', 't1'))
+
+
+def test_existing_upload_thread_bypasses_cache(tmp_path, monkeypatch):
+    from config.config import settings
+    from service.pms_agent_service import answer_cache_applicable, thread_has_upload
+    from utils.excel_parser import upload_db_path
+
+    monkeypatch.setattr(settings, 'UPLOAD_DB_DIR', str(tmp_path))
+    # 之前轮次上传过文件的会话，本轮不带文件问一个可缓存的问题
+    with open(upload_db_path('t1'), 'wb'):
+        pass
+    assert thread_has_upload(None, 't1')
+    assert not answer_cache_applicable(True, thread_has_upload(None, 't1'))
+    assert not answer_cache_applicable(False, thread_has_upload(None, 't1'))
+    assert not thread_has_upload(None, 't2')
+
+
+def test_buckets_stay_bounded_across_windows(monkeypatch):
+    import core.answer_cache as answer_cache_module
+    from config.config import settings
+
+    now = [1_000_000.0]
+    monkeypatch.setattr(answer_cache_module.time, 'time', lambda: now[0])
+    cache = AnswerCache(threshold=0.9, max_entries=5)
+
+    # 每天一个新窗口，前一天窗口的短 TTL 答案过期后应被清理
+    for day in range(30):
+        cache.set(1, f'2026-10-{day + 1:02d}', VECTOR, '今天的营收', f'营收{day}', includes_today=True)
+        now[0] += settings.ANSWER_CACHE_TODAY_TTL + 1
+    assert cache.get_stats()['entries'] == 1
+    assert len(cache.buckets) == 1
+
+    # 未过期的历史窗口答案受总条目上限约束，淘汰最早过期的
+    for day in range(30):
+        cache.set(1, f'2025-{day:02d}', VECTOR, '去年营收', f'营收{day}', includes_today=False)
+    assert cache.get_stats()['entries'] == 5
+    assert cache.get(1, '2025-29', VECTOR).answer == '营收29'
+    assert cache.get(1, '2025-00', VECTOR) is None
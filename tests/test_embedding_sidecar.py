@@ -0,0 +1,43 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+from core.embedding_sidecar import _encode_frame, _read_frame, ping, wait_for_sidecar
+
+
+@pytest.fixture
+def socket_path():
+    # Unix socket 路径长度有限，不用 pytest 的 tmp_path
+    directory = tempfile.mkdtemp(prefix='sidecar')
+    yield os.path.join(directory, 'embedding.sock')
+
+
+async def with_fake_sidecar(socket_path: str, check):
+    async def handle(reader, writer):
+        request = await _read_frame(reader)
+        writer.write(_encode_frame({'embeddings': [[0.0] for _ in request['texts']]}))
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_unix_server(handle, path=socket_path)
+    async with server:
+        return await check()
+
+
+def test_ping_when_sidecar_is_up(socket_path):
+    assert asyncio.run(with_fake_sidecar(socket_path, lambda: asyncio.to_thread(ping, socket_path)))
+
+
+def test_ping_without_socket(socket_path):
+    assert not ping(socket_path)
+
+
+def test_wait_for_sidecar_times_out(socket_path):
+    with pytest.raises(RuntimeError):
+        asyncio.run(wait_for_sidecar(socket_path, timeout=0))
+
+
+def test_wait_for_sidecar_returns_once_ready(socket_path):
+    asyncio.run(with_fake_sidecar(socket_path, lambda: wait_for_sidecar(socket_path, timeout=1)))
@@ -0,0 +1,66 @@
+import io
+import itertools
+import sqlite3
+import time
+from types import SimpleNamespace
+
+import pytest
+from openpyxl import Workbook
+
+from utils import excel_parser
+from utils.excel_parser import ExcelParseTimeout, parse_workbook, read_sheet, write_tables
+
+
+def workbook_bytes(rows: int = 20) -> bytes:
+    wb = Workbook()
+    ws = wb.active
+    ws.title = '营收'
+    ws.append(['日期', '房型', '营收'])
+    for i in range(rows):
+        ws.append([f'2026-03-{i % 28 + 1:02d}', '大床房' if i % 2 else '双床房', 100 + i])
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def parse(content: bytes, db_path: str, deadline: float | None = None) -> dict:
+    return parse_workbook(content, '营收.xlsx', db_path, max_sheets=5, max_rows=1000, max_cols=30, sample_rows=3,
+                          deadline=deadline)
+
+
+def tables(db_path: str) -> list[str]:
+    with sqlite3.connect(db_path) as conn:
+        return [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+
+
+def test_parse_and_import(tmp_path):
+    db_path = str(tmp_path / 'upload.sqlite')
+    result = parse(workbook_bytes(), db_path, deadline=time.time() + 60)
+    assert result['sheets'][0]['rows'] == 20
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute('SELECT count(*), sum("营收") FROM file1_sheet1').fetchone() == (20, sum(range(100, 120)))
+
+
+def test_expired_deadline_writes_nothing(tmp_path):
+    db_path = tmp_path / 'upload.sqlite'
+    with pytest.raises(ExcelParseTimeout):
+        parse(workbook_bytes(), str(db_path), deadline=time.time() - 1)
+    assert not db_path.exists()
+
+
+def test_read_sheet_stops_at_deadline():
+    rows = itertools.chain([('列',)], itertools.repeat((1,)))
+    with pytest.raises(ExcelParseTimeout):
+        read_sheet('无限', rows, max_rows=10 ** 9, max_cols=30, deadline=time.time() - 1)
+
+
+def test_write_interrupted_rolls_back(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'upload.sqlite')
+    parse(workbook_bytes(), db_path)
+    sheet = read_sheet('大表', itertools.chain([('n',)], ((i,) for i in range(100000))), 10 ** 6, 30)
+    # 写入开始时未超时，之后时钟越过截止时间：进度回调中断 INSERT，整个上传回滚
+    clock = itertools.chain([0.0], itertools.repeat(100.0))
+    monkeypatch.setattr(excel_parser, 'time', SimpleNamespace(time=lambda: next(clock)))
+    with pytest.raises(ExcelParseTimeout):
+        write_tables(db_path, '大表.xlsx', [sheet], deadline=1.0)
+    assert tables(db_path) == ['_uploads', 'file1_sheet1']
@@ -0,0 +1,67 @@
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, SystemMessage, ToolMessage
+
+from config.config import settings
+from core.agent_instance import MEMORY_SUMMARY_PREFIX, AgentInstance
+from core.prompt_assembly import MEMORY_SUMMARY_ID
+
+
+class FakeLLM:
+    def __init__(self):
+        self.calls = []
+
+    async def ainvoke(self, messages):
+        self.calls.append(messages)
+        return AIMessage(content='用户关注本月营收')
+
+
+def long_text() -> str:
+    # 测试中 1 token = 2 个字符，单条消息即可超过摘要触发阈值
+    return '营收' * settings.MEMORY_SUMMARY_TRIGGER_TOKENS
+
+
+def turn(n: int, content: str = '') -> list:
+    return [HumanMessage(id=f'h{n}', content=content or f'问题{n}'), AIMessage(id=f'a{n}', content=content or f'回答{n}')]
+
+
+def run_memory(messages: list) -> tuple[dict, FakeLLM]:
+    llm = FakeLLM()
+    return asyncio.run(AgentInstance(llm).memory_node({'messages': messages})), llm
+
+
+def test_single_long_turn_is_not_summarized():
+    result, llm = run_memory(turn(1, long_text()) + [HumanMessage(id='h2', content='那昨天呢')])
+    assert result == {}
+    assert not llm.calls
+
+
+def test_fewer_turns_than_kept(monkeypatch):
+    monkeypatch.setattr(settings, 'MEMORY_KEEP_TURNS', 3)
+    result, llm = run_memory(turn(1, long_text()) + turn(2) + [HumanMessage(id='h3', content='继续')])
+    assert result == {}
+    assert not llm.calls
+
+
+def test_older_turns_are_summarized():
+    keep = settings.MEMORY_KEEP_TURNS
+    older = turn(0, long_text())
+    kept = [m for n in range(1, keep + 1) for m in turn(n)]
+    result, llm = run_memory(older + kept + [HumanMessage(id='current', content='今天呢')])
+
+    assert len(llm.calls) == 1
+    removed = {m.id for m in result['messages'] if isinstance(m, RemoveMessage)}
+    assert removed == {'h0', 'a0'}
+    summary = next(m for m in result['messages'] if isinstance(m, SystemMessage))
+    assert summary.id == MEMORY_SUMMARY_ID and summary.content.startswith(MEMORY_SUMMARY_PREFIX)
+
+
+def test_finished_tool_messages_are_removed():
+    messages = [HumanMessage(id='h1', content='今日营收'),
+                AIMessage(id='call', content='', tool_calls=[{'name': 'pms_query_mysql', 'args': {}, 'id': 't1'}]),
+                ToolMessage(id='result', content='rows=1', tool_call_id='t1'),
+                AIMessage(id='a1', content='12800'),
+                HumanMessage(id='h2', content='昨天呢')]
+    result, llm = run_memory(messages)
+    assert {m.id for m in result['messages']} == {'call', 'result'}
+    assert not llm.calls
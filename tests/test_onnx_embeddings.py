@@ -0,0 +1,38 @@
+import os
+
+import numpy as np
+import pytest
+
+from config.config import settings
+
+QUERIES = ['今日营收', '今天入住率', '帮我查一下7307房间现在的状态', '协议单位的挂账余额还有多少']
+DOCUMENTS = ['营收统计表，按日汇总酒店收入', '房态表，记录每个房间当前状态', '协议单位挂账明细', '会员消费记录']
+# int8 量化后与 torch 的最低余弦相似度，与 utils/bench_embedding.py 一致
+MIN_COSINE = 0.99
+
+
+@pytest.fixture(scope='module')
+def backends():
+    pytest.importorskip('onnxruntime')
+    pytest.importorskip('langchain_huggingface')
+    if not os.path.exists(settings.ONNX_MODEL_PATH) or not os.path.isdir(settings.MODEL_PATH):
+        pytest.skip('未导出 ONNX 模型或缺少 bge-base-zh 模型文件')
+    from core.db import create_embedding_model
+
+    return create_embedding_model('torch'), create_embedding_model('onnx')
+
+
+def test_onnx_vectors_match_torch(backends):
+    torch_model, onnx_model = backends
+    cosine = np.sum(np.asarray(torch_model.embed_documents(QUERIES)) * np.asarray(onnx_model.embed_documents(QUERIES)),
+                    axis=1)
+    assert cosine.min() >= MIN_COSINE
+
+
+def test_onnx_ranking_matches_torch(backends):
+    rankings = []
+    for model in backends:
+        documents = np.asarray(model.embed_documents(DOCUMENTS))
+        queries = np.asarray(model.embed_documents(QUERIES))
+        rankings.append(np.argsort(-(queries @ documents.T), axis=1)[:, 0].tolist())
+    assert rankings[0] == rankings[1]
@@ -0,0 +1,114 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from sqlalchemy.dialects import mysql
+
+import service.pms_agent_service as service
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+class FakeSession:
+    """按语句中的 LIMIT 返回 rows 的前若干条，并记录编译后的 SQL"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements: list[str] = []
+
+    async def execute(self, statement):
+        self.statements.append(str(statement.compile(dialect=mysql.dialect(), compile_kwargs={'literal_binds': True})))
+        return FakeResult(self.rows[:statement._limit])
+
+
+@pytest.fixture
+def session(monkeypatch):
+    fake = FakeSession(rows=list(range(100, 0, -1)))
+
+    @asynccontextmanager
+    async def db_session():
+        yield fake
+
+    monkeypatch.setattr(service, 'db_session', db_session)
+    return fake
+
+
+def test_history_feed_keyset(session):
+    response = asyncio.run(service.get_history_feed(history_id=50, limit=10, thread_id='t1'))
+    sql = session.statements[0]
+    assert 'chat_history.id < 50' in sql
+    assert 'ORDER BY chat_history.id DESC' in sql and 'LIMIT 11' in sql and 'OFFSET' not in sql
+    assert response.data['has_more'] and len(response.data['data']) == 10
+
+
+def test_history_feed_last_page(session):
+    session.rows = session.rows[:3]
+    response = asyncio.run(service.get_history_feed(limit=10, thread_id='t1'))
+    assert 'chat_history.id <' not in session.statements[0]
+    assert not response.data['has_more'] and len(response.data['data']) == 3
+
+
+def test_user_thread_keyset(session):
+    response = asyncio.run(service.get_user_thread(user_id=1, hotel_id=2, limit=5, before_id=30))
+    sql = session.statements[0]
+    assert 'user_thread.id < 30' in sql and 'ORDER BY user_thread.id DESC' in sql and 'LIMIT 6' in sql
+    assert response.data['has_more'] and len(response.data['data']) == 5
+
+
+class CountSession(FakeSession):
+    """列表查询返回 rows，MIN/MAX 与 COUNT 查询返回固定值"""
+
+    async def execute(self, statement):
+        await super().execute(statement)
+        sql = self.statements[-1]
+        if 'min(' in sql:
+            return FakeScalar((1, len(self.rows)))
+        if 'count(' in sql:
+            return FakeScalar(self.answered)
+        return FakeResult(self.rows[:statement._limit])
+
+
+class FakeScalar:
+    def __init__(self, value):
+        self.value = value
+
+    def one(self):
+        return self.value
+
+    def scalar(self):
+        return self.value
+
+
+def test_history_table_total_counts_answered_only(monkeypatch):
+    from core.post_response import ANSWERED_HISTORY_COUNT_KEY
+    from core.row_counts import RowCounter
+
+    fake = CountSession(rows=list(range(20, 0, -1)))
+    fake.answered = 17
+    counter = RowCounter(ttl=30, exact_threshold=1000)
+
+    @asynccontextmanager
+    async def db_session():
+        yield fake
+
+    monkeypatch.setattr(service, 'db_session', db_session)
+    monkeypatch.setattr(service, 'row_counts', counter)
+
+    response = asyncio.run(service.get_history_table(limit=10, page=1))
+    count_sql = next(s for s in fake.statements if 'count(' in s)
+    assert 'chat_history.answer IS NOT NULL' in count_sql
+    assert response.data['total_count'] == 17 and not response.data['is_approximate']
+
+    # 缓存期间只有写入的答案计入总数，占位记录不影响
+    counter.incr(ANSWERED_HISTORY_COUNT_KEY, 2)
+    response = asyncio.run(service.get_history_table(limit=10, page=1))
+    assert response.data['total_count'] == 19 and response.data['is_approximate']
@@ -0,0 +1,152 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+import pytest
+
+import core.post_response
+from core.post_response import PostResponsePipeline
+from db_models.models import ChatHistory, UserThread
+
+
+class FakeDatabase:
+    """按事务记录写入；答案或标题为 BAD 的数据写入失败，down=True 时全部失败"""
+
+    def __init__(self):
+        self.answers: dict[int, str] = {}
+        self.threads: list[dict] = []
+        self.histories: list[ChatHistory] = []
+        self.down = False
+
+    @asynccontextmanager
+    async def session(self):
+        session = FakeSession()
+        yield session
+        if self.down or any(a == 'BAD' for a in session.answers.values()) \
+                or any(getattr(t, 'title', None) == 'BAD' for t in session.added):
+            raise RuntimeError('Data too long')
+        self.answers.update(session.answers)
+        self.threads += [{'thread_id': t.thread_id, 'title': t.title} for t in session.added if isinstance(t, UserThread)]
+        self.histories += [h for h in session.added if isinstance(h, ChatHistory)]
+
+
+class FakeSession:
+    def __init__(self):
+        self.answers = {}
+        self.added = []
+        self.next_id = 1
+
+    def add(self, row):
+        self.added.append(row)
+
+    async def flush(self):
+        for row in self.added:
+            row.id, self.next_id = self.next_id, self.next_id + 1
+
+    async def execute(self, statement, params=None):
+        for row in params or []:
+            self.answers[row['id']] = row['answer']
+
+    def add_all(self, rows):
+        self.added += rows
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = FakeDatabase()
+    monkeypatch.setattr(core.post_response, 'db_session', database.session)
+    return database
+
+
+def pipeline(tmp_path, max_attempts: int = 3) -> PostResponsePipeline:
+    return PostResponsePipeline(max_attempts=max_attempts, dead_letter_path=str(tmp_path / 'dead_letter.jsonl'))
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_batch_write(db, tmp_path):
+    async def scenario():
+        p = pipeline(tmp_path)
+        p.pending_answers = {1: '答案1', 2: '答案2'}
+        p._queue_thread(1, 't1', 1, '今日营收')
+        await p.flush()
+        return p
+
+    p = run(scenario())
+    assert db.answers == {1: '答案1', 2: '答案2'}
+    assert db.threads == [{'thread_id': 't1', 'title': '今日营收'}]
+    assert p.get_stats()['pending'] == 0
+
+
+def test_bad_item_does_not_block_batch(db, tmp_path):
+    async def scenario():
+        p = pipeline(tmp_path)
+        p.pending_answers = {1: '答案1', 2: 'BAD', 3: '答案3'}
+        await p.flush()
+        return p
+
+    p = run(scenario())
+    assert db.answers == {1: '答案1', 3: '答案3'}
+    assert p.pending_answers == {2: 'BAD'}
+    assert p.stats['answers'] == 2
+
+
+def test_dead_letter_after_max_attempts(db, tmp_path):
+    async def scenario():
+        p = pipeline(tmp_path, max_attempts=3)
+        p.pending_answers = {1: '答案1', 2: 'BAD'}
+        for _ in range(3):
+            await p.flush()
+        return p
+
+    p = run(scenario())
+    assert db.answers == {1: '答案1'}
+    assert p.get_stats()['pending'] == 0 and p.stats['dead_letters'] == 1
+    record = json.loads((tmp_path / 'dead_letter.jsonl').read_text(encoding='utf-8'))
+    assert record['kind'] == 'answer' and record['answers'] == {'2': 'BAD'}
+
+
+def test_outage_retries_then_recovers(db, tmp_path):
+    async def scenario():
+        p = pipeline(tmp_path, max_attempts=3)
+        p.pending_answers = {1: '答案1'}
+        db.down = True
+        await p.flush()
+        retry_interval = p._retry_interval
+        db.down = False
+        await p.flush()
+        return p, retry_interval
+
+    p, retry_interval = run(scenario())
+    assert retry_interval > p.flush_interval
+    assert db.answers == {1: '答案1'}
+    assert not p.attempts and p._retry_interval == p.flush_interval
+
+
+def test_long_title_and_answer_are_truncated(db, tmp_path):
+    async def scenario():
+        p = pipeline(tmp_path)
+        p._queue_thread(1, 't1', 1, '标' * 300)
+        p.save_answer(1, '答' * 30000)
+        await p.flush()
+
+    run(scenario())
+    assert len(db.threads[0]['title']) == 255
+    assert len(db.answers[1].encode('utf-8')) <= 65535
+
+
+def test_allocate_history_inserts_placeholder(db, tmp_path):
+    async def scenario():
+        p = pipeline(tmp_path)
+        history_id = await p.allocate_history('问' * 300, 't1', None)
+        p.save_answer(history_id, '答案')
+        await p.flush()
+        return history_id
+
+    history_id = run(scenario())
+    placeholder = db.histories[0]
+    assert history_id == placeholder.id == 1
+    assert placeholder.answer is None and placeholder.thread_id == 't1' and len(placeholder.question) == 255
+    assert db.answers == {1: '答案'}
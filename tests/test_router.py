@@ -0,0 +1,58 @@
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from core.agent_instance import AgentInstance
+from core.agent_prompt import UPLOAD_ROUTER_HINT
+from schemas.pms_agent_schema import RouteOut
+
+
+class FakeLLM:
+    def __init__(self, content: str = '{"route":"SQL","confidence":0.9}'):
+        self.content = content
+        self.calls = []
+
+    async def ainvoke(self, messages):
+        self.calls.append(messages)
+        return AIMessage(content=self.content)
+
+
+class FakeFastRouter:
+    def __init__(self, route: str = 'CHAT'):
+        self.result = RouteOut(route=route, confidence=0.99)
+        self.calls = []
+
+    async def route(self, question):
+        self.calls.append(question)
+        return self.result
+
+    def record(self, hit, route, elapsed):
+        pass
+
+
+def test_upload_thread_skips_fast_router_and_hints_llm():
+    llm, fast_router = FakeLLM(), FakeFastRouter()
+    agent = AgentInstance(llm, fast_router=fast_router)
+    route = asyncio.run(agent.route([HumanMessage(content='总结一下这个表格')], thread_has_upload=True))
+    assert route == 'rag_sql_agent'
+    assert not fast_router.calls
+    assert llm.calls[0][-1].content == UPLOAD_ROUTER_HINT
+
+
+def test_thread_without_upload_uses_fast_router():
+    llm, fast_router = FakeLLM(), FakeFastRouter()
+    agent = AgentInstance(llm, fast_router=fast_router)
+    route = asyncio.run(agent.route([HumanMessage(content='遇到客人投诉怎么办？')]))
+    assert route == 'chat_agent'
+    assert fast_router.calls
+    assert not llm.calls
+
+
+def test_router_node_passes_thread_upload_state():
+    llm = FakeLLM()
+    agent = AgentInstance(llm, fast_router=FakeFastRouter())
+    state = {'messages': [HumanMessage(content='文件里哪个房型最多？')], 'hotel_id': 1,
+             'has_upload': False, 'thread_has_upload': True}
+    result = asyncio.run(agent.router_node(state))
+    assert result['next_node'] == 'rag_sql_agent'
+    assert llm.calls[0][-1].content == UPLOAD_ROUTER_HINT
@@ -0,0 +1,32 @@
+import datetime
+
+from config.config import settings
+from core.sql_cache import normalize_sql, ttl_for
+
+TODAY = datetime.date(2026, 3, 15)
+
+
+def test_normalize_sql_keeps_literals():
+    assert normalize_sql("SELECT  name FROM t WHERE a='Ab'") == normalize_sql("select name\nfrom t where a='Ab';")
+    assert normalize_sql("select * from t where a='Ab'") != normalize_sql("select * from t where a='ab'")
+
+
+def test_ttl_by_date():
+    assert ttl_for(normalize_sql("select * from tb_reckoning_stat where daily_time = curdate()"), TODAY) \
+        == settings.SQL_CACHE_TODAY_TTL
+    assert ttl_for(normalize_sql("select * from tb_reckoning_stat where daily_time = '2026-03-15'"), TODAY) \
+        == settings.SQL_CACHE_TODAY_TTL
+    assert ttl_for(normalize_sql("select * from tb_reckoning_stat where daily_time = '2026-03-01'"), TODAY) \
+        == settings.SQL_CACHE_HISTORY_TTL
+
+
+def test_undated_queries_on_live_tables_use_short_ttl():
+    sql = normalize_sql("select room_no, state from tb_room where hotel_id = 1")
+    assert ttl_for(sql, TODAY) == settings.SQL_CACHE_TODAY_TTL
+    sql = normalize_sql("select t.name, count(*) from tb_room r join tb_room_type t on r.type_id = t.id group by t.name")
+    assert ttl_for(sql, TODAY) == settings.SQL_CACHE_TODAY_TTL
+
+
+def test_undated_queries_on_static_tables_use_static_ttl():
+    sql = normalize_sql("select name, price from tb_room_type where hotel_id = 1")
+    assert ttl_for(sql, TODAY) == settings.SQL_CACHE_STATIC_TTL
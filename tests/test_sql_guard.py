@@ -0,0 +1,55 @@
+import pytest
+
+from config.config import settings
+from core.sql_guard import SqlGuardError, check_sql
+
+# tb_order / tb_room 在表结构文档中都有 hotel_id 字段
+
+
+@pytest.mark.parametrize('sql', [
+    'select * from tb_order where hotel_id = 1',
+    'select * from tb_order where 1 = hotel_id and status = 2',
+    'select * from tb_order o where o.hotel_id in (1, 2)',
+    'select * from tb_order where hotel_id = ?',
+    'select o.id from tb_order o join tb_room r on r.id = o.room_id and r.hotel_id = 1',
+    'select count(*) from tb_order where (hotel_id = 1 and status = 2)',
+])
+def test_hotel_filter_accepted(sql):
+    check_sql(sql)
+
+
+@pytest.mark.parametrize('sql', [
+    'select * from tb_order',
+    'select * from tb_order where hotel_id > 0',
+    'select * from tb_order where hotel_id is not null',
+    'select o.id from tb_order o join tb_room r on o.hotel_id = r.hotel_id',
+    'select * from tb_order where hotel_id = 1 or 1 = 1',
+    'select * from tb_order where not hotel_id = 1',
+    'select * from tb_order where hotel_id in (select hotel_id from tb_room)',
+])
+def test_hotel_filter_rejected(sql):
+    with pytest.raises(SqlGuardError) as e:
+        check_sql(sql)
+    assert e.value.reason == 'MISSING_HOTEL_FILTER'
+
+
+def test_injected_limit_fetches_one_extra_row():
+    sql, limit = check_sql('select * from tb_order where hotel_id = 1 -- 注释')
+    assert limit == settings.SQL_DEFAULT_LIMIT
+    assert sql.endswith(f'\nLIMIT {settings.SQL_DEFAULT_LIMIT + 1}')
+
+
+def test_explicit_limit_kept():
+    sql = 'select * from tb_order where hotel_id = 1 limit 10'
+    assert check_sql(sql) == (sql, None)
+
+
+@pytest.mark.parametrize('sql, reason', [
+    ('delete from tb_order where hotel_id = 1', 'NOT_READ_ONLY'),
+    ('select 1; select 2', 'MULTI_STATEMENT'),
+    ('select sleep(10)', 'BLOCKED_FUNCTION'),
+])
+def test_rejects_unsafe_statements(sql, reason):
+    with pytest.raises(SqlGuardError) as e:
+        check_sql(sql)
+    assert e.value.reason == reason
@@ -0,0 +1,30 @@
+import decimal
+
+from core.sql_result import ResultEncoder
+
+
+def test_compact_encoding():
+    encoder = ResultEncoder(['房型', '营收'])
+    encoder.add_rows([('大床房', decimal.Decimal('12800.00')), ('双床房', None)])
+    assert encoder.encode().splitlines() == [
+        'rows=2 shown=2 truncated=false limit_hit=false', '房型,营收', '大床房,12800', '双床房,']
+
+
+def test_display_budget_truncates_but_keeps_totals():
+    encoder = ResultEncoder(['n'], max_rows=2)
+    encoder.add_rows([(i,) for i in range(1, 6)])
+    lines = encoder.encode().splitlines()
+    assert lines[0] == 'rows=5 shown=2 truncated=true limit_hit=false'
+    assert 'summary(全部5行) n: sum=15 min=1 max=5' in lines
+
+
+def test_row_cap_reports_limit_hit():
+    encoder = ResultEncoder(['n'], max_rows=100, row_cap=3)
+    encoder.add_rows([(i,) for i in range(1, 4)])
+    assert not encoder.limit_hit
+    # 调用方多取的一行不计入结果
+    encoder.add_rows([(4,)])
+    assert encoder.limit_hit and encoder.row_count == 3
+    lines = encoder.encode().splitlines()
+    assert lines[0] == 'rows=>3 shown=3 truncated=true limit_hit=true'
+    assert 'summary(前3行) n: sum=6 min=1 max=3' in lines
@@ -0,0 +1,56 @@
+from decimal import Decimal
+
+import pytest
+
+from core.summary_renderer import NO_DATA_ANSWER, format_number, render_summary
+
+
+@pytest.mark.parametrize('key, value, expected', [
+    ('房间数', 12, '12'),
+    ('营收', 12800, '12800.00'),
+    ('营收', '12800.5', '12800.50'),
+    ('入住率', 0.125, '0.13'),
+    ('均价', Decimal('2.675'), '2.68'),
+    ('营收', 1e17, '100000000000000000.00'),
+    ('订单数', 3.0, '3'),
+    ('房号', '0801', '0801'),
+    ('订单号', '00012345', '00012345'),
+    ('手机号', '13800138000', '13800138000'),
+    ('金额', '0801', '0801'),
+    ('营收', float('nan'), '-'),
+    ('营收', float('inf'), '-'),
+    ('营收', None, '-'),
+    ('是否在住', True, '是'),
+])
+def test_format_number(key, value, expected):
+    assert format_number(key, value) == expected
+
+
+def test_single_metric():
+    assert render_summary({'safe_data': {'今日营收': 12800}}) == '今日营收：**12800.00**'
+
+
+def test_table_keeps_identifiers():
+    payload = {'safe_data': {'在住房间': [{'房号': '0801', '房费': 388}, {'房号': '0802', '房费': 420.5}]},
+               'notes': '查询完成'}
+    assert render_summary(payload) == ('**在住房间**\n\n| 房号 | 房费 |\n| --- | --- |\n'
+                                       '| 0801 | 388.00 |\n| 0802 | 420.50 |')
+
+
+def test_grouped_values_use_group_name():
+    payload = {'safe_data': {'营收构成': {'餐饮': 100, '房费': 200}}}
+    assert render_summary(payload) == '**营收构成**\n\n- 餐饮：100.00\n- 房费：200.00'
+
+
+@pytest.mark.parametrize('payload', [
+    {'safe_data': {'a': 1}, 'need_more': True},
+    {'safe_data': {'营收': 1}, 'notes': '口径为含税收入，不含挂账'},
+    {'safe_data': {'total_revenue': 1}},
+    {'safe_data': {'营收': {'明细': [1, 2]}}},
+])
+def test_falls_back_to_llm(payload):
+    assert render_summary(payload) is None
+
+
+def test_no_data():
+    assert render_summary({'safe_data': {}}) == NO_DATA_ANSWER
@@ -0,0 +1,85 @@
+import hashlib
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from core.vector_store import NumpyVectorStore
+
+DIM = 32
+TEXTS = [f'表结构{i}：酒店营收、入住率、房态字段说明' for i in range(50)]
+
+
+class HashEmbeddings(Embeddings):
+    """按文本哈希生成确定性的随机向量（未归一化，验证存储侧会做归一化）"""
+
+    def embed_query(self, text: str) -> list[float]:
+        seed = int.from_bytes(hashlib.md5(text.encode()).digest()[:4], 'little')
+        return (np.random.default_rng(seed).normal(size=DIM) * 3).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_query(t) for t in texts]
+
+
+class NormalizedHashEmbeddings(HashEmbeddings):
+    """线上 bge 模型输出归一化向量，Chroma 的 l2 距离只在此前提下与 NumpyVectorStore 一致"""
+
+    def embed_query(self, text: str) -> list[float]:
+        vector = np.asarray(super().embed_query(text))
+        return (vector / np.linalg.norm(vector)).tolist()
+
+
+def brute_force(embedding: Embeddings, query: str, k: int) -> list[tuple[int, float]]:
+    matrix = np.asarray(embedding.embed_documents(TEXTS))
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    q = np.asarray(embedding.embed_query(query))
+    q /= np.linalg.norm(q)
+    distances = ((matrix - q) ** 2).sum(axis=1)
+    order = np.argsort(distances, kind='stable')[:k]
+    return [(int(i), float(distances[i])) for i in order]
+
+
+@pytest.mark.parametrize('query', ['今日营收', '7307房间现在的状态', TEXTS[7]])
+def test_ranking_matches_brute_force_l2(query):
+    embedding = HashEmbeddings()
+    store = NumpyVectorStore.from_texts(TEXTS, embedding, ids=[str(i) for i in range(len(TEXTS))])
+    actual = store.similarity_search_with_score(query, k=5)
+    expected = brute_force(embedding, query, 5)
+    assert [int(doc.id) for doc, _ in actual] == [i for i, _ in expected]
+    assert np.allclose([s for _, s in actual], [s for _, s in expected], atol=1e-5)
+
+
+def test_k_larger_than_store_and_empty_store():
+    embedding = HashEmbeddings()
+    assert NumpyVectorStore(embedding).similarity_search('今日营收') == []
+    store = NumpyVectorStore.from_texts(TEXTS[:3], embedding)
+    assert len(store.similarity_search('今日营收', k=10)) == 3
+
+
+def test_save_load_roundtrip(tmp_path):
+    embedding = HashEmbeddings()
+    store = NumpyVectorStore.from_texts(TEXTS, embedding, metadatas=[{'n': i} for i in range(len(TEXTS))])
+    path = str(tmp_path / 'index' / 'table_structure.npz')
+    store.save(path)
+    loaded = NumpyVectorStore.load(path, embedding)
+    assert loaded.ids == store.ids
+    assert [d.metadata for d in loaded.documents] == [d.metadata for d in store.documents]
+    assert [d.id for d in loaded.similarity_search(TEXTS[3])] == [d.id for d in store.similarity_search(TEXTS[3])]
+
+
+def test_parity_with_chroma():
+    langchain_chroma = pytest.importorskip('langchain_chroma')
+    from chromadb.config import Settings
+
+    embedding = NormalizedHashEmbeddings()
+    ids = [str(i) for i in range(len(TEXTS))]
+    chroma_vs = langchain_chroma.Chroma(embedding_function=embedding, collection_name='parity',
+                                        client_settings=Settings(anonymized_telemetry=False))
+    chroma_vs.add_texts(TEXTS, ids=ids)
+    numpy_vs = NumpyVectorStore.from_chroma(chroma_vs, embedding)
+    for query in ['今日营收', '会员消费记录', TEXTS[0], TEXTS[42]]:
+        vector = embedding.embed_query(query)
+        expected = chroma_vs.similarity_search_by_vector_with_relevance_scores(vector, k=5)
+        actual = numpy_vs.similarity_search_by_vector_with_relevance_scores(vector, k=5)
+        assert [d.id for d, _ in actual] == [d.id for d, _ in expected]
+        assert np.allclose([s for _, s in actual], [s for _, s in expected], atol=1e-4)
@@ -0,0 +1,94 @@
+"""
+向量模型后端基准：torch vs onnx(int8)
+对比单条查询延迟、批量吞吐、进程常驻内存，并校验两者向量的余弦一致性
+每个后端在独立子进程中运行，内存互不干扰
+用法（项目根目录）：python -m utils.bench_embedding
+"""
+import multiprocessing as mp
+import statistics
+import sys
+import time
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    # Windows 没有 resource 模块，不统计峰值内存
+    resource = None
+
+QUERIES = [
+    '今日营收', '今天入住率', '帮我查一下7307房间现在的状态', '上周的总收入是多少？', '本周预订情况如何',
+    '协议单位的挂账余额还有多少', '今天有哪些客人退房了', '酒店差评一般怎么回复比较得体？',
+    '预估下明天各类房型的价格', '最近七天每天的营收趋势', '会员消费排行前十', '今天还有多少空房',
+]
+LATENCY_ROUNDS = 50
+BATCH_SIZE = 32
+THROUGHPUT_ROUNDS = 10
+# int8 量化后与 torch 的最低余弦相似度
+MIN_COSINE = 0.99
+
+
+def max_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 下 ru_maxrss 单位为 KB，macOS 下为字节
+    return max_rss / 1024 / 1024 if sys.platform == 'darwin' else max_rss / 1024
+
+
+def run_backend(backend: str, queue: mp.Queue):
+    from core.db import create_embedding_model
+
+    load_start = time.perf_counter()
+    model = create_embedding_model(backend)
+    load_time = time.perf_counter() - load_start
+    model.embed_query('预热')
+
+    latencies = []
+    for i in range(LATENCY_ROUNDS):
+        start = time.perf_counter()
+        model.embed_query(QUERIES[i % len(QUERIES)])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    batch = [QUERIES[i % len(QUERIES)] for i in range(BATCH_SIZE)]
+    start = time.perf_counter()
+    for _ in range(THROUGHPUT_ROUNDS):
+        model.embed_documents(batch)
+    throughput = BATCH_SIZE * THROUGHPUT_ROUNDS / (time.perf_counter() - start)
+
+    queue.put({
+        'backend': backend,
+        'load_s': load_time,
+        'p50_ms': statistics.median(latencies),
+        'p95_ms': sorted(latencies)[int(len(latencies) * 0.95) - 1],
+        'throughput': throughput,
+        'max_rss_mb': max_rss_mb(),
+        'vectors': np.asarray(model.embed_documents(QUERIES), dtype=np.float32),
+    })
+
+
+def bench(backend: str) -> dict:
+    ctx = mp.get_context('spawn')
+    queue = ctx.Queue()
+    process = ctx.Process(target=run_backend, args=(backend, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+if __name__ == '__main__':
+    results = [bench('torch'), bench('onnx')]
+    print(f'{"后端":<8}{"加载(s)":>10}{"p50(ms)":>10}{"p95(ms)":>10}{"吞吐(条/s)":>12}{"峰值内存(MB)":>14}')
+    for r in results:
+        max_rss = '-' if r['max_rss_mb'] is None else f'{r["max_rss_mb"]:.1f}'
+        print(f'{r["backend"]:<8}{r["load_s"]:>10.2f}{r["p50_ms"]:>10.2f}{r["p95_ms"]:>10.2f}'
+              f'{r["throughput"]:>12.1f}{max_rss:>14}')
+
+    # 两个后端的向量都已归一化，点积即余弦相似度
+    cosine = np.sum(results[0]['vectors'] * results[1]['vectors'], axis=1)
+    print(f'余弦一致性: min={cosine.min():.5f} mean={cosine.mean():.5f}')
+    if cosine.min() < MIN_COSINE:
+        print(f'[失败] onnx 向量与 torch 偏差过大（< {MIN_COSINE}），不能直接检索现有 Chroma 集合')
+        sys.exit(1)
@@ -0,0 +1,69 @@
+"""
+上下文剪枝微基准：对比 trim_messages + 无缓存计数 与 trim_last + 单条缓存计数
+用法（项目根目录）：python -m utils.bench_trimmer
+"""
+import random
+import time
+import uuid
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage, trim_messages
+
+from core.agent_tokens import count_tokens, get_encoding, trim_last
+
+THREAD_SIZE = 200
+MAX_TOKENS = 6000
+ROUNDS = 3
+
+random.seed(42)
+
+
+def legacy_count_tokens(messages):
+    encoding = get_encoding()
+    num_tokens = 0
+    for m in messages:
+        num_tokens += 3
+        num_tokens += len(encoding.encode(str(m.content or "")))
+        if getattr(m, "tool_calls", None):
+            for tool_call in m.tool_calls:
+                num_tokens += len(encoding.encode(str(tool_call)))
+    return num_tokens
+
+
+def build_thread(size: int):
+    """按 Human -> AI(tool_calls) -> Tool -> AI 的节奏生成合成对话"""
+    messages = []
+    while len(messages) < size:
+        call_id = f'call_{uuid.uuid4().hex[:8]}'
+        rows = [{'房型': f'房型{i}', '数量': random.randint(1, 200), '金额': round(random.uniform(100, 9999), 2)}
+                for i in range(random.randint(5, 80))]
+        messages.extend([
+            HumanMessage(id=str(uuid.uuid4()), content=f'用户问题：第{len(messages)}轮，帮我统计今天各房型的营收'),
+            AIMessage(id=str(uuid.uuid4()), content='', tool_calls=[
+                {'name': 'pms_query_mysql', 'args': {'query': 'SELECT name, COUNT(id) FROM tb_order_room'}, 'id': call_id}
+            ]),
+            ToolMessage(id=str(uuid.uuid4()), content=str((0, str(rows))), tool_call_id=call_id),
+            AIMessage(id=str(uuid.uuid4()), content='{"need_more":false,"safe_data":{"今日营收":50000},"notes":""}'),
+        ])
+    return messages[:size]
+
+
+def run(label, trimmer, thread):
+    start_time = time.perf_counter()
+    # 模拟 agent 循环：对话每增长一条就剪枝一次
+    for i in range(1, len(thread) + 1):
+        trimmer(thread[:i])
+    elapsed = time.perf_counter() - start_time
+    print(f'{label:<28} 总耗时 {elapsed:8.4f}s  单次平均 {elapsed / len(thread) * 1000:8.3f}ms')
+    return elapsed
+
+
+if __name__ == '__main__':
+    for round_ in range(ROUNDS):
+        thread = build_thread(THREAD_SIZE)
+        print(f'--- 第 {round_ + 1} 轮：{len(thread)} 条消息，约 {legacy_count_tokens(thread)} tokens ---')
+        legacy = run('trim_messages(无缓存)', lambda msgs: trim_messages(
+            msgs, strategy="last", token_counter=legacy_count_tokens, max_tokens=MAX_TOKENS,
+            include_system=False, allow_partial=False), thread)
+        current = run('trim_last(单条缓存)', lambda msgs: trim_last(msgs, max_tokens=MAX_TOKENS), thread)
+        assert count_tokens(trim_last(thread, MAX_TOKENS)) <= MAX_TOKENS
+        print(f'加速比 {legacy / current:.1f}x')
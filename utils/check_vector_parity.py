@@ -0,0 +1,58 @@
+"""
+NumpyVectorStore 与 Chroma 的检索一致性校验：同一查询向量下 top-k 文档顺序一致、距离误差小于 TOLERANCE
+用法（项目根目录）：python -m utils.check_vector_parity [--save]
+  --save  校验通过后把索引导出到 settings.NUMPY_VECTOR_STORE_PATH
+"""
+import os
+import sys
+
+from config.config import settings
+from core.db import ChromaInstance
+from core.vector_store import NumpyVectorStore
+
+K = 5
+TOLERANCE = 1e-4
+QUERIES = [
+    '今日营收',
+    '昨天酒店的收入是多少',
+    '今天入住率',
+    '7307房间现在的状态',
+    '本周预订情况如何',
+    '协议单位的挂账余额',
+    '会员消费记录',
+    '今天有哪些客人退房',
+]
+
+
+def check_collection(chroma_instance: ChromaInstance, collection_name: str) -> bool:
+    chroma_vs = chroma_instance.load_vectorstore(collection_name, backend='chroma')
+    numpy_vs = NumpyVectorStore.from_chroma(chroma_vs, chroma_instance.model)
+    # 集合内文档本身也作为查询，覆盖完全命中的情况
+    queries = QUERIES + [doc.page_content for doc in numpy_vs.documents]
+
+    ok = True
+    for query in queries:
+        embedding = chroma_instance.model.embed_query(query)
+        expected = chroma_vs.similarity_search_by_vector_with_relevance_scores(embedding, k=K)
+        actual = numpy_vs.similarity_search_by_vector_with_relevance_scores(embedding, k=K)
+        expected_ids = [doc.id for doc, _ in expected]
+        actual_ids = [doc.id for doc, _ in actual]
+        max_diff = max((abs(e[1] - a[1]) for e, a in zip(expected, actual)), default=0)
+        # 分数几乎相同的文档允许顺序互换
+        same_order = expected_ids == actual_ids or sorted(expected_ids) == sorted(actual_ids)
+        if not same_order or max_diff > TOLERANCE:
+            ok = False
+            print(f'[不一致] {collection_name} 查询={query[:30]} chroma={expected_ids} numpy={actual_ids} 最大误差={max_diff:.6f}')
+    print(f'{collection_name}: {len(numpy_vs.documents)} 条文档，{len(queries)} 个查询，{"一致" if ok else "不一致"}')
+
+    if ok and '--save' in sys.argv:
+        index_path = os.path.join(settings.NUMPY_VECTOR_STORE_PATH, f'{collection_name}.npz')
+        numpy_vs.save(index_path)
+        print(f'已导出 {index_path}')
+    return ok
+
+
+if __name__ == '__main__':
+    instance = ChromaInstance()
+    results = [check_collection(instance, name) for name in ('table_structure', 'qa_sql')]
+    sys.exit(0 if all(results) else 1)
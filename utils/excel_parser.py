@@ -0,0 +1,339 @@
+"""
+聊天上传 Excel 的解析：在独立的进程池中执行，不阻塞事件循环
+- xlsx 用 openpyxl read_only 流式读取，每个工作表最多 EXCEL_MAX_ROWS 行、EXCEL_MAX_COLS 列，超出部分不读取
+- 逐列推断类型（整数 / 小数 / 日期 / 时间 / 布尔 / 文本），导入该会话的本地 SQLite（每个工作表一张表）
+- 提示词中只放表结构与前 EXCEL_SAMPLE_ROWS 行示例（紧凑的竖线分隔表格），明细由 agent 通过 query_uploaded_file 工具查询
+xls 需要 xlrd，仍走 pandas
+超时由子进程自己判断：主进程传入绝对截止时间，读取与写入过程中检查，超时则放弃且不写入（或回滚）上传库，
+避免主进程已返回超时后子进程仍在后台把数据导入会话
+"""
+import asyncio
+import datetime
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Iterable
+
+from config.config import settings
+
+logger = logging.getLogger(__name__)
+
+EXCEL_SUFFIXES = ('.xlsx', '.xls')
+SQLITE_TYPES = {'整数': 'INTEGER', '小数': 'REAL', '布尔': 'INTEGER'}
+# 记录每次上传导入的表，表名按上传次序编号
+UPLOADS_TABLE = '_uploads'
+# 读取时每隔多少行检查一次截止时间，写入时 SQLite 每执行多少条虚拟机指令检查一次
+DEADLINE_CHECK_ROWS = 1000
+DEADLINE_CHECK_STEPS = 100000
+# 主进程等待结果时在截止时间之外多等的秒数，留给子进程自行超时退出
+EXCEL_PARSE_TIMEOUT_GRACE = 2
+
+_pool: ProcessPoolExecutor | None = None
+
+
+class ExcelParseError(Exception):
+    """文件无法解析，消息直接返回给用户"""
+
+
+class ExcelParseTimeout(ExcelParseError):
+    def __init__(self):
+        super().__init__(f'文件解析超时（超过 {settings.EXCEL_PARSE_TIMEOUT} 秒），请精简后重试')
+
+
+def check_deadline(deadline: float | None):
+    """deadline 为 time.time() 的绝对时间，主进程与子进程共用"""
+    if deadline is not None and time.time() > deadline:
+        raise ExcelParseTimeout()
+
+
+def upload_db_path(thread_id: str) -> str:
+    """会话上传文件对应的 SQLite 路径；thread_id 来自客户端，取哈希作为文件名"""
+    return os.path.join(settings.UPLOAD_DB_DIR, f'{hashlib.sha256(thread_id.encode()).hexdigest()[:32]}.sqlite')
+
+
+def remove_stale_upload_dbs(max_idle_days: int, dry_run: bool = False) -> int:
+    """删除超过 max_idle_days 未导入也未查询的上传库，与闲置会话的 checkpoint 一起清理"""
+    if not os.path.isdir(settings.UPLOAD_DB_DIR):
+        return 0
+    idle_before = time.time() - max_idle_days * 24 * 60 * 60
+    removed = 0
+    for entry in os.scandir(settings.UPLOAD_DB_DIR):
+        if entry.name.endswith('.sqlite') and entry.stat().st_mtime < idle_before:
+            if not dry_run:
+                os.remove(entry.path)
+            removed += 1
+    return removed
+
+
+def format_cell(value: Any) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return '是' if value else '否'
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        if value != value:
+            return ''
+        if value.is_integer():
+            return str(int(value))
+        return f'{value:.6f}'.rstrip('0').rstrip('.')
+    if isinstance(value, datetime.datetime):
+        if value.time() == datetime.time():
+            return value.date().isoformat()
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return str(value)
+    text = ' '.join(str(value).split())
+    if len(text) > settings.EXCEL_MAX_CELL_CHARS:
+        text = text[:settings.EXCEL_MAX_CELL_CHARS] + '…'
+    return text.replace('|', '\\|')
+
+
+def sniff_type(values: list[Any]) -> str:
+    types = set()
+    for value in values:
+        if value is None or (isinstance(value, str) and not value.strip()):
+            continue
+        if isinstance(value, bool):
+            types.add('布尔')
+        elif isinstance(value, int) or (isinstance(value, float) and value.is_integer()):
+            types.add('整数')
+        elif isinstance(value, float):
+            types.add('小数')
+        elif isinstance(value, (datetime.datetime, datetime.date)):
+            types.add('日期')
+        elif isinstance(value, (datetime.time, datetime.timedelta)):
+            types.add('时间')
+        else:
+            return '文本'
+    if types == {'整数', '小数'}:
+        return '小数'
+    return types.pop() if len(types) == 1 else ('空' if not types else '文本')
+
+
+def to_sqlite_value(value: Any, date_only: bool) -> Any:
+    """日期统一存为 ISO 字符串，便于 SQLite 的 date() / strftime() 与字符串比较"""
+    if value is None or isinstance(value, (int, float)):
+        if isinstance(value, float) and value != value:
+            return None
+        return int(value) if isinstance(value, bool) else value
+    if isinstance(value, datetime.datetime):
+        return value.date().isoformat() if date_only else value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    text = str(value).strip()
+    return text or None
+
+
+def read_sheet(name: str, rows: Iterable[tuple], max_rows: int, max_cols: int, total_rows: int | None = None,
+               deadline: float | None = None) -> dict | None:
+    """rows 为按行的单元格值，首个非空行作为表头；空表返回 None；超过 deadline 时抛出 ExcelParseTimeout"""
+    header, header_row, data, truncated = None, 0, [], False
+    for row_number, row in enumerate(rows, start=1):
+        if row_number % DEADLINE_CHECK_ROWS == 0:
+            check_deadline(deadline)
+        row = tuple(row[:max_cols])
+        if not any(v is not None and str(v).strip() for v in row):
+            continue
+        if header is None:
+            header, header_row = row, row_number
+            continue
+        if len(data) >= max_rows:
+            truncated = True
+            break
+        data.append(row)
+
+    if header is None:
+        return None
+
+    # 去掉表头与数据都为空的尾部列
+    width = max(max((i + 1 for i, v in enumerate(row) if v is not None and str(v).strip()), default=0)
+                for row in [header, *data])
+    columns = []
+    for i, value in enumerate(header[:width]):
+        column = ' '.join(format_cell(value).replace('"', '').replace('\\|', '/').split()) or f'列{i + 1}'
+        # 重名列加序号，保证能建表
+        columns.append(column if column not in columns else f'{column}_{i + 1}')
+    data = [tuple(row[:width]) + (None,) * (width - len(row)) for row in data]
+    return {
+        'name': name,
+        'columns': columns,
+        'types': [sniff_type([row[i] for row in data]) for i in range(width)],
+        'data': data,
+        'truncated': truncated,
+        'total_rows': total_rows - header_row if truncated and total_rows else len(data),
+    }
+
+
+def write_tables(db_path: str, file_name: str, sheets: list[dict], deadline: float | None = None):
+    """
+    每个工作表导入为一张表，表名 file{上传序号}_sheet{工作表序号}，一次上传在一个事务中完成
+    超过 deadline 时中断并回滚，抛出 ExcelParseTimeout
+    """
+    check_deadline(deadline)
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    # autocommit=False：CREATE TABLE 也在事务内，中断或出错时不会留下空表
+    conn = sqlite3.connect(db_path, autocommit=False)
+    if deadline is not None:
+        # 返回真值时 SQLite 中断当前语句（OperationalError: interrupted），事务随之回滚
+        conn.set_progress_handler(lambda: time.time() > deadline, DEADLINE_CHECK_STEPS)
+    try:
+        with conn:
+            conn.execute(f'CREATE TABLE IF NOT EXISTS {UPLOADS_TABLE} (table_name TEXT PRIMARY KEY, upload_no INTEGER, '
+                         f'file_name TEXT, sheet_name TEXT, row_count INTEGER, created_at TEXT)')
+            upload_no = conn.execute(f'SELECT coalesce(max(upload_no), 0) + 1 FROM {UPLOADS_TABLE}').fetchone()[0]
+            created_at = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            for sheet_no, sheet in enumerate(sheets, start=1):
+                table = f'file{upload_no}_sheet{sheet_no}'
+                date_only = [t == '日期' and all(not isinstance(row[i], datetime.datetime) or row[i].time() == datetime.time()
+                                                 for row in sheet['data'])
+                             for i, t in enumerate(sheet['types'])]
+                column_defs = ', '.join(f'"{c}" {SQLITE_TYPES.get(t, "TEXT")}' for c, t in zip(sheet['columns'], sheet['types']))
+                conn.execute(f'CREATE TABLE {table} ({column_defs})')
+                conn.executemany(f'INSERT INTO {table} VALUES ({", ".join("?" for _ in sheet["columns"])})',
+                                 ([to_sqlite_value(v, date_only[i]) for i, v in enumerate(row)] for row in sheet['data']))
+                conn.execute(f'INSERT INTO {UPLOADS_TABLE} VALUES (?, ?, ?, ?, ?, ?)',
+                             (table, upload_no, file_name, sheet['name'], len(sheet['data']), created_at))
+                sheet['table'] = table
+            # 提交前再检查一次，超时的上传整体放弃
+            check_deadline(deadline)
+    except sqlite3.OperationalError:
+        check_deadline(deadline)
+        raise
+    finally:
+        conn.close()
+
+
+def describe_sheet(file_name: str, sheet: dict, sample_rows: int) -> str:
+    if sheet['truncated']:
+        summary = f'原表共约 {sheet["total_rows"]} 行，仅导入前 {len(sheet["data"])} 行'
+    else:
+        summary = f'共 {len(sheet["data"])} 行'
+    lines = [f'## 表 {sheet["table"]}（文件 {file_name}，工作表 {sheet["name"]}，{summary}）',
+             '列：' + '|'.join(f'{c} {SQLITE_TYPES.get(t, "TEXT")}({t})' for c, t in zip(sheet['columns'], sheet['types'])),
+             f'示例数据（前 {min(sample_rows, len(sheet["data"]))} 行）：',
+             '|'.join(sheet['columns'])]
+    lines.extend('|'.join(format_cell(v) for v in row) for row in sheet['data'][:sample_rows])
+    return '\n'.join(lines)
+
+
+def iter_xls_sheets(content: bytes):
+    import pandas as pd
+
+    for name, df in pd.read_excel(io.BytesIO(content), sheet_name=None, header=None).items():
+        df = df.astype(object).where(df.notna(), None)
+        yield name, df.itertuples(index=False, name=None), len(df)
+
+
+def parse_workbook(content: bytes, file_name: str, db_path: str, max_sheets: int, max_rows: int, max_cols: int,
+                   sample_rows: int, deadline: float | None = None) -> dict:
+    """
+    在子进程中执行：读取工作表并导入 db_path，返回提示词文本、各表统计与耗时（毫秒）
+    超过 deadline（time.time() 绝对时间）时抛出 ExcelParseTimeout，不写入上传库
+    """
+    timings = {}
+    start_time = time.perf_counter()
+    sheets = []
+    try:
+        if file_name.lower().endswith('.xls'):
+            sheet_iter = iter_xls_sheets(content)
+            workbook = None
+        else:
+            from openpyxl import load_workbook
+
+            workbook = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+            sheet_iter = ((ws.title, ws.iter_rows(max_col=max_cols, values_only=True), ws.max_row)
+                          for ws in workbook.worksheets)
+        timings['load'] = round((time.perf_counter() - start_time) * 1000, 2)
+
+        skipped = 0
+        for name, rows, total_rows in sheet_iter:
+            if len(sheets) >= max_sheets:
+                skipped += 1
+                continue
+            check_deadline(deadline)
+            sheet_start_time = time.perf_counter()
+            sheet = read_sheet(name, rows, max_rows, max_cols, total_rows, deadline)
+            timings[f'sheet:{name}'] = round((time.perf_counter() - sheet_start_time) * 1000, 2)
+            if sheet:
+                sheets.append(sheet)
+        if workbook is not None:
+            workbook.close()
+    except ExcelParseError:
+        raise
+    except Exception as e:
+        raise ExcelParseError(f'文件解析失败：{e}') from None
+
+    if not sheets:
+        raise ExcelParseError('文件中没有数据')
+    write_start_time = time.perf_counter()
+    try:
+        write_tables(db_path, file_name, sheets, deadline)
+    except sqlite3.Error as e:
+        raise ExcelParseError(f'文件导入失败：{e}') from None
+    timings['sqlite'] = round((time.perf_counter() - write_start_time) * 1000, 2)
+
+    parts = [describe_sheet(file_name, sheet, sample_rows) for sheet in sheets]
+    if skipped:
+        parts.append(f'（另有 {skipped} 个工作表未导入）')
+    timings['total'] = round((time.perf_counter() - start_time) * 1000, 2)
+    stats = [{'table': s['table'], 'name': s['name'], 'rows': len(s['data']), 'cols': len(s['columns']),
+              'truncated': s['truncated']} for s in sheets]
+    return {'text': '\n\n'.join(parts), 'sheets': stats, 'timings': timings}
+
+
+def _warm_up():
+    import openpyxl  # noqa: F401
+
+
+def start_pool(max_workers: int = settings.EXCEL_PARSE_WORKERS) -> ProcessPoolExecutor:
+    """
+    创建解析进程池并预先拉起子进程，避免首次上传时承担进程启动与导入 openpyxl 的耗时
+    使用 spawn：主进程已加载模型与线程池，fork 出的子进程可能继承锁而死锁
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+        for _ in range(max_workers):
+            _pool.submit(_warm_up)
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def parse_excel_upload(content: bytes, file_name: str, thread_id: str) -> str:
+    """解析上传的 Excel 并导入会话的本地库，返回放入提示词的表结构说明；失败时抛出 ExcelParseError"""
+    loop = asyncio.get_running_loop()
+    start_time = time.perf_counter()
+    # 截止时间从提交时算起，包含排队等待空闲子进程的时间
+    deadline = time.time() + settings.EXCEL_PARSE_TIMEOUT
+    future = loop.run_in_executor(start_pool(), parse_workbook, content, file_name, upload_db_path(thread_id),
+                                  settings.EXCEL_MAX_SHEETS, settings.EXCEL_MAX_ROWS, settings.EXCEL_MAX_COLS,
+                                  settings.EXCEL_SAMPLE_ROWS, deadline)
+    try:
+        # 正常情况下子进程会在截止时间自行抛出 ExcelParseTimeout；卡在 load_workbook 等无法检查的步骤时由这里兜底，
+        # 子进程随后在下一个检查点放弃，不会写入上传库
+        async with asyncio.timeout(settings.EXCEL_PARSE_TIMEOUT + EXCEL_PARSE_TIMEOUT_GRACE):
+            result = await future
+    except TimeoutError:
+        raise ExcelParseTimeout() from None
+    elapsed = (time.perf_counter() - start_time) * 1000
+    # 总耗时与子进程耗时之差为排队与进程间传输
+    logger.info(f'[Excel解析] {file_name} {len(content) / 1024:.1f}KB，'
+                f'工作表 {[(s["table"], s["name"], s["rows"], s["cols"]) for s in result["sheets"]]}，'
+                f'耗时 {elapsed:.2f}ms（子进程 {result["timings"]}）')
+    return (f"用户上传的文件已导入本地数据库，与文件内容相关的问题请用 query_uploaded_file 工具查询"
+            f"（SQLite 语法，中文列名需用双引号包裹）：\n{result['text']}\n")
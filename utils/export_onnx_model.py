@@ -0,0 +1,45 @@
+"""
+将 settings.MODEL_PATH 下的 bge-base-zh 导出为 ONNX，并做 int8 动态量化
+用法（项目根目录）：python -m utils.export_onnx_model
+输出：settings.ONNX_MODEL_PATH（量化模型），同目录下保留 fp32 的 model.onnx
+"""
+import os
+import time
+
+import torch
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from transformers import AutoModel, AutoTokenizer
+
+from config.config import settings
+
+if __name__ == '__main__':
+    start_time = time.time()
+    output_dir = os.path.dirname(settings.ONNX_MODEL_PATH)
+    os.makedirs(output_dir, exist_ok=True)
+    fp32_path = os.path.join(output_dir, 'model.onnx')
+
+    tokenizer = AutoTokenizer.from_pretrained(settings.MODEL_PATH)
+    model = AutoModel.from_pretrained(settings.MODEL_PATH)
+    model.eval()
+
+    sample = tokenizer(['今日营收', '帮我查一下7307房间现在的状态'], padding=True, return_tensors='pt')
+    input_names = ['input_ids', 'attention_mask', 'token_type_ids']
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['last_hidden_state'] = {0: 'batch', 1: 'sequence'}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample['input_ids'], sample['attention_mask'], sample['token_type_ids']),
+            fp32_path,
+            input_names=input_names,
+            output_names=['last_hidden_state'],
+            dynamic_axes=dynamic_axes,
+            opset_version=17,
+        )
+    print(f'已导出 fp32 模型: {fp32_path} ({os.path.getsize(fp32_path) / 1024 / 1024:.1f} MB)')
+
+    quantize_dynamic(fp32_path, settings.ONNX_MODEL_PATH, weight_type=QuantType.QInt8)
+    print(f'已导出 int8 量化模型: {settings.ONNX_MODEL_PATH} '
+          f'({os.path.getsize(settings.ONNX_MODEL_PATH) / 1024 / 1024:.1f} MB)')
+    print(f'总耗时 {time.time() - start_time:.1f}s，请运行 python -m utils.bench_embedding 校验一致性')
@@ -0,0 +1,83 @@
+import datetime
+import re
+
+CN_NUMBER = {'一': 1, '二': 2, '两': 2, '三': 3, '四': 4, '五': 5, '六': 6, '七': 7, '八': 8, '九': 9, '十': 10,
+             '十四': 14, '十五': 15, '二十': 20, '三十': 30}
+
+# (正则, 相对今天的起始偏移天数, 结束偏移天数)
+RELATIVE_DAY_PATTERNS = [
+    (r'今天|今日|当天|现在|目前|当前|实时', 0, 0),
+    (r'明天|明日', 1, 1),
+    (r'后天', 2, 2),
+    (r'大前天', -3, -3),
+    (r'前天|前日', -2, -2),
+    (r'昨天|昨日', -1, -1),
+]
+
+
+def _to_number(text: str) -> int | None:
+    if text.isdigit():
+        return int(text)
+    return CN_NUMBER.get(text)
+
+
+def resolve_time_window(question: str, today: datetime.date | None = None) -> tuple[datetime.date, datetime.date] | None:
+    """
+    将问题中的时间语义解析为闭区间 [start, end]，无时间语义时返回 None
+    多个时间词同时出现时取并集
+    """
+    today = today or datetime.date.today()
+    question = question or ''
+    windows = []
+
+    for pattern, start, end in RELATIVE_DAY_PATTERNS:
+        if re.search(pattern, question):
+            windows.append((today + datetime.timedelta(days=start), today + datetime.timedelta(days=end)))
+            # "大前天" 同时会命中 "前天"，避免重复
+            question = re.sub(pattern, '', question)
+
+    monday = today - datetime.timedelta(days=today.weekday())
+    if re.search(r'本周|这周|这个星期|本星期', question):
+        windows.append((monday, today))
+    if re.search(r'上周|上个星期|上星期', question):
+        windows.append((monday - datetime.timedelta(days=7), monday - datetime.timedelta(days=1)))
+
+    first_day = today.replace(day=1)
+    if re.search(r'本月|这个月|当月', question):
+        windows.append((first_day, today))
+    if re.search(r'上个月|上月', question):
+        last_month_end = first_day - datetime.timedelta(days=1)
+        windows.append((last_month_end.replace(day=1), last_month_end))
+    if re.search(r'今年|本年', question):
+        windows.append((today.replace(month=1, day=1), today))
+
+    for match in re.finditer(r'(?:最近|近|过去)([0-9]+|[一二两三四五六七八九十]+)(天|日|周)', question):
+        number = _to_number(match.group(1))
+        if number:
+            days = number * 7 if match.group(2) == '周' else number
+            windows.append((today - datetime.timedelta(days=days - 1), today))
+
+    for match in re.finditer(r'(\d{4})[-/年](\d{1,2})[-/月](\d{1,2})', question):
+        try:
+            day = datetime.date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+            windows.append((day, day))
+        except ValueError:
+            continue
+
+    if not windows:
+        return None
+    return min(w[0] for w in windows), max(w[1] for w in windows)
+
+
+def window_includes_today(window: tuple[datetime.date, datetime.date] | None, today: datetime.date | None = None) -> bool:
+    """无时间语义的问题（如房态）按实时数据处理"""
+    today = today or datetime.date.today()
+    if window is None:
+        return True
+    return window[1] >= today
+
+
+def window_key(window: tuple[datetime.date, datetime.date] | None) -> str:
+    if window is None:
+        return 'none'
+    return f'{window[0].isoformat()}~{window[1].isoformat()}'
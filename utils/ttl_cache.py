@@ -0,0 +1,76 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+class TTLCache:
+    """
+    线程安全的 LRU + TTL 缓存
+    超过 maxsize（条数）或 max_weight（weigh 计算的总权重，如字节数）时淘汰最久未使用的条目，
+    过期条目在读取时惰性清理
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300, max_weight: int | None = None,
+                 weigh: Callable[[Any], int] | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_weight = max_weight
+        self.weigh = weigh or (lambda value: 0)
+        self.weight = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _pop(self, key: Hashable):
+        _, value = self._data.pop(key)
+        self.weight -= self.weigh(value)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= time.monotonic():
+                if item is not None:
+                    self._pop(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None):
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self.weight += self.weigh(value)
+            while len(self._data) > self.maxsize or (self.max_weight is not None and self.weight > self.max_weight):
+                self._pop(next(iter(self._data)))
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.weight = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hit': self.hits,
+            'miss': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+            'entries': len(self._data),
+            'maxsize': self.maxsize,
+            'weight': self.weight,
+            'evictions': self.evictions,
+        }